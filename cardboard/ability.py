@@ -32,7 +32,7 @@ class Ability(object):
         self.type = type
 
     def __call__(self):
-        self.action()
+        return self.action()
 
     def __repr__(self):
         elipsis = " ... " if len(self.description) > 40 else ""
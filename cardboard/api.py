@@ -1,12 +1,21 @@
+from collections import OrderedDict
+from itertools import chain, count
 import functools
+import inspect
 import json
 import uuid
+import weakref
 
+from twisted.internet import defer, reactor
+from twisted.python import log
 import jsonschema
-import panglery
 import txjsonrpc
 
-from cardboard import core
+from cardboard import (
+    core, deltas, draft, encoding, events, exceptions, priority, registry,
+    spectators, timing,
+)
+from cardboard.card import Card
 from cardboard.util import ANY
 
 
@@ -20,40 +29,114 @@ class NotAuthorized(Exception):
         return "Authorization failed or was not provided."
 
 
+class RemoteError(Exception):
+    """
+    A client answered a call made to it with an error.
+
+    """
+
+    def __init__(self, code, message):
+        super(RemoteError, self).__init__(code, message)
+
+        self.code = code
+        self.message = message
+
+    def __str__(self):
+        return "{0.message} ({0.code})".format(self)
+
+
+# the remote commands that ask a user to choose something, by the method
+# their client is sent
+Select = "select"
+SelectCards = "selectCards"
+SelectPlayers = "selectPlayers"
+SelectCombined = "selectCombined"
+SelectRange = "selectRange"
+SelectBlocks = "selectBlocks"
+
+
 class User(object):
     """
     A user is an enraged animal sitting across the network.
 
     If you truly wish to interact with one, be my guest.
 
+    The objects a user is asked to choose from are sent by ID (cards by
+    their IDs in the user's game, and players by their player IDs), and the
+    IDs the user chooses are mapped back to them. Choosing anything that
+    wasn't offered is a :exc:`~cardboard.exceptions.BadSelection`.
+
     """
 
+    protocol = None
+
+    #: the user's game
+    game = None
+
+    #: a function returning the ID of a card in the user's game
+    card_id = None
+
+    #: a function returning the player ID of a player in the user's game
+    player_id = None
+
+    #: a function returning a snapshot of the state of the user's game
+    snapshot = None
 
     def event_triggered(self, **event):
-        pass
+        """
+        Push a change to the state of the game (see :mod:`cardboard.deltas`)
+        to the user as a notification.
+
+        Notifications are queued on the user's connection, and sent along
+        with any others pushed during the same reactor tick. If the
+        connection has fallen behind, they're collapsed into a single
+        snapshot of the game instead.
+
+        """
+
+        if self.protocol is not None:
+            self.protocol.notifications.push(
+                "stateChanged", event, snapshot=self.snapshot,
+            )
 
     def select(self, choices, how_many=1, duplicates=False):
-        return self.protocol.callRemote(
-            Select, choices=choices, how_many=how_many, duplicates=duplicates
+        """
+        Ask the user to choose from any objects.
+
+        Each choice is described by the ID of the card or player it is, or
+        else by its name, and the user chooses by replying with the
+        positions of their choices in the list of them.
+
+        """
+
+        choices = list(choices)
+        selecting = self.protocol.callRemote(
+            Select, choices=[self._describe(choice) for choice in choices],
+            how_many=how_many, duplicates=duplicates,
+        )
+        return selecting.addCallback(
+            _chosen, dict(enumerate(choices)), how_many, duplicates,
         )
 
     def select_cards(
         self, zone=None, match=ANY, how_many=1, duplicates=False, bad=True
     ):
-        cards = [card for card in zone if match(card)]
-        return self.protocol.callRemote(
-            SelectCards, cards=cards, how_many=how_many,
+        cards = self._cards(zone, match)
+        selecting = self.protocol.callRemote(
+            SelectCards, cards=list(cards), how_many=how_many,
             duplicates=duplicates, bad=bad,
         )
+        return selecting.addCallback(_chosen, cards, how_many, duplicates)
 
     def select_players(
         self, match=ANY, how_many=1, duplicates=False, bad=True
     ):
-        players = [player for player in self.game.players if match(player)]
-        return self.protocol.callRemote(
-            SelectPlayers, players=players, how_many=how_many,
+        players = self._players(match)
+        selecting = self.protocol.callRemote(
+            SelectPlayers, players=list(players), how_many=how_many,
             duplicates=duplicates, bad=bad,
         )
+        return selecting.addCallback(_chosen, players, how_many, duplicates)
 
     def select_combined(
         self,
@@ -66,14 +149,38 @@ class User(object):
         duplicate_players=False,
         bad=True,
     ):
-        cards = [card for card in zone if match_cards(card)]
-        players = [play for play in self.game.players if match_players(play)]
-        return self.protocol.callRemote(
-            SelectCombined, cards=cards, players=players,
+        """
+        Ask the user to choose both cards and players.
+
+        The user replies with the IDs of the cards and of the players they
+        choose (as ``cards`` and ``players``), and is given back a tuple of
+        the cards and the players.
+
+        """
+
+        cards = self._cards(zone, match_cards)
+        players = self._players(match_players)
+
+        def chosen(selection):
+            try:
+                card_ids, player_ids = selection["cards"], selection["players"]
+            except (KeyError, TypeError):
+                raise exceptions.BadSelection(
+                    "Both cards and players must be chosen."
+                )
+            return (
+                _chosen(card_ids, cards, how_many_cards, duplicate_cards),
+                _chosen(player_ids, players, how_many_players,
+                        duplicate_players),
+            )
+
+        selecting = self.protocol.callRemote(
+            SelectCombined, cards=list(cards), players=list(players),
             how_many_cards=how_many_cards, duplicate_cards=duplicate_cards,
             how_many_players=how_many_players,
             duplicate_players=duplicate_players, bad=bad,
         )
+        return selecting.addCallback(chosen)
 
     def select_range(self, start, stop, how_many=1, duplicates=False):
         return self.protocol.callRemote(
@@ -81,6 +188,96 @@ class User(object):
             how_many=how_many, duplicates=duplicates,
         )
 
+    def select_blocks(self, legal):
+        """
+        Ask the user which attacker each of their creatures blocks.
+
+        :argument legal: a dict mapping each potential blocker to the
+                         attackers it can block (see
+                         :meth:`cardboard.combat.Combat.legal_blocks`)
+
+        The user is sent the ID of each potential blocker along with a list
+        of the IDs of the attackers it can block, and chooses by replying
+        with the ID of each blocker mapped to the ID of the attacker it
+        blocks.
+
+        """
+
+        cards = {}
+        for blocker, attackers in legal.iteritems():
+            for card in chain([blocker], attackers):
+                cards[self.card_id(card)] = card
+
+        legal = {
+            self.card_id(blocker) : sorted(self.card_id(a) for a in attackers)
+            for blocker, attackers in legal.iteritems()
+        }
+
+        def chosen(blocks):
+            try:
+                return {
+                    cards[int(blocker)] : cards[int(attacker)]
+                    for blocker, attacker in blocks.iteritems()
+                }
+            except (AttributeError, KeyError, TypeError, ValueError):
+                raise exceptions.BadSelection(
+                    "Blocks must map the IDs of blockers to the IDs of the "
+                    "attackers they block."
+                )
+
+        selecting = self.protocol.callRemote(SelectBlocks, legal=legal)
+        return selecting.addCallback(chosen)
+
+    def _cards(self, zone, match):
+        """
+        The cards in a zone that match, by ID.
+
+        """
+
+        return OrderedDict(
+            (self.card_id(card), card) for card in zone if match(card)
+        )
+
+    def _players(self, match):
+        """
+        The players in the user's game that match, by player ID.
+
+        """
+
+        return OrderedDict(
+            (self.player_id(player), player)
+            for player in self.game.players if match(player)
+        )
+
+    def _describe(self, choice):
+        if isinstance(choice, core.Player):
+            return {"player" : self.player_id(choice)}
+        elif isinstance(choice, Card):
+            return {"card" : self.card_id(choice), "name" : choice.name}
+        return {"name" : unicode(choice)}
+
+
+def _chosen(ids, offered, how_many, duplicates):
+    """
+    Map the IDs a user chose back to the objects that were offered.
+
+    """
+
+    try:
+        chosen = [offered[id] for id in ids]
+    except (KeyError, TypeError):
+        raise exceptions.BadSelection(
+            "Only the IDs of what was offered may be chosen."
+        )
+
+    if not duplicates and len(set(ids)) != len(ids):
+        raise exceptions.BadSelection("Nothing may be chosen twice.")
+    elif how_many is not None and len(chosen) > how_many:
+        raise exceptions.BadSelection(
+            "At most {} may be chosen.".format(how_many)
+        )
+    return chosen
+
 
 def document_schema(schema, type, indent=0):
     """
@@ -104,16 +301,33 @@ def document_schema(schema, type, indent=0):
     return indent * " " + ".. {}::\n\n{}".format(type, schema)
 
 
-def exposed(request_schema, response_schema, validate=jsonschema.validate):
+def exposed(
+    request_schema, response_schema, validator=jsonschema.Draft3Validator,
+    connected=False,
+):
     """
     Document and validate an exposed API method.
 
     :argument request_schema: a schema to use to validate the incoming request
     :argument response_schema: a schema used only to document the response
                                object that will be sent back
+    :argument validator: the validator class to validate requests with
+    :argument connected: whether the method is passed the connection that
+                         called it (as ``connection``, which is None if it
+                         wasn't called over one)
+
+    The request schema is checked and compiled into a validator once, when the
+    method is exposed, and empty schemas skip validation entirely. Each call
+    is timed in the controller's :attr:`~APIController.timings`.
 
     """
 
+    if request_schema:
+        validator.check_schema(request_schema)
+        validate = validator(request_schema).validate
+    else:
+        validate = None
+
     def _expose(fn):
         if not fn.__doc__:
             raise ValueError(
@@ -130,22 +344,54 @@ def exposed(request_schema, response_schema, validate=jsonschema.validate):
 
         # TODO: Document schema["properties"] too
 
+        name = fn.__name__.replace("api_", "", 1).replace("_", ".")
+
         @functools.wraps(fn)
         def exposed_fn(self, **request):
-            validate(request, request_schema)
-            return fn(self, **request)
+            clock = self.timings.clock
+            start, validated = clock(), None
+
+            extra = {}
+            if connected:
+                extra["connection"] = request.pop("connection", None)
+
+            try:
+                if validate is not None:
+                    validate(request)
+                validated = clock()
+                return fn(self, **dict(request, **extra))
+            finally:
+                end = clock()
+                if validated is None:  # the request was invalid
+                    validated = end
+                self.timings.record(name, validated - start, end - validated)
 
         exposed_fn.request_schema = request_schema
         exposed_fn.response_schema = response_schema
+        exposed_fn.connected = connected
+        exposed_fn.__wrapped__ = fn
         return exposed_fn
     return _expose
 
 
 class APIController(object):
-    def __init__(self):
-        self.drafts = []
-        self.games = []
-        self.players = []
+    def __init__(self, games=None, pools=None, clock=reactor):
+        if games is None:
+            games = registry.GameRegistry()
+
+        self.games = games
+
+        # draftID -> the draft, and the (auth, drafter) pairs in it
+        self.drafts = {}
+        self.drafters = {}
+        self._draft_ids = count()
+
+        # the rarity pools of each set, worked out from the catalog once the
+        # first draft is created if not given
+        self.pools = pools
+        self.clock = clock
+
+        self.timings = timing.MethodTimings()
 
     def lookupMethod(self, name):
         """
@@ -178,7 +424,7 @@ class APIController(object):
 
         """
 
-        expected_auth, player = self.players[gameID][playerID]
+        expected_auth, player = self.games.player(gameID, playerID)
         if auth != expected_auth:
             raise NotAuthorized()
         player.concede()
@@ -199,6 +445,7 @@ class APIController(object):
              "gameID" : {"type" : "integer", "required" : True},
              "started" : {"type" : "boolean", "required" : True},
              "teams" : {"required" : True},
+             "version" : {"type" : "integer", "required" : True},
          },
          "additionalProperties" : False,
         },
@@ -207,36 +454,92 @@ class APIController(object):
         """
         Retrieve game info about a specific game.
 
+        The version is that of the game's state, which each of the deltas
+        pushed to its players (see :meth:`User.event_triggered`) brings them
+        up to.
+
         """
 
+        return self._game_info(gameID, verbose)
+
+    def _game_info(self, gameID, verbose=False):
         # XXX: verbose
-        game = self.games[gameID]
+        game = self.games.game(gameID)
         return {
             "gameID" : gameID, "started" : game.started, "teams" : game.teams,
+            "version" : self.games[gameID].deltas.version,
         }
 
     @exposed(
         {
          "type" : "object",
          "properties" : {
+             "states" : {
+                 "type" : "array", "default" : ["open", "running"],
+                 "items" : {"enum" : list(registry.STATES)},
+             },
+             "players" : {"type" : "integer", "minimum" : 0},
+             "since" : {"type" : "integer", "minimum" : 0, "default" : 0},
+             "limit" : {
+                 "type" : "integer", "minimum" : 1, "maximum" : 100,
+                 "default" : 50,
+             },
          },
          "additionalProperties" : False,
         },
         {
-         "type" : "array",
+         "type" : "object",
+         "properties" : {
+             "games" : {
+                 "type" : "array", "required" : True,
+                 "items" : {
+                     "type" : "object",
+                     "properties" : {
+                         "gameID" : {"type" : "integer", "required" : True},
+                         "state" : {
+                             "enum" : list(registry.STATES), "required" : True,
+                         },
+                         "players" : {"type" : "integer", "required" : True},
+                         "version" : {"type" : "integer", "required" : True},
+                     },
+                     "additionalProperties" : False,
+                 },
+             },
+             "more" : {"type" : "boolean", "required" : True},
+             "version" : {"type" : "integer", "required" : True},
+         },
+         "additionalProperties" : False,
         },
     )
-    def api_Game_list(self, verbose=False):
+    def api_Game_list(
+        self, states=("open", "running"), players=None, since=0, limit=50,
+    ):
         """
-        List the currently open games.
+        List games, optionally only those in the given states or with a given
+        number of players.
+
+        Only games that have changed since the given version are listed, in
+        the order they last changed. The returned version is a cursor to pass
+        back as ``since`` to get the next page (if there are ``more`` games),
+        or later on to get just the games that have changed since.
 
         """
 
-        info = self.lookupMethod("Game.info")
-        return [
-            info(gameID=i, verbose=verbose) for i in xrange(len(self.games))
-        ]
+        states = set(states)
 
+        games, more = [], False
+        for summary in self.games.changed_since(since):
+            if summary["state"] not in states:
+                continue
+            if players is not None and summary["players"] != players:
+                continue
+            if len(games) == limit:
+                more = True
+                break
+            games.append(summary)
+
+        version = games[-1]["version"] if more else self.games.version
+        return {"games" : games, "more" : more, "version" : version}
 
     @exposed(
         {
@@ -254,9 +557,14 @@ class APIController(object):
 
         """
 
-        self.games.append(core.Game(panglery.Pangler()))
-        self.players.append([])
-        return {"gameID" : len(self.games) - 1}
+        game = core.Game(events.EventHandler())
+        handle = self.games.register(game)
+        handle.spectators = spectators.Spectators()
+        handle.deltas = deltas.StateDeltas(
+            game, push=_push_delta, broadcast=handle.spectators.push,
+        )
+        handle.spectators.snapshot = handle.deltas.snapshot
+        return {"gameID" : handle.gameID}
 
 
     @exposed(
@@ -281,7 +589,7 @@ class APIController(object):
         """
 
         # XXX: Unknown game, not authorized
-        self.games[gameID].start()
+        self.games.game(gameID).start()
         return {}
 
     @exposed(
@@ -301,19 +609,31 @@ class APIController(object):
          },
          "additionalProperties" : False,
         },
+        connected=True,
     )
-    def api_Game_join(self, gameID, name):
+    def api_Game_join(self, gameID, name, connection):
         """
         Join a currently open game.
 
+        Changes to the game's state are pushed to the connection that joined.
+
         """
 
         # XXX: Can't join a started game, can't join twice, library
-        game, players = self.games[gameID], self.players[gameID]
-        player = game.add_player(library=[], user=User(), name=name)
-        auth = uuid.uuid4().bytes
-        players.append((auth, player))
-        return {"playerID" : len(players) - 1, "auth" : auth}
+        game, handle = self.games.game(gameID), self.games[gameID]
+
+        user = User()
+        user.protocol = connection
+        player = game.add_player(library=[], user=user, name=name)
+        user.game = game
+        user.card_id = handle.deltas.card_id
+        user.player_id = handle.deltas.players.get
+        user.snapshot = functools.partial(handle.deltas.snapshot, player)
+
+        auth = uuid.uuid4().hex
+        playerID = self.games.join(gameID, auth, player)
+        handle.deltas.players[player] = playerID
+        return {"playerID" : playerID, "auth" : auth}
 
     @exposed(
         {
@@ -336,68 +656,399 @@ class APIController(object):
 
         """
 
-        self.games[gameID].end()
+        self.games.game(gameID).end()
         return {}
 
+    @exposed(
+        {
+         "type" : "object",
+         "properties" : {
+             "gameID" : {"type" : "integer", "required" : True},
+         },
+         "additionalProperties" : False,
+        },
+        {
+         "type" : "object",
+         "properties" : {
+             "type" : {"type" : "string", "required" : True},
+             "version" : {"type" : "integer", "required" : True},
+             "players" : {"type" : "array", "required" : True},
+             "zones" : {"type" : "array", "required" : True},
+         },
+         "additionalProperties" : False,
+        },
+        connected=True,
+    )
+    def api_Game_watch(self, gameID, connection):
+        """
+        Watch a game as a spectator.
+
+        Returns a snapshot of the public state of the game (see
+        :meth:`cardboard.deltas.StateDeltas.snapshot`). The public deltas of
+        the game's state (see :mod:`cardboard.spectators`) are pushed to the
+        connection from the snapshot's version on.
 
-    @exposed({}, {})
-    def api_Draft_info(self):
         """
-        Retrieve game info about a specific draft.
 
+        if connection is None:
+            raise exceptions.InvalidAction("Only connections can watch games.")
+
+        self.games.game(gameID)
+        handle = self.games[gameID]
+        handle.spectators.add(connection)
+        connection.watching.add(handle.spectators)
+        return handle.deltas.snapshot()
+
+    @exposed(
+        {
+         "type" : "object",
+         "properties" : {
+             "gameID" : {"type" : "integer", "required" : True},
+         },
+         "additionalProperties" : False,
+        },
+        {
+         "type" : "object",
+         "properties" : {
+         },
+         "additionalProperties" : False,
+        },
+        connected=True,
+    )
+    def api_Game_unwatch(self, gameID, connection):
+        """
+        Stop watching a game.
+
+        """
+
+        handle = self.games[gameID]
+        if connection is not None and handle.spectators is not None:
+            handle.spectators.remove(connection)
+            connection.watching.discard(handle.spectators)
+        return {}
+
+
+    @exposed(
+        {
+         "type" : "object",
+         "properties" : {
+             "draftID" : {"type" : "integer", "required" : True},
+         },
+         "additionalProperties" : False,
+        },
+        {
+         "type" : "object",
+         "properties" : {
+             "draftID" : {"type" : "integer", "required" : True},
+             "state" : {
+                 "enum" : ["open", "drafting", "ended"], "required" : True,
+             },
+             "round" : {"type" : "integer", "required" : True},
+             "sets" : {
+                 "type" : "array", "items" : {"type" : "string"},
+                 "required" : True,
+             },
+             "seats" : {"type" : "integer", "required" : True},
+             "drafters" : {
+                 "type" : "array", "items" : {"type" : "string"},
+                 "required" : True,
+             },
+         },
+         "additionalProperties" : False,
+        },
+    )
+    def api_Draft_info(self, draftID):
         """
+        Retrieve info about a specific draft.
 
-        pass
+        """
 
+        return self._draft_info(draftID)
 
-    @exposed({}, {})
+    def _draft(self, draftID):
+        draft = self.drafts.get(draftID)
+        if draft is None:
+            raise exceptions.NoSuchObject(self, "draft", draftID)
+        return draft
+
+    def _draft_info(self, draftID):
+        draft = self._draft(draftID)
+        return {
+            "draftID" : draftID, "state" : draft.state, "round" : draft.round,
+            "sets" : draft.sets, "seats" : draft.seats,
+            "drafters" : [drafter.name for drafter in draft.drafters],
+        }
+
+    @exposed(
+        {
+         "type" : "object",
+         "additionalProperties" : False,
+        },
+        {
+         "type" : "object",
+         "properties" : {
+             "drafts" : {"type" : "array", "required" : True},
+         },
+         "additionalProperties" : False,
+        },
+    )
     def api_Draft_list(self):
         """
         List the currently open drafts.
 
         """
 
-        pass
-
+        return {
+            "drafts" : [
+                self._draft_info(draftID)
+                for draftID, draft in sorted(self.drafts.iteritems())
+                if draft.state == "open"
+            ],
+        }
 
-    @exposed({}, {})
-    def api_Draft_create(self):
+    @exposed(
+        {
+         "type" : "object",
+         "properties" : {
+             "sets" : {
+                 "type" : "array", "required" : True,
+                 "items" : {"type" : "string"},
+                 "minItems" : 1, "maxItems" : 3,
+             },
+             "seats" : {
+                 "type" : "integer", "minimum" : 2, "maximum" : 8,
+                 "default" : 8,
+             },
+             "timeout" : {"type" : "integer", "minimum" : 1, "default" : 60},
+         },
+         "additionalProperties" : False,
+        },
+        {
+         "type" : "object",
+         "properties" : {"draftID" : {"type" : "integer", "required" : True}},
+        },
+    )
+    def api_Draft_create(self, sets, seats=8, timeout=60):
         """
-        Create a new draft.
+        Create a new draft, opening a pack of each of the given sets in turn.
 
         """
 
-        pass
+        if self.pools is None:
+            self.pools = draft.catalog_pools()
 
+        draftID = next(self._draft_ids)
+        self.drafts[draftID] = draft.Draft(
+            self.pools, sets, seats=seats, timeout=timeout,
+            offer=functools.partial(_offer_pack, draftID),
+            picked=functools.partial(_auto_picked, draftID),
+            ended=functools.partial(self._release_draft, draftID),
+            clock=self.clock,
+        )
+        self.drafters[draftID] = []
+        return {"draftID" : draftID}
 
-    @exposed({}, {})
-    def api_Draft_start(self):
+    @exposed(
+        {
+         "type" : "object",
+         "properties" : {
+             "draftID" : {"type" : "integer", "required" : True},
+         },
+         "additionalProperties" : False,
+        },
+        {
+         "type" : "object",
+         "properties" : {
+         },
+         "additionalProperties" : False,
+        },
+    )
+    def api_Draft_start(self, draftID):
         """
         Start a draft.
 
         """
 
-        pass
-
+        self._draft(draftID).start()
+        return {}
 
-    @exposed({}, {})
-    def api_Draft_join(self):
+    @exposed(
+        {
+         "type" : "object",
+         "properties" : {
+             "draftID" : {"type" : "integer", "required" : True},
+             "name" : {"type" : "string", "required" : True},
+         },
+         "additionalProperties" : False,
+        },
+        {
+         "type" : "object",
+         "properties" : {
+             "auth" : {"type" : "string", "required" : True},
+             "drafterID" : {"type" : "integer", "required" : True},
+         },
+         "additionalProperties" : False,
+        },
+        connected=True,
+    )
+    def api_Draft_join(self, draftID, name, connection):
         """
         Join a currently open draft.
 
+        Each pack passed to the drafter is pushed to the connection that
+        joined as a ``packReceived`` notification, each card picked for them
+        when they run out of time as an ``autoPicked`` notification, and
+        all of their picks once the draft ends as a ``draftEnded``
+        notification.
+
+        """
+
+        drafter = self._draft(draftID).join(name, connection)
+        auth = uuid.uuid4().hex
+        drafters = self.drafters[draftID]
+        drafters.append((auth, drafter))
+        return {"drafterID" : len(drafters) - 1, "auth" : auth}
+
+    @exposed(
+        {
+         "type" : "object",
+         "properties" : {
+             "auth" : {"type" : "string", "required" : True},
+             "draftID" : {"type" : "integer", "required" : True},
+             "drafterID" : {"type" : "integer", "required" : True},
+             "card" : {"type" : "string", "required" : True},
+         },
+         "additionalProperties" : False,
+        },
+        {
+         "type" : "object",
+         "properties" : {
+         },
+         "additionalProperties" : False,
+        },
+    )
+    def api_Draft_pick(self, auth, draftID, drafterID, card):
+        """
+        Pick a card from the pack currently in front of a drafter.
+
         """
 
-        pass
+        drafter = self._drafter(auth, draftID, drafterID)
+        self._draft(draftID).pick(drafter, card)
+        return {}
 
+    @exposed(
+        {
+         "type" : "object",
+         "properties" : {
+             "auth" : {"type" : "string", "required" : True},
+             "draftID" : {"type" : "integer", "required" : True},
+             "drafterID" : {"type" : "integer", "required" : True},
+         },
+         "additionalProperties" : False,
+        },
+        {
+         "type" : "object",
+         "properties" : {
+             "picks" : {
+                 "type" : "array", "required" : True,
+                 "items" : {"type" : "string"},
+             },
+         },
+         "additionalProperties" : False,
+        },
+    )
+    def api_Draft_picks(self, auth, draftID, drafterID):
+        """
+        Retrieve the cards a drafter has picked so far.
 
-    @exposed({}, {})
-    def api_Draft_end(self):
         """
-        End the current draft.
 
+        drafter = self._drafter(auth, draftID, drafterID)
+        return {"picks" : list(drafter.picks)}
+
+    def _drafter(self, auth, draftID, drafterID):
+        self._draft(draftID)
+        drafters = self.drafters[draftID]
+        if not 0 <= drafterID < len(drafters):
+            raise exceptions.NoSuchObject(self, "drafter", drafterID)
+
+        expected_auth, drafter = drafters[drafterID]
+        if auth != expected_auth:
+            raise NotAuthorized()
+        return drafter
+
+    def _release_draft(self, draftID, ended):
         """
+        Forget an ended draft, sending each drafter their picks.
 
-        pass
+        """
+
+        for _, drafter in self.drafters.pop(draftID, ()):
+            if drafter.connection is not None:
+                drafter.connection.notifications.push(
+                    "draftEnded",
+                    {"draftID" : draftID, "picks" : list(drafter.picks)},
+                )
+        self.drafts.pop(draftID, None)
+
+    @exposed(
+        {
+         "type" : "object",
+         "properties" : {
+             "draftID" : {"type" : "integer", "required" : True},
+         },
+         "additionalProperties" : False,
+        },
+        {
+         "type" : "object",
+         "properties" : {
+         },
+         "additionalProperties" : False,
+        },
+    )
+    def api_Draft_end(self, draftID):
+        """
+        End a draft, releasing it.
+
+        """
+
+        self._draft(draftID).end()
+        return {}
+
+    @exposed(
+        {
+         "type" : "object",
+         "properties" : {
+             "auth" : {"type" : "string", "required" : True},
+             "gameID" : {"type" : "integer", "required" : True},
+             "playerID" : {"type" : "integer", "required" : True},
+             "stops" : {
+                 "type" : "array", "required" : True,
+                 "items" : {"enum" : sorted(priority.STOPS)},
+             },
+         },
+         "additionalProperties" : False,
+        },
+        {
+         "type" : "object",
+         "properties" : {
+         },
+         "additionalProperties" : False,
+        },
+    )
+    def api_Player_passUntil(self, auth, gameID, playerID, stops):
+        """
+        Pass priority whenever it's received until one of the given stops is
+        reached. An empty list of stops cancels passing.
+
+        """
+
+        expected_auth, player = self.games.player(gameID, playerID)
+        if auth != expected_auth:
+            raise NotAuthorized()
+        player.pass_until(*stops)
+        return {}
 
     @exposed(
         {
@@ -429,8 +1080,7 @@ class APIController(object):
 
         """
 
-        # XXX: No such player
-        player = self.players[gameID][playerID][1]
+        _, player = self.games.player(gameID, playerID)
         return {
             "name" : player.name, "handSize" : player.hand_size,
             "life" : player.life, "poison" : player.poison,
@@ -438,5 +1088,504 @@ class APIController(object):
         }
 
 
+def _push_delta(player, delta):
+    player.user.event_triggered(**delta)
+
+
+def _offer_pack(draftID, drafter, pack):
+    if drafter.connection is not None:
+        drafter.connection.notifications.push(
+            "packReceived", {"draftID" : draftID, "pack" : pack},
+        )
+
+
+def _auto_picked(draftID, drafter, card):
+    if drafter.connection is not None:
+        drafter.connection.notifications.push(
+            "autoPicked", {"draftID" : draftID, "card" : card},
+        )
+
+
+# JSON RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+
+def error_response(id, code, message):
+    """
+    Create a JSON RPC 2.0 error response.
+
+    """
+
+    return {
+        "jsonrpc" : "2.0", "id" : id,
+        "error" : {"code" : code, "message" : message},
+    }
+
+
+def run_request(locator, request):
+    """
+    Run a single JSON RPC 2.0 request.
+
+    :argument locator: a callable taking a method name and returning the
+                       method (e.g. :meth:`APIController.lookupMethod`)
+    :argument request: a (decoded) request object
+    :returns: the response, or None if the request was a notification
+
+    """
+
+    if not isinstance(request, dict) or "method" not in request:
+        return error_response(None, INVALID_REQUEST, "Invalid request.")
+
+    id = request.get("id")
+    params = request.get("params", {})
+
+    try:
+        if not isinstance(params, dict):
+            raise TypeError("Parameters must be passed by name.")
+        method = locator(request["method"])
+        _check_params(method, params)
+    except AttributeError:
+        response = error_response(id, METHOD_NOT_FOUND, "Method not found.")
+    except TypeError as error:
+        response = error_response(id, INVALID_PARAMS, str(error))
+    else:
+        try:
+            result = method(**params)
+        except jsonschema.ValidationError as error:
+            response = error_response(id, INVALID_PARAMS, str(error))
+        except Exception as error:
+            response = error_response(id, SERVER_ERROR, str(error))
+        else:
+            response = {"jsonrpc" : "2.0", "id" : id, "result" : result}
+
+    if "id" in request:
+        return response
+
+
+def _check_params(method, params):
+    """
+    Check that a method can be called with the given parameters, raising a
+    :exc:`TypeError` if not.
+
+    Exposed methods are checked against the signature of the function they
+    wrap, so that a :exc:`TypeError` raised while running one isn't mistaken
+    for the client's fault.
+
+    """
+
+    wrapped = getattr(method, "__wrapped__", None)
+    if wrapped is not None:
+        if getattr(method, "connected", False):
+            # the connection is passed by the engine, never by the client
+            if "connection" in params:
+                raise TypeError("Unexpected parameter: connection")
+            params = dict(params, connection=None)
+        inspect.getcallargs(wrapped, None, **params)
+    elif inspect.isfunction(method) or inspect.ismethod(method):
+        inspect.getcallargs(method, **params)
+
+
+def _is_response(message):
+    """
+    Whether a decoded message is a response (rather than a request).
+
+    """
+
+    return isinstance(message, dict) and "method" not in message and (
+        "result" in message or "error" in message
+    )
+
+
+def run_batch(locator, batch):
+    """
+    Run a JSON RPC 2.0 batch of requests in order.
+
+    :argument locator: see :func:`run_request`
+    :argument batch: a list of (decoded) request objects
+    :returns: a list with a response for each request that wasn't a
+              notification, or a single error response for an empty batch
+
+    """
+
+    if not batch:
+        return error_response(None, INVALID_REQUEST, "Empty batch.")
+
+    responses = (run_request(locator, request) for request in batch)
+    return [response for response in responses if response is not None]
+
+
+class NotificationQueue(object):
+    """
+    A connection's outgoing notifications.
+
+    Notifications pushed during a reactor tick (e.g. while handling a single
+    request) are gathered up, merged where later ones supersede earlier ones,
+    and written out together as a single (batch) frame at the end of it.
+
+    While the connection has fallen behind, notifications that a snapshot
+    can supersede aren't sent at all. Once it catches up, a single snapshot
+    is sent in place of all of them.
+
+    Arguments
+    ---------
+
+    * send: a function that writes a frame to the connection
+    * encode: a function that encodes a frame
+    * clock: an :class:`~twisted.internet.interfaces.IReactorTime` provider
+
+    """
+
+    #: method -> a function merging the parameters of many notifications
+    coalescers = {
+        "stateChanged" : deltas.coalesce,
+    }
+
+    def __init__(self, send, encode=json.dumps, clock=reactor):
+        super(NotificationQueue, self).__init__()
+
+        self.send = send
+        self.encode = encode
+        self.clock = clock
+
+        self.pending = []
+        self._call = None
+
+        self.behind = False
+        # snapshot function -> the method to send its snapshot as
+        self.snapshots = OrderedDict()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def push(self, method, params, snapshot=None):
+        """
+        Queue a notification, sending it at the end of the current tick.
+
+        :argument snapshot: a function returning the parameters of a
+                            notification that supersedes this one (and any
+                            others pushed with it before)
+
+        """
+
+        if snapshot is not None and self.behind:
+            self.snapshots[snapshot] = method
+            return
+
+        self.pending.append((method, params, snapshot))
+        self._schedule()
+
+    def fall_behind(self):
+        """
+        Hold back the notifications that a snapshot can supersede until the
+        connection catches up.
+
+        """
+
+        self.behind = True
+
+        pending, self.pending = self.pending, []
+        for method, params, snapshot in pending:
+            if snapshot is None:
+                self.pending.append((method, params, snapshot))
+            else:
+                self.snapshots[snapshot] = method
+
+    def catch_up(self):
+        """
+        Send a snapshot in place of each of the notifications held back.
+
+        """
+
+        self.behind = False
+
+        snapshots, self.snapshots = self.snapshots, OrderedDict()
+        self.pending[:0] = [
+            (method, snapshot(), None)
+            for snapshot, method in snapshots.iteritems()
+        ]
+        if self.pending:
+            self._schedule()
+
+    def _schedule(self):
+        if self._call is None:
+            self._call = self.clock.callLater(0, self.flush)
+
+    def flush(self):
+        """
+        Send all of the queued notifications now.
+
+        """
+
+        if self._call is not None and self._call.active():
+            self._call.cancel()
+        self._call = None
+
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+
+        frame = [
+            {"jsonrpc" : "2.0", "method" : method, "params" : params}
+            for method, params in self._coalesce(pending)
+        ]
+        self.send(self.encode(frame))
+
+    def _coalesce(self, pending):
+        """
+        Merge the notifications of each method that has a coalescer, in the
+        place of the first of them.
+
+        """
+
+        by_method, order = {}, []
+        for method, params, _ in pending:
+            if method in self.coalescers:
+                if method in by_method:
+                    by_method[method].append(params)
+                    continue
+                by_method[method] = [params]
+            order.append((method, params))
+
+        for method, params in order:
+            if method in by_method:
+                for merged in self.coalescers[method](by_method[method]):
+                    yield method, merged
+            else:
+                yield method, params
+
+
+class EngineProtocol(txjsonrpc.JSONRPC):
+    """
+    The engine port's protocol, which also accepts batches of requests.
+
+    A batch's calls are run in order, and all of their responses are sent
+    back together in a single frame.
+
+    Clients may switch to another encoding (see :mod:`cardboard.encoding`)
+    with their first message. Notifications are sent (in the connection's
+    encoding) through its :attr:`notifications` queue, and calls to the
+    client (e.g. asking its user to select something) with
+    :meth:`callRemote`. Messages from the client that answer those calls
+    are told apart from its requests by having no method.
+
+    Each connection registers itself as a producer with its transport, which
+    pauses it (see :attr:`paused`) once it has more than :attr:`budget` bytes
+    buffered, and resumes it once they've all been sent. While it's paused,
+    state deltas are held back (and collapsed into a single snapshot to send
+    when it resumes), spectators skip it, and whatever else is written to it
+    is counted in :attr:`backlog`. A connection whose backlog grows past
+    :attr:`limit` is dropped, and its client will need to resync (e.g. by
+    rejoining) when it reconnects.
+
+    """
+
+    encoding = encoding.JSON
+
+    #: how many bytes the transport may buffer before pausing the connection
+    budget = 2 ** 16
+
+    #: how many bytes may be written to a paused connection before dropping it
+    limit = 2 ** 20
+
+    #: whether the transport has more buffered than it's able to send
+    paused = False
+
+    #: how many bytes have been written since the connection was paused
+    backlog = 0
+
+    def connectionMade(self):
+        self.notifications = NotificationQueue(self.sendString)
+        self.watching = weakref.WeakSet()
+        self._negotiable = True
+
+        # request ID -> the Deferred waiting on the client's answer
+        self._calls = {}
+        self._call_ids = count()
+
+        locate = self.locator
+        self.locator = lambda name : self._bind(locate(name))
+
+        if self.transport is not None:
+            self.transport.bufferSize = self.budget
+            self.transport.registerProducer(self, True)
+        txjsonrpc.JSONRPC.connectionMade(self)
+
+    def connectionLost(self, reason):
+        self.notifications.pending = []
+        self.notifications.snapshots.clear()
+        for watched in list(self.watching):
+            watched.remove(self)
+        self.watching.clear()
+
+        calls, self._calls = self._calls, {}
+        for calling in calls.itervalues():
+            calling.errback(reason)
+
+        txjsonrpc.JSONRPC.connectionLost(self, reason)
+
+    def callRemote(self, method, **params):
+        """
+        Call a method on the client, in the connection's encoding.
+
+        Returns a Deferred that fires with the client's result, or fails with
+        a :exc:`RemoteError` if it answers with an error.
+
+        """
+
+        id = next(self._call_ids)
+        calling = self._calls[id] = defer.Deferred()
+        self.sendString(self.encoding.dumps({
+            "jsonrpc" : "2.0", "id" : id, "method" : method, "params" : params,
+        }))
+        return calling
+
+    def sendString(self, string):
+        if self.paused:
+            self.backlog += len(string)
+            if self.backlog > self.limit:
+                self.drop()
+                return
+        txjsonrpc.JSONRPC.sendString(self, string)
+
+    def drop(self):
+        """
+        Disconnect a client that has fallen too far behind, without waiting
+        for what's buffered for it to be sent.
+
+        """
+
+        log.msg(
+            "Dropping a connection {} bytes behind.".format(self.backlog)
+        )
+        self.transport.unregisterProducer()
+        self.transport.abortConnection()
+
+    def pauseProducing(self):
+        self.paused = True
+        self.notifications.fall_behind()
+
+    def resumeProducing(self):
+        self.paused = False
+        self.backlog = 0
+        self.notifications.catch_up()
+
+    def stopProducing(self):
+        self.paused = True
+
+    def _bind(self, method):
+        """
+        Pass this connection to a method that wants it.
+
+        """
+
+        if not getattr(method, "connected", False):
+            return method
+
+        @functools.wraps(method)
+        def bound(**params):
+            return method(connection=self, **params)
+        return bound
+
+    def stringReceived(self, string):
+        if self._negotiable:
+            self._negotiable = False
+            if self.negotiate(string):
+                return
+
+        try:
+            message = self.encoding.loads(string)
+        except Exception:
+            response = error_response(None, PARSE_ERROR, "Parse error.")
+        else:
+            if isinstance(message, list):
+                requests = [each for each in message if not self._answer(each)]
+                response = None
+                if requests or not message:
+                    response = run_batch(self.locator, requests)
+            elif self._answer(message):
+                response = None
+            else:
+                response = run_request(self.locator, message)
+
+        if response:
+            self.sendString(self.encoding.dumps(response))
+
+    def _answer(self, message):
+        """
+        Fire the call that a message answers, if it's a response.
+
+        Returns whether it was one.
+
+        """
+
+        if not _is_response(message):
+            return False
+
+        id = message.get("id")
+        calling = self._calls.pop(id, None) if isinstance(id, int) else None
+        if calling is None:
+            log.msg("Ignoring a response to no call: {!r}".format(message))
+            return True
+
+        error = message.get("error")
+        if error is None:
+            calling.callback(message.get("result"))
+        elif isinstance(error, dict):
+            code, message = error.get("code"), error.get("message")
+            calling.errback(RemoteError(code, message))
+        else:
+            calling.errback(RemoteError(None, error))
+        return True
+
+    def negotiate(self, string):
+        """
+        Switch encodings if the given message is an ``encoding`` request.
+
+        Returns whether it was one.
+
+        """
+
+        if '"encoding"' not in string:
+            return False
+
+        try:
+            request = json.loads(string)
+        except ValueError:
+            return False
+        if not isinstance(request, dict):
+            return False
+        elif request.get("method") != "encoding":
+            return False
+
+        name = (request.get("params") or {}).get("name")
+        id = request.get("id")
+
+        chosen = encoding.ENCODINGS.get(name)
+        if chosen is None:
+            response = error_response(
+                id, INVALID_PARAMS, "Unknown encoding {!r} (expected one "
+                "of: {}).".format(name, ", ".join(sorted(encoding.ENCODINGS)))
+            )
+        else:
+            response = {
+                "jsonrpc" : "2.0", "id" : id, "result" : {"name" : name},
+            }
+
+        self.sendString(json.dumps(response))
+
+        if chosen is not None:
+            self.encoding = chosen
+            self.notifications.encode = chosen.dumps
+        return True
+
+
+class EngineFactory(txjsonrpc.JSONRPCFactory):
+    protocol = EngineProtocol
+
+
 controller = APIController()
-factory = txjsonrpc.JSONRPCFactory(controller.lookupMethod)
+factory = EngineFactory(controller.lookupMethod)
@@ -5,12 +5,18 @@ This module implements the Magic: The Gathering game :term:`objects`.
 
 from cardboard import events, exceptions, types
 from cardboard.ability import AbilityNotImplemented
-from cardboard.cards import cards
+from cardboard.cards import cards, keywords
 from cardboard.db import models, Session
 from cardboard.util import requirements
 
 
-__all__ = ["Card", "Spell", "Token", "characteristics"]
+__all__ = ["Card", "Spell", "Token", "change_statuses", "characteristics"]
+
+
+# card name -> the keyword bitmask and parameters parsed from its oracle text
+_keywords = {}
+# status event -> (the attribute storing the status, its value)
+_statuses = {}
 
 
 def status(name, on_event, off_event, default=True):
@@ -19,11 +25,13 @@ def status(name, on_event, off_event, default=True):
 
     """
 
-    stupid_nonlocal = [default]
+    attribute = "_" + name
+    _statuses[on_event] = attribute, True
+    _statuses[off_event] = attribute, False
 
     @property
     def get(self):
-        return stupid_nonlocal[0]
+        return getattr(self, attribute, default)
 
     def toggle(turn_on):
         if turn_on:
@@ -35,17 +43,34 @@ def status(name, on_event, off_event, default=True):
             self.game.require(started=True)
             self.require(zone=self.game.battlefield, **{name : not turn_on})
 
-            stupid_nonlocal[0] = turn_on
+            setattr(self, attribute, turn_on)
 
-            self.game.events.trigger(
-                event=events.STATUS_CHANGED, card=self, status=event
-            )
+            self.game.events.trigger(events.STATUS_CHANGED(self, event))
 
         return setter
 
     return get, toggle(turn_on=True), toggle(turn_on=False)
 
 
+def change_statuses(game, changes):
+    """
+    Change the statuses of many permanents simultaneously.
+
+    Takes a list of (card, status) pairs, where each status is one of the
+    statuses of a :const:`STATUS_CHANGED` event. A single
+    :const:`STATUSES_CHANGED` event is triggered for all of the changes.
+
+    """
+
+    game.require(started=True)
+
+    for card, status in changes:
+        attribute, value = _statuses[status]
+        setattr(card, attribute, value)
+
+    game.events.trigger(events.STATUSES_CHANGED(changes))
+
+
 _tap = status("is_tapped", "tapped", "untapped", default=False)
 _flip = status("is_flipped", "flipped", "unflipped", default=False)
 _turn = status("is_face_up", "face up", "face down", True)
@@ -83,11 +108,20 @@ class Card(object):
         else:
             self.abilities = [AbilityNotImplemented] * len(db_card.abilities)
 
+        try:
+            self.keywords, self.keyword_parameters = _keywords[self.name]
+        except KeyError:
+            self.keywords = keywords.parse(db_card.abilities)
+            self.keyword_parameters = keywords.parameters(db_card.abilities)
+            _keywords[self.name] = self.keywords, self.keyword_parameters
+
         self.power = self.base_power = db_card.power
         self.toughness = self.base_toughness = db_card.toughness
 
         self.can_attack = True
+        self.can_block = True
         self.damage = 0
+        self._deathtouch_damage = False
         self._changed_colors = set()
 
     def __lt__(self, other):
@@ -160,9 +194,8 @@ class Card(object):
                 raise exceptions.InvalidAction(err.format(self.owner))
 
         self.game.stack.add(Spell(self))
-        self.game.events.trigger(  # XXX: isn't necessarily the right player
-            event=events.CARD_CAST, card=self, player=self.owner,
-        )
+        # XXX: isn't necessarily the right player
+        self.game.events.trigger(events.CARD_CAST(self, self.owner))
 
 
 class Spell(object):
@@ -208,6 +241,8 @@ class Token(object):
         self.mana_cost = mana_cost
         self.colors = set(colors)
         self.abilities = list(abilities)
+        self.keywords = keywords.parse(self.abilities)
+        self.keyword_parameters = keywords.parameters(self.abilities)
         self.types = set(types)
         self.subtypes, self.supertypes = set(subtypes), set(supertypes)
         self.power, self.toughness = power, toughness
@@ -3,6 +3,8 @@ Implementations of common card mechanics.
 
 """
 
+from cardboard.util import suspendable
+
 
 def destroy(card):
     """
@@ -13,6 +15,7 @@ def destroy(card):
     card.owner.graveyard.move(card)
 
 
+@suspendable
 def draw_discard(player, draw=1, discard=1, to=None):
     """
     Draw cards then select cards to discard to a given zone.
@@ -23,7 +26,7 @@ def draw_discard(player, draw=1, discard=1, to=None):
         to = player.graveyard
 
     player.draw(draw)
-    discarded = player.user.select_cards(player.hand, how_many=discard)
+    discarded = yield player.user.select_cards(player.hand, how_many=discard)
 
     for card in discarded:
         to.move(card)
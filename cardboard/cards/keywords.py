@@ -1,3 +1,5 @@
+import re
+
 from cardboard.ability import AbilityNotImplemented
 from cardboard.util import populate
 
@@ -448,3 +450,105 @@ def battle_cry(card):
 @ability(name="Living Weapon")
 def living_weapon(card):
     return AbilityNotImplemented
+
+
+# Each keyword ability gets its own bit, so that checking whether an object has
+# a keyword ability is a single bitwise and.
+KEYWORDS = {name : 1 << bit for bit, name in enumerate(sorted(abilities))}
+
+_BY_TEXT = {name.lower() : mask for name, mask in KEYWORDS.iteritems()}
+_LONGEST = max(len(name.split()) for name in KEYWORDS)
+_REMINDER_TEXT = re.compile(r"\(.*?\)")
+_COLORS = {
+    u"white" : u"W", u"blue" : u"U", u"black" : u"B", u"red" : u"R",
+    u"green" : u"G",
+}
+
+
+def mask(*names):
+    """
+    Get the bitmask of the given keyword abilities.
+
+    """
+
+    keywords = 0
+    for name in names:
+        try:
+            keywords |= KEYWORDS[name]
+        except KeyError:
+            raise ValueError("'{}' is not a keyword ability.".format(name))
+    return keywords
+
+
+def names(keywords):
+    """
+    Get the names of the keyword abilities in a bitmask.
+
+    """
+
+    return {name for name, bit in KEYWORDS.iteritems() if keywords & bit}
+
+
+def parse(texts):
+    """
+    Get the bitmask of the keyword abilities in some (oracle) ability texts.
+
+    A keyword line may list several keywords (e.g. "Flying, first strike").
+    Keywords followed by a parameter (e.g. "Protection from red", "Equip {2}")
+    and the various kinds of landwalk are recognized.
+
+    """
+
+    keywords = 0
+
+    for text in texts:
+        if not isinstance(text, basestring):
+            continue
+
+        for part in _REMINDER_TEXT.sub("", text).split(","):
+            words = part.lower().split()
+            if not words:
+                break
+
+            for length in range(min(len(words), _LONGEST), 0, -1):
+                bit = _BY_TEXT.get(" ".join(words[:length]))
+                if bit is not None:
+                    keywords |= bit
+                    break
+            else:
+                if not words[0].endswith("walk"):
+                    break
+                keywords |= KEYWORDS["Landwalk"]
+
+    return keywords
+
+
+def parameters(texts):
+    """
+    Get the parameters of the keyword abilities in some ability texts that
+    have them.
+
+    Returns a dict mapping "Protection" to the colors (as mana symbols) that
+    are protected from, and "Landwalk" to the land types that are walked.
+
+    """
+
+    found = {}
+
+    for text in texts:
+        if not isinstance(text, basestring):
+            continue
+
+        for part in _REMINDER_TEXT.sub("", text).split(","):
+            words = part.lower().split()
+            if not words:
+                break
+
+            if words[0] == u"protection":
+                colors = {_COLORS[word] for word in words if word in _COLORS}
+                found.setdefault(u"Protection", set()).update(colors)
+            elif words[0].endswith(u"walk") and words[0] != u"walk":
+                land_type = words[0][:-len(u"walk")].title()
+                found.setdefault(u"Landwalk", set()).add(land_type)
+
+    return found
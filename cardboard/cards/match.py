@@ -1,4 +1,6 @@
 from cardboard import types
+from cardboard.cards import keywords
+from cardboard.effects import ContinuousEffects
 
 
 class Match(object):
@@ -79,6 +81,33 @@ is_nonbasic_land = is_land & ~has_supertypes(u"Basic")
 
 is_permanent = Match(lambda obj : obj.types & types.permanents)
 
-phases = is_permanent & Match(
-    lambda obj : any(abil.startswith("Phasing") for abil in obj.abilities)
+
+def has_keywords(*names):
+    """
+    Match objects that have all of the given keyword abilities.
+
+    Objects in a game are checked after applying its continuous effects (so
+    that e.g. granted keywords count).
+
+    """
+
+    wanted = keywords.mask(*names)
+
+    def _has(obj):
+        continuous = getattr(getattr(obj, "game", None), "continuous", None)
+        if isinstance(continuous, ContinuousEffects):
+            return continuous.has_keywords(obj, wanted)
+        return (obj.keywords & wanted) == wanted
+    return Match(_has)
+
+
+phases = is_permanent & has_keywords(u"Phasing")
+has_flash = has_keywords(u"Flash")
+has_vigilance = has_keywords(u"Vigilance")
+is_instant_speed = is_instant | has_flash
+has_activated_abilities = Match(
+    lambda obj : any(
+        getattr(ability, "type", None) == "activated"
+        for ability in obj.abilities
+    )
 )
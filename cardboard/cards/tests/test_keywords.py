@@ -0,0 +1,48 @@
+import unittest
+
+from cardboard.cards import keywords as k
+
+
+class TestKeywords(unittest.TestCase):
+    def test_each_keyword_has_its_own_bit(self):
+        bits = k.KEYWORDS.values()
+        self.assertEqual(len(set(bits)), len(k.abilities))
+        self.assertTrue(all(bit & (bit - 1) == 0 for bit in bits))
+
+    def test_mask(self):
+        both = k.mask(u"Flying", u"Trample")
+        self.assertEqual(k.names(both), {u"Flying", u"Trample"})
+        self.assertEqual(k.mask(), 0)
+
+        with self.assertRaises(ValueError):
+            k.mask(u"Not A Keyword")
+
+    def test_parse(self):
+        self.assertEqual(k.parse([u"Flying"]), k.mask(u"Flying"))
+        self.assertEqual(
+            k.parse([u"Flying, first strike", u"Vigilance"]),
+            k.mask(u"Flying", u"First Strike", u"Vigilance"),
+        )
+
+    def test_parse_parameters_and_reminder_text(self):
+        self.assertEqual(
+            k.parse([
+                u"Protection from red",
+                u"Equip {2} ({2}: Attach to target creature you control.)",
+                u"Flashback {R}",
+            ]),
+            k.mask(u"Protection", u"Equip", u"Flashback"),
+        )
+
+    def test_parse_landwalk(self):
+        self.assertEqual(k.parse([u"Swampwalk"]), k.mask(u"Landwalk"))
+
+    def test_parse_ignores_other_abilities(self):
+        self.assertEqual(
+            k.parse([
+                u"When Foo enters the battlefield, draw a card.",
+                u"Enchanted creature has flying.",
+                u"{T}: Add {G} to your mana pool.",
+            ]),
+            0,
+        )
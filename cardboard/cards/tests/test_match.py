@@ -2,8 +2,8 @@ import unittest
 
 import mock
 
-from cardboard import types
-from cardboard.cards import match as m
+from cardboard import core, effects, events, types
+from cardboard.cards import keywords, match as m
 
 
 class TestMatch(unittest.TestCase):
@@ -169,10 +169,44 @@ class TestMatchers(unittest.TestCase):
 
         self.assertFalse(m.is_colorless(c))
 
+    def test_has_keywords(self):
+        c = mock.Mock(keywords=keywords.mask(u"Flying", u"Reach"))
+
+        self.assertTrue(m.has_keywords(u"Flying")(c))
+        self.assertTrue(m.has_keywords(u"Flying", u"Reach")(c))
+        self.assertFalse(m.has_keywords(u"Flying", u"Shadow")(c))
+
     def test_phases(self):
         c = mock.Mock()
-        c.abilities = []
+        c.keywords = keywords.parse([])
         c.types = {"Creature"}
         self.assertFalse(m.phases(c))
-        c.abilities.append("Phasing (bla bla)")
+        c.keywords = keywords.parse(["Phasing (bla bla)"])
+        self.assertTrue(m.phases(c))
+
+    def test_phases_granted(self):
+        game = core.Game(events.EventHandler())
+        c = mock.Mock(game=game, keywords=0, types={"Creature"}, abilities=[])
+        game.battlefield.add(c)
+        self.assertFalse(m.phases(c))
+
+        phasing = keywords.mask(u"Phasing")
+        game.continuous.add(effects.grant_keywords(phasing))
         self.assertTrue(m.phases(c))
+
+    def test_is_instant_speed(self):
+        c = mock.Mock(keywords=0, types={types.instant})
+        self.assertTrue(m.is_instant_speed(c))
+
+        c.types = {types.creature}
+        self.assertFalse(m.is_instant_speed(c))
+
+        c.keywords = keywords.mask(u"Flash")
+        self.assertTrue(m.is_instant_speed(c))
+
+    def test_has_activated_abilities(self):
+        c = mock.Mock(abilities=[mock.Mock(type="static")])
+        self.assertFalse(m.has_activated_abilities(c))
+
+        c.abilities.append(mock.Mock(type="activated"))
+        self.assertTrue(m.has_activated_abilities(c))
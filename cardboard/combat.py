@@ -0,0 +1,484 @@
+"""
+Implements attacking, blocking and combat damage (see :ref:`combat-phase`).
+
+A :class:`Combat` records the attacks and blocks declared during a combat
+phase and deals its combat damage.
+
+Combat damage is dealt in passes: a first strike pass if any attacking or
+blocking creature has first strike or double strike, followed by the regular
+one. Each pass reads the power, toughness and marked damage of every creature
+involved up front, assigns all of the damage, totals it by recipient and then
+deals it, triggering a single event for the whole pass.
+
+.. seealso::
+    :ref:`declare-attackers-step`, :ref:`declare-blockers-step` and
+    :ref:`combat-damage-step`
+
+"""
+
+from cardboard import events, exceptions, types
+from cardboard.cards import keywords, match
+
+
+__all__ = ["Combat"]
+
+
+DEATHTOUCH = keywords.mask(u"Deathtouch")
+DOUBLE_STRIKE = keywords.mask(u"Double Strike")
+FEAR = keywords.mask(u"Fear")
+FIRST_STRIKE = keywords.mask(u"First Strike")
+FLYING = keywords.mask(u"Flying")
+HORSEMANSHIP = keywords.mask(u"Horsemanship")
+INTIMIDATE = keywords.mask(u"Intimidate")
+LANDWALK = keywords.mask(u"Landwalk")
+PROTECTION = keywords.mask(u"Protection")
+REACH = keywords.mask(u"Reach")
+SHADOW = keywords.mask(u"Shadow")
+TRAMPLE = keywords.mask(u"Trample")
+
+
+class Combat(object):
+    """
+    The attacks and blocks of a single combat phase.
+
+    """
+
+    def __init__(self, game):
+        super(Combat, self).__init__()
+
+        self.game = game
+
+        # attacker -> the player or planeswalker it is attacking
+        self.attacks = {}
+        # blocker -> the attacker it is blocking
+        self.blocks = {}
+        # attacker -> its blockers, in damage assignment order
+        self.blockers = {}
+
+        # restrictions on blocking: (blocker, attacker) -> whether it can block
+        self.restrictions = []
+
+        # defending player -> ({blocker : attackers}, {creature : signature})
+        self._legality = {}
+        self._first_strike = None
+
+    def __contains__(self, creature):
+        return creature in self.attacks or creature in self.blocks
+
+    def __repr__(self):
+        return "<Combat: {} attacking, {} blocking>".format(
+            len(self.attacks), len(self.blocks)
+        )
+
+    def is_blocked(self, attacker):
+        """
+        Check whether an attacking creature became blocked.
+
+        A creature remains blocked even if its blockers are removed from
+        combat.
+
+        """
+
+        return attacker in self.blockers
+
+    def declare_attackers(self, attacks):
+        """
+        Declare attacking creatures.
+
+        Takes a mapping from each attacking creature to the player or
+        planeswalker it attacks.
+
+        """
+
+        for attacker, defending in attacks.iteritems():
+            if attacker in self:
+                err = "{} is already in combat.".format(attacker)
+                raise exceptions.InvalidAction(err)
+            self.attacks[attacker] = defending
+
+        self.game.events.trigger(
+            events.ATTACKERS_DECLARED(self.game.turn.active_player, attacks)
+        )
+
+    def declare_blockers(self, player, blocks):
+        """
+        Declare blocking creatures for a defending player.
+
+        Takes a mapping from each blocking creature to the attacking creature
+        it blocks. Blockers are added to the end of each attacker's damage
+        assignment order (see :meth:`order_blockers`).
+
+        """
+
+        legal = self.legal_blocks(player)
+
+        for blocker, attacker in blocks.iteritems():
+            if attacker not in self.attacks:
+                err = "{} is not attacking.".format(attacker)
+                raise exceptions.InvalidAction(err)
+            elif blocker in self:
+                err = "{} is already in combat.".format(blocker)
+                raise exceptions.InvalidAction(err)
+            elif attacker not in legal.get(blocker, ()):
+                err = "{} can't block {}.".format(blocker, attacker)
+                raise exceptions.InvalidAction(err)
+
+        for blocker, attacker in blocks.iteritems():
+            self.blocks[blocker] = attacker
+            self.blockers.setdefault(attacker, []).append(blocker)
+
+        self.game.events.trigger(events.BLOCKERS_DECLARED(player, blocks))
+
+    def add_restriction(self, restriction):
+        """
+        Add a restriction on blocking.
+
+        A restriction is a predicate taking a potential blocker and an
+        attacking creature, and returns whether the blocker can block it.
+
+        """
+
+        self.restrictions.append(restriction)
+        self._legality.clear()
+
+    def legal_blocks(self, player):
+        """
+        Get which attacking creatures each creature a defending player
+        controls can block.
+
+        Returns a dict mapping each potential blocker to a frozenset of the
+        attackers it can block. The result is cached for the combat, and
+        only the rows and columns of creatures whose relevant characteristics
+        changed (or that entered or left the battlefield) are recalculated.
+
+        """
+
+        matrix, signatures = self._legality.setdefault(player, ({}, {}))
+
+        battlefield = self.game.battlefield
+        attackers = [
+            attacker for attacker, attacked in self.attacks.iteritems()
+            if attacker in battlefield and (
+                attacked is player or
+                getattr(attacked, "controller", None) is player
+            )
+        ]
+        permanents = player.battlefield
+        blockers = [
+            creature for creature in permanents if match.is_creature(creature)
+        ]
+        lands = frozenset().union(
+            *(card.subtypes for card in permanents if match.is_land(card))
+        )
+
+        current = {
+            creature : self._signature(creature)
+            for creature in attackers + blockers
+        }
+        current[player] = lands
+
+        if signatures.get(player) != lands:
+            changed = set(current)
+            matrix.clear()
+            signatures.clear()
+        else:
+            changed = {
+                creature for creature, signature in current.iteritems()
+                if signatures.get(creature) != signature
+            }
+
+        for gone in set(signatures) - set(current):
+            matrix.pop(gone, None)
+            changed.add(gone)
+
+        if not changed:
+            return matrix
+
+        changed_attackers = [
+            attacker for attacker in attackers if attacker in changed
+        ]
+
+        for blocker in blockers:
+            signature = current[blocker]
+            if blocker in changed:
+                check = attackers
+                row = set()
+            else:
+                check = changed_attackers
+                row = set(matrix[blocker]) - changed
+
+            row.update(
+                attacker for attacker in check if self._can_block(
+                    blocker, signature, attacker, current[attacker], lands,
+                )
+            )
+            matrix[blocker] = frozenset(row)
+
+        signatures.clear()
+        signatures.update(current)
+        return matrix
+
+    def order_blockers(self, attacker, order):
+        """
+        Announce the damage assignment order of a blocked creature.
+
+        """
+
+        order = list(order)
+        if sorted(order, key=id) != sorted(self.blockers[attacker], key=id):
+            err = "The damage assignment order of {} must contain each of its "
+            raise exceptions.BadSelection(err.format(attacker) + "blockers.")
+        self.blockers[attacker] = order
+
+    def remove(self, creature):
+        """
+        Remove a creature from combat.
+
+        """
+
+        if creature in self.attacks:
+            del self.attacks[creature]
+            for blocker in self.blockers.pop(creature, ()):
+                del self.blocks[blocker]
+        elif creature in self.blocks:
+            self.blockers[self.blocks.pop(creature)].remove(creature)
+        else:
+            raise exceptions.NoSuchObject(self, "creature", creature)
+
+    @property
+    def damage_passes(self):
+        """
+        The number of combat damage steps that this combat has.
+
+        """
+
+        if self._first_strike is None:
+            get = self.game.continuous.get
+            return 2 if any(
+                get(creature, "keywords") & (FIRST_STRIKE | DOUBLE_STRIKE)
+                for creature in self._creatures()
+            ) else 1
+        return 2 if self._first_strike else 1
+
+    def deal_damage(self):
+        """
+        Assign and deal the combat damage for the next combat damage step.
+
+        Returns the damage that was dealt, as a list of (source, recipient,
+        amount) tuples.
+
+        """
+
+        get = self.game.continuous.get
+
+        creatures = self._creatures()
+        masks = [get(creature, "keywords") for creature in creatures]
+
+        if self._first_strike is None:
+            self._first_strike = {
+                creature for creature, bits in zip(creatures, masks)
+                if bits & (FIRST_STRIKE | DOUBLE_STRIKE)
+            }
+
+            if self._first_strike:
+                first_strike_pass = True
+                dealing = [
+                    creature in self._first_strike for creature in creatures
+                ]
+            else:
+                first_strike_pass = False
+                dealing = [True] * len(creatures)
+        else:
+            first_strike_pass = False
+            dealing = [
+                creature not in self._first_strike or bits & DOUBLE_STRIKE
+                for creature, bits in zip(creatures, masks)
+            ]
+
+        power = [
+            max(get(creature, "power") or 0, 0) if deals else 0
+            for creature, deals in zip(creatures, dealing)
+        ]
+        lethal = {
+            creature : get(creature, "toughness") - creature.damage
+            for creature in creatures
+        }
+
+        players = self.game.players
+
+        assigned = []
+        for creature, amount, bits in zip(creatures, power, masks):
+            if amount:
+                assigned.extend(
+                    self._assign(creature, amount, bits, lethal, players)
+                )
+
+        deathtouch = {
+            creature for creature, bits in zip(creatures, masks)
+            if bits & DEATHTOUCH
+        }
+        self._deal(assigned, players, deathtouch)
+
+        self.game.events.trigger(
+            events.COMBAT_DAMAGE_DEALT(
+                self.game.turn.active_player, assigned, first_strike_pass,
+            )
+        )
+        return assigned
+
+    def _assign(self, creature, amount, bits, lethal, players):
+        """
+        Assign a creature's combat damage.
+
+        Attackers assign lethal damage to each of their blockers in order
+        (taking into account damage already assigned this step) with the rest
+        going to the last one, or with trample, to whatever they're attacking.
+
+        """
+
+        if creature in self.blocks:
+            attacker = self.blocks[creature]
+            if attacker not in lethal:
+                return []
+            return [(creature, attacker, amount)]
+
+        defending = self.attacks[creature]
+        if defending not in players and defending not in self.game.battlefield:
+            return []
+
+        if not self.is_blocked(creature):
+            return [(creature, defending, amount)]
+
+        assigned = []
+        trample = bits & TRAMPLE
+        blockers = [b for b in self.blockers[creature] if b in lethal]
+
+        for position, blocker in enumerate(blockers, 1):
+            if not amount:
+                break
+
+            if position == len(blockers) and not trample:
+                dealt = amount
+            elif bits & DEATHTOUCH:
+                dealt = 1
+            else:
+                dealt = min(max(lethal[blocker], 0), amount)
+
+            if dealt:
+                assigned.append((creature, blocker, dealt))
+                lethal[blocker] -= dealt
+                amount -= dealt
+
+        if amount and trample:
+            assigned.append((creature, defending, amount))
+        return assigned
+
+    def _deal(self, assigned, players, deathtouch):
+        """
+        Deal all of the assigned combat damage simultaneously.
+
+        """
+
+        totals, deathtouched, damaged = {}, set(), []
+
+        for source, recipient, amount in assigned:
+            totals[recipient] = totals.get(recipient, 0) + amount
+            if source in deathtouch:
+                deathtouched.add(recipient)
+
+        for recipient, amount in totals.iteritems():
+            if recipient in players:
+                recipient.life -= amount
+            elif match.is_planeswalker(recipient):
+                recipient.loyalty -= amount
+            else:
+                recipient.damage += amount
+                if recipient in deathtouched:
+                    recipient._deathtouch_damage = True
+                damaged.append(recipient)
+
+        if damaged:
+            self.game.turn.until_end_of_turn(
+                lambda : _remove_damage(damaged)
+            )
+
+    def _creatures(self):
+        """
+        The creatures in combat, still on the battlefield.
+
+        """
+
+        battlefield = self.game.battlefield
+        return [
+            creature for creature in list(self.attacks) + list(self.blocks)
+            if creature in battlefield
+        ]
+
+    def _signature(self, creature):
+        """
+        The characteristics of a creature that affect what it can block.
+
+        """
+
+        get = self.game.continuous.get
+        parameters = getattr(creature, "keyword_parameters", None) or {}
+        return (
+            get(creature, "keywords"),
+            frozenset(get(creature, "colors") or ()),
+            frozenset(get(creature, "types") or ()),
+            bool(creature.is_tapped),
+            getattr(creature, "can_block", True),
+            frozenset(parameters.get(u"Protection", ())),
+            frozenset(parameters.get(u"Landwalk", ())),
+        )
+
+    def _can_block(self, blocker, blocking, attacker, attacking, lands):
+        """
+        Check whether a creature can block an attacker, given their
+        signatures and the land types its controller has.
+
+        .. seealso::
+            :ref:`declare-blockers-step`
+
+        """
+
+        bits, colors, card_types, tapped, can_block, _, _ = blocking
+        attacker_bits, attacker_colors, _, _, _, protection, walks = attacking
+
+        if tapped or not can_block:
+            return False
+
+        if attacker_bits & FLYING and not bits & (FLYING | REACH):
+            return False
+        if bool(attacker_bits & SHADOW) != bool(bits & SHADOW):
+            return False
+        if attacker_bits & HORSEMANSHIP and not bits & HORSEMANSHIP:
+            return False
+
+        artifact = types.artifact in card_types
+        if attacker_bits & FEAR and not (artifact or u"B" in colors):
+            return False
+        if attacker_bits & INTIMIDATE and not (
+            artifact or colors & attacker_colors
+        ):
+            return False
+
+        if attacker_bits & LANDWALK and walks & lands:
+            return False
+        if attacker_bits & PROTECTION and protection & colors:
+            return False
+
+        return all(
+            restriction(blocker, attacker) for restriction in self.restrictions
+        )
+
+
+def _remove_damage(creatures):
+    """
+    Remove the damage marked on some creatures.
+
+    """
+
+    for creature in creatures:
+        creature.damage = 0
+        creature._deathtouch_damage = False
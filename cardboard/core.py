@@ -6,9 +6,17 @@ Cardboard core
 from collections import deque
 from random import shuffle
 
-from cardboard import events, exceptions, types
-from cardboard.phases import phases
-from cardboard.util import requirements
+from cardboard import events, exceptions, timing, types
+from cardboard.cards import match
+from cardboard.combat import Combat
+from cardboard.effects import ContinuousEffects, Replacements
+from cardboard.phases import (
+    phases, beginning_of_combat, cleanup, combat_damage, declare_attackers,
+    declare_blockers, draw, end_of_combat, first_main, second_main, untap,
+)
+from cardboard.priority import PassUntil
+from cardboard.triggers import TriggerQueue
+from cardboard.util import after, requirements, suspendable, then
 from cardboard.zone import zone
 
 
@@ -35,12 +43,18 @@ class Game(object):
         """
 
         self.events = handler
+        self.timings = timing.Timings(handler, parent=timing.server)
+        self.replacements = Replacements(self)
+        self.triggers = TriggerQueue(self)
 
         self.ended = None
 
         self.battlefield = zone["battlefield"](game=self)
         self.stack = zone["stack"](game=self)
 
+        self.continuous = ContinuousEffects(self)
+        self.combat = None
+
         self.teams = []
         self.turn = TurnManager(self)
 
@@ -120,7 +134,7 @@ class Game(object):
         """
 
         self.require(started=False)
-        self.events.trigger(event=events.GAME_BEGAN, game=self)
+        self.events.trigger(events.GAME_BEGAN(self))
         self._start()
 
         for player in self.players:
@@ -145,13 +159,20 @@ class Game(object):
         """
 
         self.ended = True
-        # TODO: Stop all other events
-        self.events.trigger(event=events.GAME_ENDED, game=self)
+        self.events.trigger(events.GAME_ENDED(self))
+
+        # Nothing should hear about anything that happens after the game ends.
+        self.events.clear()
 
+    @suspendable
     def grant_priority(self, to=None):
         """
         Grant priority to a player.
 
+        If the player has a standing instruction to pass priority (see
+        :meth:`Player.pass_until`), they pass without being asked unless one
+        of its stops has been reached.
+
         .. seealso::
             :ref:`grant-priority`
 
@@ -161,8 +182,18 @@ class Game(object):
             to = self.turn.active_player
 
         self._check_state_based_actions()
-        # TODO: Put triggered abilities on the stack
-        to.user.priority_granted()
+
+        while self.triggers:
+            yield self.triggers.put_on_stack()
+            self._check_state_based_actions()
+
+        if to.passing is not None:
+            if not to.passing.reached:
+                return
+            to.passing = None
+
+        with self.timings.waiting():
+            yield to.user.priority_granted()
 
     def _check_state_based_actions(self):
         """
@@ -191,21 +222,24 @@ class Game(object):
         #       As per :ref:`sba-replacement` and the rest of the section,
         #           these should not be iterative, and should check replacement
 
-        for card in self.battlefield:
+        for card in list(self.battlefield):
+            characteristics = self.continuous.characteristics(card)
+            card_types = characteristics["types"] or ()
 
-            if card.type == types.CREATURE:
-                if card.toughness <= 0:
+            if types.creature in card_types:
+                toughness = characteristics["toughness"]
+                if toughness <= 0:
                     card.owner.graveyard.move(card)
-                elif card.damage >= card.toughness or card._deathtouch_damage:
-                    # TODO: Regenerate
+                elif card.damage >= toughness or card._deathtouch_damage:
+                    # TODO: Regenerate (a replacement effect for the move)
                     card.owner.graveyard.move(card)
 
-            elif card.type == types.PLANESWALKER:
-                if not card.loyalty:
+            elif types.planeswalker in card_types:
+                if not characteristics["loyalty"]:
                     card.owner.graveyard.move(card)
-            elif card.type == types.ENCHANTMENT:
-                # if types.enchantment.subtypes["Aura"] in card.subtypes:
-                if card.attached_to is None:
+            elif types.enchantment in card_types:
+                aura = u"Aura" in (characteristics["subtypes"] or ())
+                if aura and getattr(card, "attached_to", None) is None:
                     card.owner.graveyard.move(card)
 
 
@@ -233,9 +267,7 @@ def _make_color(name):
         elif amount < current:
             event = events.MANA_REMOVED
 
-        self.owner.game.events.trigger(
-            event=event, color=name, player=self.owner, amount=abs(amount)
-        )
+        self.owner.game.events.trigger(event(name, self.owner, abs(amount)))
 
         setattr(self, _color, amount)
 
@@ -328,6 +360,9 @@ class Player(object):
 
         self._drew_from_empty_library = False
 
+        # a standing instruction to pass priority (see :meth:`pass_until`)
+        self.passing = None
+
     def __repr__(self):
         return "<Player{}>".format(self.name and ": " + self.name)
 
@@ -363,14 +398,23 @@ class Player(object):
         if amount == self.life:
             return
         elif amount > self.life:
-            event = events.LIFE_GAINED
+            event, sign = events.LIFE_GAINED, 1
         else:
-            event = events.LIFE_LOST
+            event, sign = events.LIFE_LOST, -1
 
-        self.game.events.trigger(
-            event=event, player=self, amount=abs(amount - self.life)
+        # if a player has to choose how the change is replaced, the total
+        # changes once they have
+        payload = self.game.replacements.replace(
+            event(self, abs(amount - self.life))
         )
-        self._life = amount
+        then(payload, lambda payload : self._change_life(payload, sign))
+
+    def _change_life(self, payload, sign):
+        if payload is None or not payload.amount:
+            return
+
+        self.game.events.trigger(payload)
+        self._life += sign * payload.amount
 
     @property
     def opponents(self):
@@ -391,13 +435,28 @@ class Player(object):
         team, = (team for team in self.game.teams if self in team)
         return team
 
+    def pass_until(self, *stops):
+        """
+        Pass priority whenever it's received until one of the given stops is
+        reached (see :mod:`cardboard.priority`).
+
+        Calling this again replaces the previous instruction, and calling it
+        with no stops cancels it.
+
+        """
+
+        if stops:
+            self.passing = PassUntil(self.game, self, stops)
+        else:
+            self.passing = None
+
     def concede(self):
         """
         I can go on no longer.
 
         """
 
-        self.game.events.trigger(event=events.PLAYER_CONCEDED, player=self)
+        self.game.events.trigger(events.PLAYER_CONCEDED(self))
         self.die(reason="concede")
 
     def die(self, reason):
@@ -421,11 +480,10 @@ class Player(object):
         self.require(dead=False)
 
         self.death_by = reason
-        self.game.events.trigger(
-            event=events.PLAYER_DIED, player=self, reason=reason
-        )
+        self.game.events.trigger(events.PLAYER_DIED(self, reason))
         self.game._check_for_win()
 
+    @suspendable
     def draw(self, cards=1):
         """
         Draw cards from the library.
@@ -434,20 +492,51 @@ class Player(object):
 
         cards = int(cards)
 
-        if cards == 0:
-            return
-        elif cards < 0:
+        if cards < 0:
             raise ValueError("Cannot draw a negative number of cards.")
         elif cards > len(self.library):
             self._drew_from_empty_library = True
-            return self.draw(len(self.library))
-        else:
-            for i in range(cards):
-                self.hand.add(self.library.pop())
-                self.game.events.trigger(event=events.DRAW, player=self)
+            cards = len(self.library)
+
+        for i in range(cards):
+            payload = yield self.game.replacements.replace(events.DRAW(self))
+            if payload is None:
+                continue
+
+            self.hand.add(self.library.pop())
+            self.game.events.trigger(payload)
+
+
+# step -> (the phase it's in, its position within a turn)
+_STEPS = {
+    step : (phase, position) for position, (phase, step) in enumerate(
+        (phase, step) for phase in phases for step in phase
+    )
+}
+# steps with turn-based actions that always happen, which are never skipped
+_ALWAYS_RUN = {untap, draw, cleanup}
+_MAIN = {first_main[0], second_main[0]}
+# step -> what skipping it still does to the game
+_SKIPPED = {
+    beginning_of_combat : lambda game : setattr(game, "combat", Combat(game)),
+    end_of_combat : lambda game : setattr(game, "combat", None),
+}
 
 
 class TurnManager(object):
+    """
+    Advances a game through its turns, phases and steps.
+
+    Actions can be scheduled to happen during a later step (see :meth:`at`
+    and :meth:`until`). They're filed into buckets keyed by (turn, phase
+    name, step name, active player), so that advancing a step only touches the
+    actions scheduled for it.
+
+    When :attr:`fast_forward` is set (e.g. when simulating games), advancing
+    skips over steps during which nothing could happen (see :meth:`next`).
+
+    """
+
     def __init__(self, game):
         self.game = game
 
@@ -455,6 +544,16 @@ class TurnManager(object):
         self.number = None
         self.order = None
 
+        # the number of turns that have begun, counting every player's turns
+        self.turns = None
+
+        # bucket -> actions to take at the beginning of the step
+        self._scheduled = {}
+        # bucket -> actions to take when the step ends
+        self._expiring = {}
+
+        self.fast_forward = False
+
         self._phases = deque(phases)
         self._steps = iter(self._phases[0])
         self._step = next(self._steps)
@@ -497,52 +596,225 @@ class TurnManager(object):
         self.order = deque(self.game.players)
         shuffle(self.order)
         self._first = self.active_player
-        self.number = 1
+        self.number = self.turns = 1
 
         self.game.events.trigger(
-            event=events.PHASE_BEGAN, phase=self.phase.name.lower(),
-            player=self.active_player,
+            events.PHASE_BEGAN(self.phase.name.lower(), self.active_player)
         )
 
-        self.step(self.game)
+        self._run_step()
+
+    def _run_step(self):
+        """
+        Run the current step, timing it.
+
+        Returns a Deferred if the step is waiting on a player.
+
+        """
+
+        key = self.phase.name, self.step.__name__
+        finish = self.game.timings.begin(key)
+        try:
+            for action in self._scheduled.pop(self._bucket(), ()):
+                action()
+            running = self.step(self.game)
+        except Exception:
+            finish()
+            raise
+        return after(running, finish)
+
+    def _bucket(self, step=None, turns=0):
+        """
+        The bucket of a step in the current turn, or in a later one.
+
+        """
+
+        if step is None:
+            step = self.step
+        phase, _ = _STEPS[step]
+        active = self.order[turns % len(self.order)]
+        return self.turns + turns, phase.name, step.__name__, active
+
+    def at(self, action, step, player=None):
+        """
+        Schedule an action for the beginning of the next occurrence of a step.
+
+        If a player is given, the action is taken during the next occurrence
+        of the step in one of that player's turns (e.g. for an ability that
+        triggers "at the beginning of your next upkeep").
+
+        Buckets are keyed assuming the current turn order stays the same.
+
+        """
+
+        self.game.require(started=True)
+
+        if player is not None and player not in self.order:
+            err = "{} doesn't take turns in this game."
+            raise exceptions.InvalidAction(err.format(player))
+
+        _, position = _STEPS[step]
+        _, current = _STEPS[self.step]
+
+        first = 0 if position > current else 1
+        for turns in xrange(first, first + len(self.order)):
+            if player is None or self.order[turns % len(self.order)] is player:
+                break
+
+        bucket = self._bucket(step, turns)
+        self._scheduled.setdefault(bucket, []).append(action)
+        return bucket
+
+    def until(self, action, step):
+        """
+        Schedule an action for when a step of the current turn ends (e.g. to
+        end an effect that lasts "until end of combat").
+
+        """
+
+        self.game.require(started=True)
+
+        _, position = _STEPS[step]
+        _, current = _STEPS[self.step]
+        if position < current:
+            err = "The {} step has already ended this turn."
+            raise exceptions.InvalidAction(err.format(step.__name__))
+
+        bucket = self._bucket(step)
+        self._expiring.setdefault(bucket, []).append(action)
+        return bucket
+
+    def until_end_of_turn(self, action):
+        """
+        Schedule an action for the :ref:`cleanup-step` of the current turn
+        (e.g. to end an effect that lasts "until end of turn").
+
+        """
+
+        return self.until(action, phases[-1][-1])
+
+    def expire(self):
+        """
+        Take the actions scheduled for the end of the current step.
+
+        """
+
+        for action in self._expiring.pop(self._bucket(), ()):
+            action()
 
     def next(self):
         """
         Advance a turn to the next phase or step.
 
+        If fast forwarding, steps during which nothing could happen are
+        skipped, without triggering their events or granting priority (though
+        skipped combat steps still begin and end the combat). A step can be
+        skipped if it has no turn-based actions that must happen, if nothing
+        is scheduled for it, waiting to go on the stack or on the stack, if no
+        triggered abilities trigger on steps, and if no player has anything
+        they could do during it. Which steps can be skipped is worked out once
+        for each call.
+
+        If the step that's moved to is waiting on a player (e.g. for a
+        selection made across the network), a Deferred is returned, which
+        fires once the step is over.
+
         """
 
         self.game.require(started=True)
 
+        self.expire()
+
         try:
-            next_step = next(self._steps)
-        except StopIteration:
+            self._advance()
+
+            if self.fast_forward:
+                skippable = self._skippable()
+                while self.step in skippable and self._idle():
+                    skipped = _SKIPPED.get(self.step)
+                    if skipped is not None:
+                        skipped(self.game)
+                    self._advance()
+        finally:
+            running = after(self._run_step(), self._empty_mana_pools)
+        return running
+
+    def _empty_mana_pools(self):
+        for player in self.game.players:
+            player.mana_pool.empty()
+
+    def _advance(self):
+        """
+        Move to the next phase or step without running it.
 
+        """
+
+        try:
+            self._step = next(self._steps)
+        except StopIteration:
             self.game.events.trigger(
-                event=events.PHASE_ENDED, phase=self.phase.name.lower(),
-                player=self.active_player,
+                events.PHASE_ENDED(self.phase.name.lower(), self.active_player)
             )
 
             self._phases.rotate(-1)
             self._steps = iter(self.phase)
             self._step = next(self._steps)
 
+            # was it the last phase? then the next turn begins before its
+            # first step does
+            if self.phase == phases[0]:
+                self.end()
+
             self.game.events.trigger(
-                event=events.PHASE_BEGAN, phase=self.phase.name.lower(),
-                player=self.active_player,
+                events.PHASE_BEGAN(self.phase.name.lower(), self.active_player)
             )
 
-        else:
-            self._step = next_step
-        finally:
-            self.step(self.game)
+    def _idle(self):
+        """
+        Check that nothing is waiting to happen during the current step.
 
-            for player in self.game.players:
-                player.mana_pool.empty()
+        """
+
+        bucket = self._bucket()
+        return not (
+            bucket in self._scheduled or bucket in self._expiring or
+            self.game.stack or self.game.triggers
+        )
 
-        # is it the last step of the last phase?
-        if self.phase == phases[0] and self.step == phases[0][0]:
-            self.end()
+    def _skippable(self):
+        """
+        The steps of the current turn that could be skipped given the current
+        state of the game.
+
+        """
+
+        game, active = self.game, self.active_player
+
+        watched = any(
+            "event" in hook.conditions
+            for event in (events.STEP_BEGAN, events.STEP_ENDED)
+            for hook in game.events.hooks_for(event)
+        )
+        if watched or any(
+            any(match.is_instant_speed(card) for card in player.hand) or
+            any(match.has_activated_abilities(p) for p in player.battlefield)
+            for player in game.players
+        ):
+            return set()
+
+        skippable = set(_STEPS) - _ALWAYS_RUN
+
+        if active.hand:
+            skippable -= _MAIN
+        if any(
+            match.is_creature(permanent) and not permanent.is_tapped
+            for permanent in active.battlefield
+        ):
+            skippable -= {beginning_of_combat, declare_attackers}
+        if game.combat is not None and game.combat.attacks:
+            skippable -= {declare_blockers, combat_damage, end_of_combat}
+
+        return skippable
 
     def end(self):
         """
@@ -553,17 +825,16 @@ class TurnManager(object):
         self.game.require(started=True)
 
         self.game.events.trigger(
-            event=events.TURN_ENDED, player=self.active_player,
-            number=self.number
+            events.TURN_ENDED(self.active_player, self.number)
         )
         self.order.rotate(-1)
+        self.turns += 1
 
         if self.active_player == self._first:
             self.number += 1
 
         self.game.events.trigger(
-            event=events.TURN_BEGAN, player=self.active_player,
-            number=self.number
+            events.TURN_BEGAN(self.active_player, self.number)
         )
 
         # XXX: end from middle of a turn
@@ -0,0 +1,326 @@
+"""
+Turns a game's events into compact per-player deltas of its state.
+
+Rather than polling for the state of a game, clients are pushed a delta each
+time something they can see changes: a card moving between zones, a player's
+life total or mana pool changing, or a permanent's status changing.
+
+Each delta carries the version of the game's state it brings a client to.
+Every player is sent a delta for every change (with whatever they aren't
+allowed to see left out), so a skipped version means a client missed one.
+
+Spectators are sent the deltas that anyone may see, redacted just once for
+all of them (see :mod:`cardboard.spectators`).
+
+Cards are identified by a number given to each card the first time it's
+seen, and players by the IDs they're registered under in :attr:`players`.
+
+Deltas that are sent out together can be merged first (see :func:`coalesce`),
+so that e.g. a number of life changes are sent as a single one. A client that
+has fallen too far behind can instead be sent a snapshot of the whole state
+(see :meth:`StateDeltas.snapshot`), which supersedes every delta before it.
+
+"""
+
+from itertools import count
+
+from cardboard import events
+
+
+__all__ = ["StateDeltas", "coalesce"]
+
+
+#: zones whose contents only their owner (if anyone) may see
+HIDDEN_ZONES = {u"hand", u"library"}
+
+
+class StateDeltas(object):
+    """
+    The state deltas of a game.
+
+    Arguments
+    ---------
+
+    * game: the game whose events to turn into deltas
+    * push: a function taking a player and a delta (a dict) to send them
+    * broadcast: a function taking each delta as anyone may see it (e.g. to
+                 send to spectators)
+
+    """
+
+    def __init__(self, game, push, broadcast=None):
+        super(StateDeltas, self).__init__()
+
+        self.game = game
+        self.push = push
+        self.broadcast = broadcast
+
+        #: the players that deltas are pushed to -> their player IDs
+        self.players = {}
+
+        self.version = 0
+
+        self._cards = {}
+        self._card_ids = count()
+        self._left = {}
+
+        # the hooks (rather than an owner) keep this alive as long as the game
+        subscribe = game.events.subscribe
+        subscribe(
+            self._left_zone, event=events.LEFT_ZONE, needs=["card", "zone"],
+        )
+        subscribe(
+            self._entered_zone,
+            event=events.ENTERED_ZONE, needs=["card", "zone"],
+        )
+        subscribe(
+            self._cards_entered_zone,
+            event=events.CARDS_ENTERED_ZONE, needs=["cards", "zone"],
+        )
+        for event, sign in (
+            (events.LIFE_GAINED, 1), (events.LIFE_LOST, -1),
+        ):
+            subscribe(
+                self._life(sign), event=event, needs=["player", "amount"],
+            )
+        for event, sign in (
+            (events.MANA_ADDED, 1), (events.MANA_REMOVED, -1),
+        ):
+            subscribe(
+                self._mana(sign),
+                event=event, needs=["color", "player", "amount"],
+            )
+        subscribe(
+            self._status_changed,
+            event=events.STATUS_CHANGED, needs=["card", "status"],
+        )
+        subscribe(
+            self._statuses_changed,
+            event=events.STATUSES_CHANGED, needs=["changes"],
+        )
+
+    def __repr__(self):
+        return "<State Deltas: version {}>".format(self.version)
+
+    def card_id(self, card):
+        """
+        Get the ID of a card, giving it one if it doesn't have one yet.
+
+        """
+
+        cardID = self._cards.get(card)
+        if cardID is None:
+            cardID = self._cards[card] = next(self._card_ids)
+        return cardID
+
+    def visible(self, zone, player):
+        """
+        Whether the given player (or anyone, if None) can see the contents of
+        a zone.
+
+        """
+
+        if zone.name not in HIDDEN_ZONES:
+            return True
+        return zone.name == u"hand" and zone.owner is player
+
+    def send(self, delta, redact=None):
+        """
+        Push a delta to each player (and broadcast it), bumping the version.
+
+        :argument redact: a function taking a player and returning the delta
+                          to send them instead, if they may not see all of it
+
+        """
+
+        self.version += 1
+        delta["version"] = self.version
+
+        for player in self.players:
+            if redact is None:
+                self.push(player, delta)
+            else:
+                self.push(player, redact(player))
+
+        if self.broadcast is not None:
+            self.broadcast(delta if redact is None else redact(None))
+
+    def snapshot(self, player=None):
+        """
+        A delta with the whole state of the game (as the given player, or
+        anyone, if None, may see it) at the current version.
+
+        """
+
+        players = sorted(self.players.iteritems(), key=lambda each : each[1])
+        zones = [self.game.battlefield, self.game.stack]
+        for each, _ in players:
+            zones.extend([each.hand, each.library, each.graveyard, each.exile])
+
+        return {
+            "type" : "snapshot", "version" : self.version,
+            "players" : [
+                {
+                    "player" : playerID, "life" : each.life,
+                    "poison" : each.poison,
+                    "mana" : dict(zip(each.mana_pool.POOLS, each.mana_pool)),
+                }
+                for each, playerID in players
+            ],
+            "zones" : [
+                {
+                    "zone" : self._zone(zone),
+                    "cards" : [
+                        self._card(card, zone, player) for card in zone
+                    ],
+                }
+                for zone in zones
+            ],
+        }
+
+    def _card(self, card, zone, player):
+        if not self.visible(zone, player):
+            return {"card" : None, "name" : None, "status" : []}
+
+        name = None
+        if getattr(card, "is_face_up", True):
+            name = getattr(card, "name", None)
+
+        status = [
+            status for attribute, value, status in _SNAPSHOT_STATUSES
+            if getattr(card, attribute, not value) == value
+        ]
+        return {"card" : self.card_id(card), "name" : name, "status" : status}
+
+    def _zone(self, zone):
+        if zone is None:
+            return None
+        return [zone.name, self.players.get(zone.owner)]
+
+    def _left_zone(self, handler, card, zone):
+        self._left[card] = zone
+
+    def _entered_zone(self, handler, card, zone):
+        left = self._left.pop(card, None)
+
+        name = None
+        if getattr(card, "is_face_up", True):
+            name = getattr(card, "name", None)
+
+        delta = {
+            "type" : "move", "card" : self.card_id(card), "name" : name,
+            "from" : self._zone(left), "to" : self._zone(zone),
+        }
+
+        def redact(player):
+            if self.visible(zone, player):
+                return delta
+            elif left is not None and self.visible(left, player):
+                return delta
+            return dict(delta, card=None, name=None)
+
+        self.send(delta, redact)
+
+    def _cards_entered_zone(self, handler, cards, zone):
+        for card in cards:
+            self._entered_zone(handler, card, zone)
+
+    def _life(self, sign):
+        def life(handler, player, amount):
+            self.send({
+                "type" : "life", "player" : self.players.get(player),
+                "amount" : sign * amount,
+            })
+        return life
+
+    def _mana(self, sign):
+        def mana(handler, color, player, amount):
+            self.send({
+                "type" : "mana", "player" : self.players.get(player),
+                "color" : color, "amount" : sign * amount,
+            })
+        return mana
+
+    def _status_changed(self, handler, card, status):
+        self._statuses_changed(handler, [(card, status)])
+
+    def _statuses_changed(self, handler, changes):
+        changes = [[self.card_id(card), status] for card, status in changes]
+        self.send({"type" : "status", "changes" : changes})
+
+
+# (attribute, value, status) for the statuses a snapshot lists for a card
+_SNAPSHOT_STATUSES = [
+    ("is_tapped", True, u"tapped"),
+    ("is_flipped", True, u"flipped"),
+    ("is_face_up", False, u"face down"),
+    ("is_phased_in", False, u"phased out"),
+]
+
+
+# status -> the status it and its opposite both change
+_STATUS_OF = {
+    u"tapped" : u"tapped", u"untapped" : u"tapped",
+    u"flipped" : u"flipped", u"unflipped" : u"flipped",
+    u"face up" : u"face up", u"face down" : u"face up",
+    u"phased in" : u"phased in", u"phased out" : u"phased in",
+}
+
+
+def coalesce(deltas):
+    """
+    Merge the deltas in a list that are superseded by later ones.
+
+    Life and mana changes for the same player (and color) are summed into a
+    single change, and status changes are combined into a single delta with
+    only each card's last change to each of its statuses. Moves are left
+    alone.
+
+    Each merged delta is left in the place of the first of the deltas it was
+    merged from, with the version of the last, and lists the versions of the
+    others under ``merged``, so that the versions a client has seen are still
+    contiguous.
+
+    """
+
+    coalesced, merged_into = [], {}
+
+    for delta in deltas:
+        kind = delta["type"]
+        if kind == "life":
+            key = kind, delta["player"]
+        elif kind == "mana":
+            key = kind, delta["player"], delta["color"]
+        elif kind == "status":
+            key = kind,
+        else:
+            coalesced.append(delta)
+            continue
+
+        into = merged_into.get(key)
+        if into is None:
+            into = merged_into[key] = dict(delta)
+            if kind == "status":
+                into["changes"] = list(delta["changes"])
+            coalesced.append(into)
+            continue
+
+        if kind == "status":
+            into["changes"].extend(delta["changes"])
+        else:
+            into["amount"] += delta["amount"]
+        into.setdefault("merged", []).append(into["version"])
+        into["version"] = delta["version"]
+
+    for into in merged_into.itervalues():
+        if into["type"] == "status":
+            into["changes"] = _last_changes(into["changes"])
+
+    return coalesced
+
+
+def _last_changes(changes):
+    last = {}
+    for position, (cardID, status) in enumerate(changes):
+        last[cardID, _STATUS_OF.get(status, status)] = position
+    return [changes[position] for position in sorted(last.itervalues())]
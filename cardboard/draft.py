@@ -0,0 +1,320 @@
+"""
+Booster drafts.
+
+Each player in a draft (a pod of up to 8 drafters) opens a booster pack of
+the round's set, picks a card from it, and passes the rest on to their
+neighbor, to the left in the first and third rounds and to the right in the
+second, until every pack has been picked clean. Each pick is timed, and a
+drafter who takes too long has a card picked for them.
+
+Packs are generated from each set's rarity pools, which are worked out once
+from the card catalog (see :func:`catalog_pools`) and kept in memory, so
+that opening a pack is just a handful of samples from them.
+
+"""
+
+from collections import defaultdict, deque
+import random
+
+from twisted.internet import reactor
+
+from cardboard import exceptions
+
+
+__all__ = [
+    "COMMON", "LAND", "MYTHIC", "RARE", "UNCOMMON",
+    "Draft", "Drafter", "booster", "catalog_pools", "rarity_pools",
+]
+
+
+# the rarities of the cards in a set, as they're listed in the catalog
+COMMON, UNCOMMON, RARE, MYTHIC, LAND = u"C", u"U", u"R", u"M", u"L"
+
+#: the slots in a booster pack, by rarity (commons last, since they fill in
+#: for any others that a set doesn't have)
+PACK = ((RARE, 1), (UNCOMMON, 3), (LAND, 1), (COMMON, 10))
+
+#: the chance that a pack's rare is a mythic rare instead (for sets with any)
+MYTHIC_CHANCE = 1.0 / 8
+
+
+def rarity_pools(appearances):
+    """
+    Group the cards in each set by rarity.
+
+    :argument appearances: an iterable of (set code, card name, rarity)
+    :returns: a dict of set code -> rarity -> a tuple of card names
+
+    """
+
+    pools = defaultdict(lambda : defaultdict(list))
+    for code, name, rarity in appearances:
+        pools[code][rarity].append(name)
+
+    return {
+        code : {rarity : tuple(sorted(names)) for rarity, names in by.items()}
+        for code, by in pools.iteritems()
+    }
+
+
+def catalog_pools():
+    """
+    Work out the rarity pools of every set in the card catalog.
+
+    """
+
+    # the catalog is only needed (and so only loaded) once drafts are
+    from cardboard.db import models as m
+
+    appearances = m.SetAppearance.query.with_entities(
+        m.SetAppearance.set_code, m.SetAppearance.card_name,
+        m.SetAppearance.rarity,
+    )
+    return rarity_pools(appearances)
+
+
+def booster(pool, random=random):
+    """
+    Open a booster pack from a set's rarity pool.
+
+    Slots of a rarity that the set doesn't have are filled with commons.
+
+    """
+
+    pack, extra = [], 0
+    for rarity, count in PACK:
+        if rarity == RARE and pool.get(MYTHIC):
+            if random.random() < MYTHIC_CHANCE:
+                rarity = MYTHIC
+
+        cards = pool.get(rarity, ())
+        if rarity == COMMON:
+            count += extra
+
+        taken = min(count, len(cards))
+        pack.extend(random.sample(cards, taken))
+        extra += count - taken
+    return pack
+
+
+class Drafter(object):
+    """
+    A player in a draft.
+
+    """
+
+    def __init__(self, name, connection=None):
+        super(Drafter, self).__init__()
+
+        self.name = name
+        self.connection = connection
+
+        #: the packs waiting to be picked from, the current one first
+        self.packs = deque()
+        self.picks = []
+
+        self._timer = None
+
+    def __repr__(self):
+        return "<Drafter: {.name}>".format(self)
+
+    @property
+    def pack(self):
+        """
+        The pack currently being picked from, if any.
+
+        """
+
+        if self.packs:
+            return self.packs[0]
+
+
+class Draft(object):
+    """
+    A booster draft.
+
+    Arguments
+    ---------
+
+    * pools: the rarity pools of each set (see :func:`rarity_pools`)
+    * sets: the code of the set opened in each round
+    * seats: how many drafters may join
+    * timeout: how long (in seconds) each drafter has to make each pick
+    * offer: a function taking a drafter and the pack that's been passed to
+             them, called each time a new pack is theirs to pick from
+    * picked: a function taking a drafter and the card picked for them,
+              called each time they run out of time to pick
+    * ended: a function taking the draft, called once it ends
+    * clock: an :class:`~twisted.internet.interfaces.IReactorTime` provider
+    * random: a :class:`random.Random` to open packs and pick cards with
+
+    """
+
+    def __init__(
+        self, pools, sets, seats=8, timeout=60, offer=None, picked=None,
+        ended=None, clock=reactor, random=random,
+    ):
+        super(Draft, self).__init__()
+
+        for code in sets:
+            if code not in pools:
+                raise exceptions.InvalidAction("Unknown set: {}".format(code))
+
+        self.pools = pools
+        self.sets = list(sets)
+        self.seats = seats
+        self.timeout = timeout
+        self.offer = offer
+        self.picked = picked
+        self.ended = ended
+        self.clock = clock
+        self.random = random
+
+        self.drafters = []
+        self.round = 0
+        self.state = "open"
+
+        self._remaining = 0
+
+    def __repr__(self):
+        return "<Draft: {} drafters ({})>".format(
+            len(self.drafters), self.state,
+        )
+
+    def join(self, name, connection=None):
+        """
+        Take a seat in the draft.
+
+        """
+
+        if self.state != "open":
+            raise exceptions.InvalidAction("The draft has already started.")
+        elif len(self.drafters) >= self.seats:
+            raise exceptions.InvalidAction("The draft is full.")
+
+        drafter = Drafter(name, connection)
+        self.drafters.append(drafter)
+        return drafter
+
+    def start(self):
+        """
+        Start the draft, opening the first round's packs.
+
+        """
+
+        if self.state != "open":
+            raise exceptions.InvalidAction("The draft has already started.")
+        elif len(self.drafters) < 2:
+            raise exceptions.InvalidAction(
+                "A draft needs at least 2 drafters."
+            )
+
+        self.state = "drafting"
+        self._open_packs()
+
+    def end(self):
+        """
+        End the draft, whether or not every pack has been picked.
+
+        """
+
+        if self.state == "ended":
+            return
+
+        self.state = "ended"
+        for drafter in self.drafters:
+            self._stop_timer(drafter)
+            drafter.packs.clear()
+
+        if self.ended is not None:
+            self.ended(self)
+
+    def pick(self, drafter, card):
+        """
+        Pick a card from a drafter's current pack, passing the rest on.
+
+        """
+
+        if self.state != "drafting":
+            raise exceptions.InvalidAction("The draft isn't underway.")
+
+        pack = drafter.pack
+        if pack is None:
+            raise exceptions.InvalidAction(
+                "{} has no pack to pick from.".format(drafter.name)
+            )
+        elif card not in pack:
+            raise exceptions.BadSelection(
+                "{} is not in {}'s pack.".format(card, drafter.name)
+            )
+
+        self._stop_timer(drafter)
+        pack.remove(card)
+        drafter.picks.append(card)
+        drafter.packs.popleft()
+        self._remaining -= 1
+
+        if pack:
+            neighbor = self.neighbor(drafter)
+            neighbor.packs.append(pack)
+            if len(neighbor.packs) == 1:
+                self._offer(neighbor)
+
+        if drafter.packs:
+            self._offer(drafter)
+
+        if not self._remaining:
+            self._open_packs()
+
+    def neighbor(self, drafter):
+        """
+        The drafter who is passed the given drafter's packs this round.
+
+        """
+
+        direction = 1 if self.round % 2 else -1
+        seat = self.drafters.index(drafter)
+        return self.drafters[(seat + direction) % len(self.drafters)]
+
+    def _open_packs(self):
+        if self.round >= len(self.sets):
+            self.end()
+            return
+
+        pool = self.pools[self.sets[self.round]]
+        self.round += 1
+
+        for drafter in self.drafters:
+            pack = booster(pool, random=self.random)
+            if pack:
+                self._remaining += len(pack)
+                drafter.packs.append(pack)
+
+        for drafter in self.drafters:
+            self._offer(drafter)
+
+        if not self._remaining:  # every pack came up empty
+            self._open_packs()
+
+    def _offer(self, drafter):
+        if drafter.pack is None:
+            return
+
+        drafter._timer = self.clock.callLater(
+            self.timeout, self._expired, drafter,
+        )
+        if self.offer is not None:
+            self.offer(drafter, list(drafter.pack))
+
+    def _expired(self, drafter):
+        drafter._timer = None
+
+        card = self.random.choice(drafter.pack)
+        if self.picked is not None:
+            self.picked(drafter, card)
+        self.pick(drafter, card)
+
+    def _stop_timer(self, drafter):
+        if drafter._timer is not None and drafter._timer.active():
+            drafter._timer.cancel()
+        drafter._timer = None
@@ -0,0 +1,748 @@
+"""
+Implements :term:`continuous <continuous effect>`, :term:`replacement
+<replacement effect>` and :term:`prevention <prevention effect>` effects.
+
+Replacement and prevention effects are indexed by the type of event they
+modify and by the object or player that they affect, so that an event which
+no effect could possibly modify costs a single dict lookup.
+
+Continuous effects are applied in layer and timestamp order. The resulting
+characteristics of each object are cached, and only recomputed for the
+objects that a change could have affected.
+
+.. seealso::
+    :ref:`continuous-effects`, :ref:`interaction-continuous`,
+    :ref:`replacement-effects`, :ref:`prevention-effects` and
+    :ref:`interaction-replacement`
+
+"""
+
+from bisect import insort
+from heapq import merge
+from itertools import count
+
+from cardboard import events, exceptions
+from cardboard.util import ANY, suspendable, then
+
+
+__all__ = [
+    "ContinuousEffect", "ContinuousEffects", "DoesntUntap", "grant_keywords",
+    "remove_keywords",
+    "ReplacementEffect", "Replacements", "prevention",
+]
+
+
+# The layers (613.1a-f) and power / toughness sublayers (613.3a-e) that
+# continuous effects apply in.
+(
+    COPY, CONTROL, TEXT, TYPE, COLOR, ABILITY,
+    PT_DEFINING, PT_SETTING, PT_MODIFYING, PT_COUNTERS, PT_SWITCHING,
+) = range(1, 12)
+
+CHARACTERISTICS = (
+    "name", "mana_cost", "colors", "types", "subtypes", "supertypes",
+    "abilities", "keywords", "power", "toughness", "loyalty", "controller",
+)
+
+
+# the parameter of each event naming what it affects, if not its first one
+AFFECTED = {events.MANA_ADDED : "player", events.MANA_REMOVED : "player"}
+
+
+def affected_by(payload):
+    """
+    Get the object or player that an event affects.
+
+    """
+
+    event = payload.event
+    return getattr(payload, AFFECTED.get(event, event.fields[0]))
+
+
+class ReplacementEffect(object):
+    """
+    An effect that modifies an event (or replaces it entirely) as it happens.
+
+    Arguments
+    ---------
+
+    * event: the type of event that is being replaced
+    * replace: a function taking the event's payload and returning a
+               (possibly modified) payload, or None if the event no longer
+               happens (it is expected to do whatever happens instead)
+    * affected: the object or player that the effect modifies events for
+                (default: any)
+    * applies: a predicate checking whether the effect applies to a payload
+    * description: a description of the effect, shown when choosing effects
+    * prevention: whether this is a prevention effect
+    * self_replacement: whether this is a self-replacement effect (see
+                        :ref:`interaction-replacement`)
+    * once: remove the effect after it has been applied
+
+    """
+
+    def __init__(self, event, replace, affected=None, applies=ANY,
+                 description="", prevention=False, self_replacement=False,
+                 once=False):
+
+        super(ReplacementEffect, self).__init__()
+
+        self.event = event
+        self.replace = replace
+        self.affected = affected
+        self.applies = applies
+        self.description = description
+        self.prevention = prevention
+        self.self_replacement = self_replacement
+        self.once = once
+
+        self.timestamp = None
+
+    def __call__(self, payload):
+        return self.replace(payload)
+
+    def __repr__(self):
+        kind = "Prevention" if self.prevention else "Replacement"
+        return "<{} Effect: {}>".format(kind, self.description or self.event)
+
+    def __str__(self):
+        return self.description
+
+
+def prevention(event, affected=None, amount=None, **kwargs):
+    """
+    Create an effect preventing an event, or some of the amount of one.
+
+    If an amount is given, the effect prevents that much of the event's amount
+    in total and is used up afterwards. Otherwise, the entire event is
+    prevented (every time, unless `once` is given).
+
+    """
+
+    remaining = [amount]
+
+    def prevent(payload):
+        if remaining[0] is None:
+            return
+
+        prevented = min(payload.amount, remaining[0])
+        remaining[0] -= prevented
+        payload.amount -= prevented
+
+        if not remaining[0]:
+            effect.once = True
+        if payload.amount:
+            return payload
+
+    effect = ReplacementEffect(
+        event, prevent, affected, prevention=True, **kwargs
+    )
+    return effect
+
+
+class Replacements(object):
+    """
+    The replacement and prevention effects that exist in a game.
+
+    """
+
+    def __init__(self, game):
+        super(Replacements, self).__init__()
+
+        self.game = game
+
+        self._effects = {}
+        self._timestamps = count()
+
+    def __contains__(self, effect):
+        effects = self._effects.get(effect.event, {}).get(effect.affected, ())
+        return effect in effects
+
+    def __iter__(self):
+        effects = (
+            effect
+            for by_affected in self._effects.itervalues()
+            for affected in by_affected.itervalues()
+            for effect in affected
+        )
+        return iter(sorted(effects, key=lambda effect : effect.timestamp))
+
+    def __len__(self):
+        return sum(
+            len(effects)
+            for by_affected in self._effects.itervalues()
+            for effects in by_affected.itervalues()
+        )
+
+    def add(self, effect):
+        """
+        Add a new effect, timestamping it.
+
+        """
+
+        effect.timestamp = next(self._timestamps)
+        by_affected = self._effects.setdefault(effect.event, {})
+        by_affected.setdefault(effect.affected, []).append(effect)
+        return effect
+
+    def remove(self, effect):
+        """
+        Remove an effect.
+
+        """
+
+        by_affected = self._effects.get(effect.event, {})
+        effects = by_affected.get(effect.affected, [])
+
+        try:
+            effects.remove(effect)
+        except ValueError:
+            raise exceptions.NoSuchObject(self, "effect", effect)
+
+        if not effects:
+            del by_affected[effect.affected]
+            if not by_affected:
+                del self._effects[effect.event]
+
+    def replace(self, payload):
+        """
+        Apply the effects that modify an event.
+
+        Returns the modified payload, or None if the event was replaced. If a
+        player has to be waited on to choose which effect applies next, a
+        Deferred that fires with it is returned instead.
+
+        """
+
+        if payload.event not in self._effects:
+            return payload
+
+        replaced = [payload]
+        return then(self._replace(replaced), lambda _ : replaced[0])
+
+    def applicable(self, payload, exclude=()):
+        """
+        Find the effects that would apply to an event, in timestamp order.
+
+        """
+
+        by_affected = self._effects.get(payload.event)
+        if by_affected is None:
+            return []
+
+        affected = affected_by(payload)
+        candidates = by_affected.get(affected, [])
+        if affected is not None:
+            candidates = candidates + by_affected.get(None, [])
+
+        candidates = [
+            effect for effect in candidates
+            if effect not in exclude and effect.applies(payload)
+        ]
+        candidates.sort(key=lambda effect : effect.timestamp)
+        return candidates
+
+    @suspendable
+    def _replace(self, replaced):
+        """
+        Apply effects to the (single) payload in ``replaced`` until none do.
+
+        .. seealso::
+            :ref:`interaction-replacement`
+
+        """
+
+        payload, = replaced
+        applied = set()
+
+        while payload is not None:
+            candidates = self.applicable(payload, exclude=applied)
+            self_replacements = [e for e in candidates if e.self_replacement]
+            if self_replacements:
+                candidates = self_replacements
+
+            if not candidates:
+                break
+            elif len(candidates) == 1:
+                effect, = candidates
+            else:
+                chooser = _chooser(payload)
+                with self.game.timings.waiting():
+                    selection = yield chooser.user.select(
+                        candidates, how_many=1,
+                    )
+                effect = _chosen(selection, candidates)
+
+            applied.add(effect)
+
+            if effect.once:
+                self.remove(effect)
+            replaced[0] = payload = effect(payload)
+
+            # the replacement may have used itself up while being applied
+            if effect.once and effect in self:
+                self.remove(effect)
+
+
+def _chooser(payload):
+    """
+    The player who chooses between the effects that would modify an event.
+
+    """
+
+    affected = affected_by(payload)
+    return (
+        getattr(affected, "controller", None) or
+        getattr(affected, "owner", None) or
+        affected
+    )
+
+
+def _chosen(selection, candidates):
+    """
+    The effect selected from the candidates (the first, if none was).
+
+    """
+
+    if not selection:
+        return candidates[0]
+
+    choice, = selection
+    if choice not in candidates:
+        raise exceptions.BadSelection(
+            "{} is not an applicable effect.".format(choice)
+        )
+    return choice
+
+
+class ContinuousEffect(object):
+    """
+    An effect that modifies the characteristics of objects for some time.
+
+    Arguments
+    ---------
+
+    * apply: a function taking an object and a dict of its characteristics
+             (as modified by earlier effects) that modifies them in place
+    * layer: the layer the effect applies in
+    * applies: a predicate taking an object and its characteristics, which
+               checks whether the effect applies to it (default: it applies
+               to everything in its scope)
+    * reads: other objects or zones that the effect depends on (besides its
+             source), which cause it to be reapplied when they change
+    * scope: the zone whose objects the effect can apply to
+             (default: the battlefield)
+    * affects: the particular objects (in its scope) that the effect applies
+               to, if it doesn't apply to everything in its scope
+    * source: the object that generated the effect, if any
+    * description: a description of the effect
+
+    """
+
+    def __init__(self, apply, layer, applies=None, reads=(), scope=None,
+                 affects=None, source=None, description=""):
+
+        super(ContinuousEffect, self).__init__()
+
+        self.apply = apply
+        self.layer = layer
+        self.applies = applies
+        self.reads = frozenset(reads)
+        self.scope = scope
+        self.affects = None if affects is None else frozenset(affects)
+        self.source = source
+        self.description = description
+
+        self.timestamp = None
+
+    def __lt__(self, other):
+        if not isinstance(other, ContinuousEffect):
+            return NotImplemented
+        return (self.layer, self.timestamp) < (other.layer, other.timestamp)
+
+    def __repr__(self):
+        return "<Continuous Effect: {}>".format(self.description or self.layer)
+
+    def __str__(self):
+        return self.description
+
+
+def grant_keywords(keywords, **kwargs):
+    """
+    Create an effect granting keyword abilities (given as a bitmask).
+
+    """
+
+    def grant(object_, characteristics):
+        characteristics["keywords"] |= keywords
+    return ContinuousEffect(grant, layer=ABILITY, **kwargs)
+
+
+def remove_keywords(keywords, **kwargs):
+    """
+    Create an effect removing keyword abilities (given as a bitmask).
+
+    """
+
+    def remove(object_, characteristics):
+        characteristics["keywords"] &= ~keywords
+    return ContinuousEffect(remove, layer=ABILITY, **kwargs)
+
+
+class DoesntUntap(object):
+    """
+    The permanents that don't untap during their controller's untap step.
+
+    Each entry is owned by the effect (or source) keeping the permanent
+    tapped, and a permanent stays tapped for as long as any owner does. An
+    owner's entries are removed when the effect ends (see
+    :meth:`ContinuousEffects.remove`), and a permanent's when it leaves the
+    battlefield.
+
+    """
+
+    def __init__(self):
+        super(DoesntUntap, self).__init__()
+
+        self._by_owner = {}
+        self._by_permanent = {}
+
+    def __contains__(self, permanent):
+        return permanent in self._by_permanent
+
+    def __iter__(self):
+        return iter(self._by_permanent)
+
+    def __len__(self):
+        return len(self._by_permanent)
+
+    def add(self, permanent, owner):
+        """
+        Keep a permanent from untapping until the owner is removed.
+
+        """
+
+        self._by_permanent.setdefault(permanent, set()).add(owner)
+        self._by_owner.setdefault(owner, set()).add(permanent)
+
+    def remove(self, permanent, owner):
+        """
+        Stop the owner from keeping a permanent from untapping.
+
+        """
+
+        owners = self._by_permanent.get(permanent, ())
+        if owner not in owners:
+            raise exceptions.NoSuchObject(self, "permanent", permanent)
+
+        _discard(self._by_permanent, permanent, owner)
+        _discard(self._by_owner, owner, permanent)
+
+    def remove_owner(self, owner):
+        """
+        Remove all of the entries owned by the given effect or source.
+
+        """
+
+        for permanent in self._by_owner.pop(owner, ()):
+            _discard(self._by_permanent, permanent, owner)
+
+    def discard(self, permanent):
+        """
+        Remove a permanent, whichever owners are keeping it from untapping.
+
+        """
+
+        for owner in self._by_permanent.pop(permanent, ()):
+            _discard(self._by_owner, owner, permanent)
+
+
+class ContinuousEffects(object):
+    """
+    The continuous effects that exist in a game.
+
+    Effects and the objects they read and write form a dependency graph: an
+    object (or zone) changing invalidates the cached characteristics of
+    itself and of everything that an effect reading it can apply to, and so
+    on for anything reading those objects in turn.
+
+    Effects are indexed by the particular objects they affect (or by their
+    scope, for effects that apply to everything in it), so that adding an
+    effect only invalidates what it could apply to, and working out an
+    object's characteristics only walks the effects that could apply to it.
+
+    The static abilities of permanents generate effects while the permanent
+    is on the battlefield.
+
+    """
+
+    def __init__(self, game):
+        super(ContinuousEffects, self).__init__()
+
+        self.game = game
+
+        self._by_object = {}
+        self._by_scope = {}
+        self._cache = {}
+        self._effects = []
+        self._readers = {}
+        self._sources = {}
+        self._timestamps = count()
+        self._writes = {}
+        self._written = {}
+
+        #: the permanents that don't untap during their controller's untap
+        #: step, owned by the effects keeping them tapped
+        self.doesnt_untap = DoesntUntap()
+
+        game.events.subscribe(
+            self._entered_zone, owner=self,
+            event=events.ENTERED_ZONE, needs=["card", "zone"],
+        )
+        game.events.subscribe(
+            self._left_zone, owner=self,
+            event=events.LEFT_ZONE, needs=["card", "zone"],
+        )
+        game.events.subscribe(
+            self._cards_entered_zone, owner=self,
+            event=events.CARDS_ENTERED_ZONE, needs=["cards", "zone"],
+        )
+        game.events.subscribe(
+            self._status_changed, owner=self,
+            event=events.STATUS_CHANGED, needs=["card"],
+        )
+        game.events.subscribe(
+            self._statuses_changed, owner=self,
+            event=events.STATUSES_CHANGED, needs=["changes"],
+        )
+
+    def __contains__(self, effect):
+        return effect in self._writes
+
+    def __iter__(self):
+        return iter(list(self._effects))
+
+    def __len__(self):
+        return len(self._effects)
+
+    def add(self, effect):
+        """
+        Add a new effect, timestamping it.
+
+        """
+
+        effect.timestamp = next(self._timestamps)
+        insort(self._effects, effect)
+
+        if effect.affects is None:
+            insort(self._by_scope.setdefault(effect.scope, []), effect)
+        else:
+            for object_ in effect.affects:
+                insort(self._by_object.setdefault(object_, []), effect)
+
+        self._writes[effect] = set()
+        for read in self._reads(effect):
+            self._readers.setdefault(read, set()).add(effect)
+        if effect.source is not None:
+            self._sources.setdefault(effect.source, []).append(effect)
+
+        self.changed(*self._scope(effect))
+        return effect
+
+    def remove(self, effect):
+        """
+        Remove an effect.
+
+        """
+
+        try:
+            written = self._writes.pop(effect)
+        except KeyError:
+            raise exceptions.NoSuchObject(self, "effect", effect)
+
+        self._effects.remove(effect)
+
+        if effect.affects is None:
+            _unindex(self._by_scope, effect.scope, effect)
+        else:
+            for object_ in effect.affects:
+                _unindex(self._by_object, object_, effect)
+        for object_ in written:
+            _unindex(self._written, object_, effect)
+
+        for read in self._reads(effect):
+            readers = self._readers[read]
+            readers.discard(effect)
+            if not readers:
+                del self._readers[read]
+
+        if effect.source is not None:
+            from_source = self._sources[effect.source]
+            from_source.remove(effect)
+            if not from_source:
+                del self._sources[effect.source]
+
+        self.doesnt_untap.remove_owner(effect)
+        self.changed(*written)
+
+    def remove_source(self, source):
+        """
+        Remove all of the effects generated by the given source.
+
+        """
+
+        for effect in list(self._sources.get(source, ())):
+            self.remove(effect)
+        self.doesnt_untap.remove_owner(source)
+
+    def changed(self, *objects):
+        """
+        Note that the given objects (or zones) changed.
+
+        """
+
+        pending, seen = list(objects), set()
+
+        while pending:
+            changed = pending.pop()
+            if changed in seen:
+                continue
+
+            seen.add(changed)
+            self._cache.pop(changed, None)
+
+            for effect in self._readers.get(changed, ()):
+                pending.extend(self._scope(effect))
+
+    def characteristics(self, object_):
+        """
+        Get the characteristics of an object after applying all effects.
+
+        The returned dict should not be modified.
+
+        """
+
+        try:
+            return self._cache[object_]
+        except KeyError:
+            pass
+
+        characteristics = {}
+        for name in CHARACTERISTICS:
+            value = getattr(object_, name, 0 if name == "keywords" else None)
+            if isinstance(value, (list, set)):
+                value = type(value)(value)
+            characteristics[name] = value
+
+        candidates = [self._by_object.get(object_, ())]
+        candidates.extend(
+            effects for scope, effects in self._by_scope.iteritems()
+            if object_ in self._zone(scope)
+        )
+
+        applied = set()
+        for effect in merge(*candidates):
+            applies = object_ in self._zone(effect.scope) and (
+                effect.applies is None or
+                effect.applies(object_, characteristics)
+            )
+
+            if applies:
+                effect.apply(object_, characteristics)
+                applied.add(effect)
+
+        for effect in self._written.pop(object_, set()) - applied:
+            self._writes[effect].discard(object_)
+        for effect in applied:
+            self._writes[effect].add(object_)
+        if applied:
+            self._written[object_] = applied
+
+        self._cache[object_] = characteristics
+        return characteristics
+
+    def get(self, object_, characteristic):
+        """
+        Get a single characteristic of an object after applying all effects.
+
+        """
+
+        return self.characteristics(object_)[characteristic]
+
+    def has_keywords(self, object_, keywords):
+        """
+        Check whether an object has all of the given keyword abilities (given
+        as a bitmask), after applying all effects.
+
+        """
+
+        return (self.get(object_, "keywords") & keywords) == keywords
+
+    def _reads(self, effect):
+        if effect.source is None:
+            return effect.reads
+        return effect.reads | {effect.source}
+
+    def _scope(self, effect):
+        """
+        Everything an effect could apply to, or did apply to.
+
+        """
+
+        if effect.affects is None:
+            scope = set(self._zone(effect.scope))
+        else:
+            scope = set(effect.affects)
+        return scope | self._writes[effect]
+
+    def _zone(self, scope):
+        if scope is None:
+            return self.game.battlefield
+        return scope
+
+    def _entered_zone(self, handler, card, zone):
+        self.changed(card, zone)
+
+        if zone is self.game.battlefield:
+            for ability in getattr(card, "abilities", ()):
+                if getattr(ability, "type", None) != "static":
+                    continue
+
+                generated = ability()
+                if isinstance(generated, ContinuousEffect):
+                    generated = [generated]
+
+                for effect in generated or ():
+                    effect.source = card
+                    self.add(effect)
+
+    def _cards_entered_zone(self, handler, cards, zone):
+        for card in cards:
+            self._entered_zone(handler, card, zone)
+
+    def _left_zone(self, handler, card, zone):
+        if zone is self.game.battlefield:
+            self.remove_source(card)
+            self.doesnt_untap.discard(card)
+        self.changed(card, zone)
+
+    def _status_changed(self, handler, card):
+        self.changed(card)
+
+    def _statuses_changed(self, handler, changes):
+        self.changed(*(card for card, _ in changes))
+
+
+def _discard(index, key, value):
+    values = index.get(key)
+    if values is not None:
+        values.discard(value)
+        if not values:
+            del index[key]
+
+
+def _unindex(index, key, effect):
+    indexed = index[key]
+    indexed.remove(effect)
+    if not indexed:
+        del index[key]
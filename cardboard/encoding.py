@@ -0,0 +1,145 @@
+"""
+The encodings that messages on the engine port can be sent in.
+
+JSON is the default. A client can ask for another encoding by sending an
+``encoding`` request as the very first message on its connection, e.g.::
+
+    {"jsonrpc" : "2.0", "id" : 0, "method" : "encoding",
+     "params" : {"name" : "compact"}}
+
+The (JSON) response confirms the switch, and every message after it in both
+directions is sent in the new encoding.
+
+The compact encoding is MessagePack, with each of the field names in
+:data:`KEYS` sent as its (small integer) index in it rather than as a string.
+Integer keys in a map always stand for field names, so maps keyed by IDs
+(e.g. the blocks chosen in a ``selectBlocks`` call) are keyed by the IDs as
+strings, just as they are in JSON. It's only available if the :mod:`msgpack`
+module is installed.
+
+"""
+
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+__all__ = ["ENCODINGS", "KEYS", "Compact", "JSON", "expand", "shrink"]
+
+
+#: The field names that the compact encoding sends as integers.
+#:
+#: Clients rely on the index of each name, so new names may only ever be added
+#: to the end.
+KEYS = (
+    # JSON RPC
+    "jsonrpc", "id", "method", "params", "result", "error", "code", "message",
+
+    # the API
+    "auth", "gameID", "playerID", "name", "started", "teams", "version",
+    "handSize", "life", "poison", "dead", "stops", "states", "players",
+    "since", "limit", "games", "more", "state",
+
+    # state deltas
+    "type", "card", "from", "to", "player", "amount", "color", "changes",
+    "merged", "zones", "zone", "cards", "status", "mana",
+
+    # drafts
+    "draftID", "drafterID", "round", "sets", "seats", "drafters", "drafts",
+    "pack", "picks",
+)
+_INDEXES = {key : index for index, key in enumerate(KEYS)}
+
+
+def shrink(obj):
+    """
+    Replace each of the known field names in an object with its index.
+
+    Integer keys are turned into strings (as JSON would), so that they can't
+    be mistaken for field indexes.
+
+    """
+
+    if isinstance(obj, dict):
+        return {
+            _shrunk(key) : shrink(value) for key, value in obj.iteritems()
+        }
+    elif isinstance(obj, (list, tuple)):
+        return [shrink(each) for each in obj]
+    return obj
+
+
+def expand(obj):
+    """
+    Replace each of the field indexes in an object with its name.
+
+    Raises a :exc:`ValueError` for indexes of fields that don't exist.
+
+    """
+
+    if isinstance(obj, dict):
+        return {
+            _expanded(key) : expand(value) for key, value in obj.iteritems()
+        }
+    elif isinstance(obj, list):
+        return [expand(each) for each in obj]
+    return obj
+
+
+def _shrunk(key):
+    if isinstance(key, basestring):
+        return _INDEXES.get(key, key)
+    elif isinstance(key, (int, long)):
+        return unicode(key)
+    return key
+
+
+def _expanded(key):
+    if not isinstance(key, (int, long)):
+        return key
+    elif not 0 <= key < len(KEYS):
+        raise ValueError("Unknown field {!r}".format(key))
+    return KEYS[key]
+
+
+class JSON(object):
+    """
+    Messages encoded as JSON.
+
+    """
+
+    name = "json"
+
+    @staticmethod
+    def dumps(obj):
+        return json.dumps(obj)
+
+    @staticmethod
+    def loads(string):
+        return json.loads(string)
+
+
+class Compact(object):
+    """
+    Messages encoded as MessagePack, with integer keys for known fields.
+
+    """
+
+    name = "compact"
+
+    @staticmethod
+    def dumps(obj):
+        return msgpack.packb(shrink(obj))
+
+    @staticmethod
+    def loads(string):
+        return expand(msgpack.unpackb(string, encoding="utf-8"))
+
+
+#: the encodings available, by name
+ENCODINGS = {JSON.name : JSON}
+if msgpack is not None:
+    ENCODINGS[Compact.name] = Compact
@@ -97,63 +97,494 @@ Card and spell events are triggered for events that are relevant to cards,
 The card and spell events are as follows:
 
 
-+--------------------------+--------------------+-----------------------------+
-| Event                    | Description        | Parameters                  |
-+==========================+====================+=============================+
-| :const:`CARD_CAST`       | A card was         | * ``card``:                 |
-|                          | :term:`cast`.      |   ``<the casted card>``     |
-|                          |                    | * ``player``:               |
-|                          |                    |   ``<the casting player>``  |
-+--------------------------+--------------------+-----------------------------+
-| :const:`SPELL_COUNTERED` | A spell was        | * ``spell``:                |
-|                          | :term:`countered   |   ``<the countered spell>`` |
-|                          | <counter>`.        |                             |
-+--------------------------+--------------------+-----------------------------+
-| :const:`SPELL_RESOLVED`  | A spell            | * ``spell``:                |
-|                          | :term:`resolved    |   ``<the resolving spell>`` |
-|                          | <resolve>`.        |                             |
-+--------------------------+--------------------+-----------------------------+
-| :const:`STATUS_CHANGED`  | A card's           | * ``card``:                 |
-|                          | :term:`status` was |   ``<the card>``            |
-|                          | changed.           | * ``status``:               |
-|                          |                    |                             |
-|                          |                    |   * ``"tapped"`` /          |
-|                          |                    |     ``"untapped"``          |
-|                          |                    |   * ``"flipped"`` /         |
-|                          |                    |     ``"unflipped"``         |
-|                          |                    |   * ``"face up"`` /         |
-|                          |                    |     ``"face down"``         |
-|                          |                    |   * ``"phased in"`` /       |
-|                          |                    |     ``"phased out"``        |
-+--------------------------+--------------------+-----------------------------+
-| :const:`ENTERED_ZONE`    | A card entered or  | * ``card``:                 |
-|                          | left a             |   ``<the moving card>``     |
-| :const:`LEFT_ZONE`       | :term:`zone`.      | * ``zone``:                 |
-|                          |                    |   ``<the relevant zone>``   |
-+--------------------------+--------------------+-----------------------------+
++----------------------------+------------------+-----------------------------+
+| Event                      | Description      | Parameters                  |
++============================+==================+=============================+
+| :const:`CARD_CAST`         | A card was       | * ``card``:                 |
+|                            | :term:`cast`.    |   ``<the casted card>``     |
+|                            |                  | * ``player``:               |
+|                            |                  |   ``<the casting player>``  |
++----------------------------+------------------+-----------------------------+
+| :const:`SPELL_COUNTERED`   | A spell was      | * ``spell``:                |
+|                            | :term:`countered |   ``<the countered spell>`` |
+|                            | <counter>`.      |                             |
++----------------------------+------------------+-----------------------------+
+| :const:`SPELL_RESOLVED`    | A spell          | * ``spell``:                |
+|                            | :term:`resolved  |   ``<the resolving spell>`` |
+|                            | <resolve>`.      |                             |
++----------------------------+------------------+-----------------------------+
+| :const:`STATUS_CHANGED`    | A card's         | * ``card``:                 |
+|                            | :term:`status`   |   ``<the card>``            |
+|                            | was changed.     | * ``status``:               |
+|                            |                  |                             |
+|                            |                  |   * ``"tapped"`` /          |
+|                            |                  |     ``"untapped"``          |
+|                            |                  |   * ``"flipped"`` /         |
+|                            |                  |     ``"unflipped"``         |
+|                            |                  |   * ``"face up"`` /         |
+|                            |                  |     ``"face down"``         |
+|                            |                  |   * ``"phased in"`` /       |
+|                            |                  |     ``"phased out"``        |
++----------------------------+------------------+-----------------------------+
+| :const:`STATUSES_CHANGED`  | The statuses of  | * ``changes``:              |
+|                            | many cards were  |   ``[(<card>, <status>),    |
+|                            | changed at once. |   ...]``                    |
++----------------------------+------------------+-----------------------------+
+| :const:`ENTERED_ZONE`      | A card entered   | * ``card``:                 |
+|                            | or left a        |   ``<the moving card>``     |
+| :const:`LEFT_ZONE`         | :term:`zone`.    | * ``zone``:                 |
+|                            |                  |   ``<the relevant zone>``   |
++----------------------------+------------------+-----------------------------+
+| :const:`CARDS_ENTERED_ZONE`| Many cards       | * ``cards``:                |
+|                            | entered a        |   ``[<card>, ...]``         |
+|                            | :term:`zone` at  | * ``zone``:                 |
+|                            | once.            |   ``<the zone>``            |
++----------------------------+------------------+-----------------------------+
+
+
+Combat Events
+=============
+
+Combat events are triggered once for each declaration and each pass of
+:term:`combat damage`, rather than once for each creature involved.
+
+
++------------------------------+----------------+-----------------------------+
+| Event                        | Description    | Parameters                  |
++==============================+================+=============================+
+| :const:`ATTACKERS_DECLARED`  | Attacking      | * ``player``:               |
+|                              | creatures were |   ``<the active player>``   |
+|                              | declared.      | * ``attacks``: ``{<attacker>|
+|                              |                |   : <the attacked player or |
+|                              |                |   planeswalker>}``          |
++------------------------------+----------------+-----------------------------+
+| :const:`BLOCKERS_DECLARED`   | Blocking       | * ``player``:               |
+|                              | creatures were |   ``<the defending player>``|
+|                              | declared.      | * ``blocks``: ``{<blocker> :|
+|                              |                |   <the blocked attacker>}`` |
++------------------------------+----------------+-----------------------------+
+| :const:`COMBAT_DAMAGE_DEALT` | Combat damage  | * ``player``:               |
+|                              | was dealt.     |   ``<the active player>``   |
+|                              |                | * ``damage``: ``[(<source>, |
+|                              |                |   <recipient>, <amount>)]`` |
+|                              |                | * ``first_strike``: whether |
+|                              |                |   this was the first strike |
+|                              |                |   damage step               |
++------------------------------+----------------+-----------------------------+
+
+
+Event Objects
+=============
+
+Each event above is an :class:`Event` with a small integer code in addition to
+its name. Triggering an event passes a slotted :class:`Payload` (created by
+calling the event with its parameters, in the order listed above) rather than
+a dict of keyword arguments::
+
+    game.events.trigger(events.DRAW(player))
+
+Events compare equal to their names, and are serialized as them.
 
 """
 
 
-GAME_BEGAN, GAME_ENDED = "game began", "game ended"
-TURN_BEGAN, TURN_ENDED = "turn began", "turn ended"
-PHASE_BEGAN, PHASE_ENDED = "phase began", "phase ended"
-STEP_BEGAN, STEP_ENDED = "step began", "step ended"
+import weakref
+
+import panglery
+
+
+class Event(object):
+    """
+    An event type.
+
+    Each event type has a small integer :attr:`code` and the (interned) string
+    :attr:`name` that events were historically identified by. Event types
+    compare and hash equal to their names, so subscriptions made with a plain
+    string continue to work.
+
+    Calling an event type with its parameters (positionally, in the order
+    given by :attr:`fields`) creates a :class:`Payload` suitable for passing to
+    :meth:`EventHandler.trigger`.
+
+    """
+
+    __slots__ = ("code", "name", "fields", "payload")
+
+    _by_code = []
+    _by_name = {}
+
+    def __init__(self, name, *fields):
+        self.name = intern(name)
+        self.fields = fields
+        self.code = len(self._by_code)
+
+        self.payload = type(
+            "".join(word.title() for word in name.split()),
+            (Payload,),
+            {"__slots__" : fields, "event" : self},
+        )
+
+        self._by_code.append(self)
+        self._by_name[self.name] = self
+
+    def __call__(self, *args, **kwargs):
+        return self.payload(*args, **kwargs)
+
+    def __eq__(self, other):
+        if isinstance(other, Event):
+            return self is other
+        elif isinstance(other, basestring):
+            return self.name == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __repr__(self):
+        return "<Event {0.code}: {0.name}>".format(self)
+
+    def __str__(self):
+        return self.name
+
+    def __unicode__(self):
+        return unicode(self.name)
+
+    @classmethod
+    def lookup(cls, code_or_name):
+        """
+        Find the event type with the given code or (serialized) name.
+
+        """
+
+        if isinstance(code_or_name, cls):
+            return code_or_name
+
+        try:
+            if isinstance(code_or_name, basestring):
+                return cls._by_name[code_or_name]
+            return cls._by_code[code_or_name]
+        except (IndexError, KeyError, TypeError):
+            raise LookupError("No such event {!r}".format(code_or_name))
+
+
+class Payload(object):
+    """
+    The parameters of a single triggered event.
+
+    Payloads are slotted records, one class per event type. They support just
+    enough of the mapping interface for subscribers' conditions to be checked
+    against them without converting them to a dict.
+
+    """
+
+    __slots__ = ()
+
+    event = None
+
+    def __init__(self, *args, **kwargs):
+        fields = self.__slots__
+
+        if len(args) > len(fields):
+            raise TypeError(
+                "{} takes at most {} parameters ({} given)".format(
+                    self.event, len(fields), len(args),
+                )
+            )
+
+        for field, value in zip(fields, args):
+            setattr(self, field, value)
+        for field, value in kwargs.iteritems():
+            setattr(self, field, value)
+
+    def __contains__(self, key):
+        return key == "event" or key in self.__slots__
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def __repr__(self):
+        params = ", ".join(
+            "{}={!r}".format(field, getattr(self, field, None))
+            for field in self.__slots__
+        )
+        return "<{} ({})>".format(self.event, params)
+
+    def iteritems(self):
+        yield "event", self.event
+        for field in self.__slots__:
+            yield field, getattr(self, field, None)
+
+    def as_dict(self):
+        """
+        Convert the payload to a dict (e.g. for serialization).
+
+        """
+
+        return dict(self.iteritems())
+
+    def update(self, parameters):
+        for field, value in parameters.iteritems():
+            setattr(self, field, value)
 
-PLAYER_CONCEDED = "player conceded"
-PLAYER_DIED = "player died"
-DRAW = "draw"
-LIFE_GAINED, LIFE_LOST = "life gained", "life lost"
-MANA_ADDED, MANA_REMOVED = "mana added", "mana removed"
 
-CARD_CAST = "card cast"
-SPELL_COUNTERED = "spell countered"
-SPELL_RESOLVED = "spell resolved"
+class _WeakMethod(object):
+    """
+    A bound method that does not keep its instance alive.
 
-STATUS_CHANGED = "status changed"
+    Calling it once the instance is gone does nothing.
+
+    """
+
+    __slots__ = ("function", "instance")
+
+    def __init__(self, method):
+        self.function = method.im_func
+        self.instance = weakref.ref(method.im_self)
+
+    def __call__(self, *args, **kwargs):
+        instance = self.instance()
+        if instance is not None:
+            return self.function(instance, *args, **kwargs)
+
+    def __eq__(self, other):
+        if getattr(other, "im_func", None) is not self.function:
+            return NotImplemented
+        return other.im_self is self.instance()
+
+
+class EventHandler(panglery.Pangler):
+    """
+    A :class:`panglery.Pangler` that also accepts :class:`Payload` objects.
+
+    Subscribers are indexed by the event type they subscribe to, so
+    triggering an event only looks at subscribers that can possibly match it.
+
+    Subscriptions may be tied to an owner's lifetime (see :meth:`subscribe`).
+
+    """
+
+    #: the number of events that have been triggered
+    triggered = 0
+
+    def __init__(self, *args, **kwargs):
+        super(EventHandler, self).__init__(*args, **kwargs)
+        self._dispatch = {}
+        self._owners = {}
+
+        # owner key -> the zone whose leaving removes its subscriptions
+        self._leaving = {}
+        self._leaving_hooked = False
+
+    def subscribe(self, _func=None, owner=None, **kwargs):
+        """
+        Add a hook, optionally owned by an object.
+
+        Owners are only weakly referenced, as are subscribed methods bound to
+        them. An owner's subscriptions are removed when it is garbage
+        collected, or explicitly by :meth:`unsubscribe`.
+
+        """
+
+        deco = super(EventHandler, self).subscribe(**kwargs)
+
+        def indexed(func):
+            if owner is None:
+                key = None
+                subscriber = func
+            else:
+                key = self._own(owner)
+                if getattr(func, "im_self", None) is owner:
+                    subscriber = _WeakMethod(func)
+                else:
+                    subscriber = func
+
+            deco(subscriber)
+            hook = self.hooks[-1]
+            hook.owner, hook.removed = key, False
+
+            self._dispatch.clear()
+            return func
+
+        if _func is not None:
+            indexed(_func)
+        else:
+            return indexed
+
+    def unsubscribe(self, func=None, owner=None):
+        """
+        Remove a subscribed function, or all of an owner's subscriptions.
+
+        """
+
+        if owner is not None:
+            self._forget(id(owner))
+        if func is not None:
+            self._remove(lambda hook : hook.func == func)
+
+    def release_on_leaving(self, owner, zone):
+        """
+        Remove an owner's subscriptions once it leaves the given zone.
+
+        Every such owner shares a single :const:`LEFT_ZONE` hook, which looks
+        up the card that left, so a move costs the same however many owners
+        are waiting to leave.
+
+        """
+
+        self._leaving[self._own(owner)] = zone
+
+        if not self._leaving_hooked:
+            self._leaving_hooked = True
+            self.subscribe(
+                _left_zone, event=LEFT_ZONE, needs=["card", "zone"],
+            )
+
+    def clear(self):
+        """
+        Remove every subscription.
+
+        """
+
+        self._owners.clear()
+        self._leaving.clear()
+        self._leaving_hooked = False
+        self._remove(lambda hook : True)
+
+    def trigger(self, payload=None, **event):
+        """
+        Trigger an event.
+
+        Either pass a :class:`Payload` (which avoids building a dict for each
+        event) or the event parameters as keyword arguments.
+
+        """
+
+        if payload is None:
+            if not event:
+                raise ValueError("tried to trigger nothing")
+            payload, kind = event, event.get("event")
+        else:
+            kind = payload.event
+
+        self.triggered += 1
+
+        for hook in self.hooks_for(kind):
+            # hooks can be removed by an earlier hook for the same event
+            if hook.matches(payload) and not getattr(hook, "removed", False):
+                hook.execute(self, payload)
+
+    def hooks_for(self, event):
+        """
+        The hooks that could match the given event type, in subscribed order.
+
+        """
+
+        try:
+            return self._dispatch[event]
+        except KeyError:
+            hooks = self._dispatch[event] = [
+                hook for hook in self.hooks
+                if hook.conditions.get("event", event) == event
+            ]
+            return hooks
+        except TypeError:  # an unhashable event
+            return self.hooks
+
+    def clone(self):
+        clone = super(EventHandler, self).clone()
+        clone._dispatch, clone._owners = {}, {}
+        clone._leaving, clone._leaving_hooked = {}, False
+        return clone
+
+    def _own(self, owner):
+        key = id(owner)
+
+        if key not in self._owners:
+            handler = weakref.ref(self)
+
+            def collected(ref):
+                self = handler()
+                if self is not None:
+                    self._forget(key)
+
+            try:
+                self._owners[key] = weakref.ref(owner, collected)
+            except TypeError:  # can't be weakly referenced
+                self._owners[key] = None
+
+        return key
+
+    def _forget(self, key):
+        self._leaving.pop(key, None)
+        if self._owners.pop(key, False) is not False:
+            self._remove(lambda hook : getattr(hook, "owner", None) == key)
+
+    def _remove(self, removing):
+        hooks = []
+
+        for hook in self.hooks:
+            if removing(hook):
+                hook.removed = True
+            else:
+                hooks.append(hook)
+
+        self.hooks = hooks
+        self._dispatch.clear()
+
+
+def _left_zone(handler, card, zone):
+    key = id(card)
+    if handler._leaving.get(key) is not zone:
+        return
+
+    owner = handler._owners.get(key)
+    if owner is not None and owner() is card:
+        handler._forget(key)
+
+
+GAME_BEGAN = Event("game began", "game")
+GAME_ENDED = Event("game ended", "game")
+TURN_BEGAN = Event("turn began", "player", "number")
+TURN_ENDED = Event("turn ended", "player", "number")
+PHASE_BEGAN = Event("phase began", "phase", "player")
+PHASE_ENDED = Event("phase ended", "phase", "player")
+STEP_BEGAN = Event("step began", "phase", "step", "player")
+STEP_ENDED = Event("step ended", "phase", "step", "player")
+
+PLAYER_CONCEDED = Event("player conceded", "player")
+PLAYER_DIED = Event("player died", "player", "reason")
+DRAW = Event("draw", "player")
+LIFE_GAINED = Event("life gained", "player", "amount")
+LIFE_LOST = Event("life lost", "player", "amount")
+MANA_ADDED = Event("mana added", "color", "player", "amount")
+MANA_REMOVED = Event("mana removed", "color", "player", "amount")
+
+CARD_CAST = Event("card cast", "card", "player")
+SPELL_COUNTERED = Event("spell countered", "spell")
+SPELL_RESOLVED = Event("spell resolved", "spell")
+
+STATUS_CHANGED = Event("status changed", "card", "status")
+STATUSES_CHANGED = Event("statuses changed", "changes")
 TAPPED, UNTAPPED = "tapped", "untapped"
 FLIPPED, UNFLIPPED = "flipped", "unflipped"
 FACE_UP, FACE_DOWN = "face up", "face down"
 PHASED_IN, PHASED_OUT = "phased in", "phased out"
 
-ENTERED_ZONE, LEFT_ZONE = "entered zone", "left zone"
+ENTERED_ZONE = Event("entered zone", "card", "zone")
+LEFT_ZONE = Event("left zone", "card", "zone")
+CARDS_ENTERED_ZONE = Event("cards entered zone", "cards", "zone")
+
+ATTACKERS_DECLARED = Event("attackers declared", "player", "attacks")
+BLOCKERS_DECLARED = Event("blockers declared", "player", "blocks")
+COMBAT_DAMAGE_DEALT = Event(
+    "combat damage dealt", "player", "damage", "first_strike",
+)
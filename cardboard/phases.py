@@ -8,8 +8,11 @@ Implements the turn structure mechanics (phases and steps).
 
 from collections import namedtuple
 
-from cardboard import events
+from cardboard import events, exceptions
+from cardboard.card import change_statuses
 from cardboard.cards import match
+from cardboard.combat import Combat
+from cardboard.util import suspendable
 
 
 def untap(game):
@@ -27,35 +30,41 @@ def untap(game):
 
     player = game.turn.active_player
 
-    # XXX: Technically the rules say all this is "simultaneous".
-    #      At some point that will probably matter, and we will need some tests
-    #      and an implementation of that.
-
     game.events.trigger(
-        event=events.STEP_BEGAN, phase="beginning",
-        step="untap", player=player,
+        events.STEP_BEGAN("beginning", "untap", player)
     )
 
+    # Which permanents phase and untap is worked out up front, and then it all
+    # happens simultaneously, with a single event.
+    changes, untapping = [], []
     for permanent in player.battlefield:
+        phased_in = permanent.is_phased_in
         if match.phases(permanent):
-            if permanent.is_phased_in:
-                permanent.phase_out()
-            else:
-                permanent.phase_in()
+            phased_in = not phased_in
+            status = events.PHASED_IN if phased_in else events.PHASED_OUT
+            changes.append((permanent, status))
+
+        if phased_in and permanent.is_tapped:
+            untapping.append(permanent)
 
-        if permanent.is_tapped:
-            # XXX: Check if the permanent says it can be untapped.
-            permanent.untap()
+    doesnt_untap = game.continuous.doesnt_untap
+    changes.extend(
+        (permanent, events.UNTAPPED) for permanent in untapping
+        if permanent not in doesnt_untap
+    )
 
-    # XXX: Again, technically abilities can't activate / resolve here, they
+    if changes:
+        change_statuses(game, changes)
+
+    # XXX: Technically abilities can't activate / resolve here, they
     #      should be deferred until the upkeep.
 
     game.events.trigger(
-        event=events.STEP_ENDED, phase="beginning",
-        step="untap", player=player,
+        events.STEP_ENDED("beginning", "untap", player)
     )
 
 
+@suspendable
 def upkeep(game):
     """
     Perform the :ref:`upkeep-step`.
@@ -69,18 +78,17 @@ def upkeep(game):
     """
 
     game.events.trigger(
-        event=events.STEP_BEGAN, phase="beginning",
-        step="upkeep", player=game.turn.active_player,
+        events.STEP_BEGAN("beginning", "upkeep", game.turn.active_player)
     )
 
-    game.grant_priority()
+    yield game.grant_priority()
 
     game.events.trigger(
-        event=events.STEP_ENDED, phase="beginning",
-        step="upkeep", player=game.turn.active_player,
+        events.STEP_ENDED("beginning", "upkeep", game.turn.active_player)
     )
 
 
+@suspendable
 def draw(game):
     """
     Perform the :ref:`draw-step`.
@@ -94,133 +102,191 @@ def draw(game):
 
     """
 
-    game.turn.active_player.draw()
+    yield game.turn.active_player.draw()
 
     game.events.trigger(
-        event=events.STEP_BEGAN, phase="beginning",
-        step="draw", player=game.turn.active_player
+        events.STEP_BEGAN("beginning", "draw", game.turn.active_player)
     )
 
-    game.grant_priority()
+    yield game.grant_priority()
 
     game.events.trigger(
-        event=events.STEP_ENDED, phase="beginning",
-        step="draw", player=game.turn.active_player,
+        events.STEP_ENDED("beginning", "draw", game.turn.active_player)
     )
 
 
+@suspendable
 def _main(game):
     """
     Perform the :ref:`main-phase`.
 
     """
 
-    game.grant_priority()
+    yield game.grant_priority()
 
 
+@suspendable
 def first_main(game):
     player = game.turn.active_player
 
-    game.events.trigger(
-        event=events.PHASE_BEGAN, phase="first main", player=player,
-    )
+    game.events.trigger(events.PHASE_BEGAN("first main", player))
 
-    _main(game)
+    yield _main(game)
 
-    game.events.trigger(
-        event=events.PHASE_ENDED, phase="first main", player=player,
-    )
+    game.events.trigger(events.PHASE_ENDED("first main", player))
 
 
+@suspendable
 def beginning_of_combat(game):
     """
     Perform the :ref:`beginning-combat-step`.
 
     """
 
+    game.combat = Combat(game)
+
     game.events.trigger(
-        event=events.STEP_BEGAN, phase="combat",
-        step="beginning", player=game.turn.active_player
+        events.STEP_BEGAN("combat", "beginning", game.turn.active_player)
     )
 
-    game.grant_priority()
+    yield game.grant_priority()
 
     game.events.trigger(
-        event=events.STEP_ENDED, phase="combat",
-        step="beginning", player=game.turn.active_player
+        events.STEP_ENDED("combat", "beginning", game.turn.active_player)
     )
 
 
+@suspendable
 def declare_attackers(game):
     """
     Perform the :ref:`declare-attackers-step`.
 
     """
 
+    player = game.turn.active_player
+    battlefield = player.battlefield
+
     game.events.trigger(
-        event=events.STEP_BEGAN, phase="combat",
-        step="declare attackers", player=game.turn.active_player
+        events.STEP_BEGAN("combat", "declare attackers", player)
     )
 
-    possible_attackers = {c for c in game.battlefield if c.can_attack}
-
-    targets = game.turn.active_player.opponents
-
-    for opponent in targets:
-        targets |= {card for card in opponent.battlefield
-                    if card.type == "Planeswalker"}
-
-    # attackers = game.turn.active_player.user.select.cards(
-    #     game.battlefield, how_many=None
-    # )
-    # attacks = {
-    #    k : game.turn.active_player.user.select.combined(attackers)
-    #    for k in attackers
-    # }
+    # tapped creatures can't attack (they're tapped to attack)
+    def can_attack(card):
+        return (
+            match.is_creature(card) and card.can_attack and not card.is_tapped
+        )
 
-    # for card in attacks:
-    #     card.tap()
+    with game.timings.waiting():
+        attackers = yield player.user.select_cards(
+            battlefield, match=can_attack, how_many=None,
+        )
 
-    game.grant_priority()
+    if attackers:
+        attackers = list(attackers)
+        for attacker in attackers:
+            if attacker not in battlefield or not can_attack(attacker):
+                raise exceptions.BadSelection(
+                    "{} can't attack.".format(attacker)
+                )
+
+        targets = list(player.opponents)
+        for opponent in player.opponents:
+            targets.extend(
+                card for card in opponent.battlefield
+                if match.is_planeswalker(card)
+            )
+
+        if len(targets) == 1:
+            chosen = targets * len(attackers)
+        else:
+            # what each attacker attacks, in the order they were declared
+            with game.timings.waiting():
+                chosen = yield player.user.select(
+                    targets, how_many=len(attackers), duplicates=True,
+                )
+            chosen = list(chosen)
+
+            if len(chosen) != len(attackers):
+                err = "{} must choose what each attacking creature attacks."
+                raise exceptions.BadSelection(err.format(player))
+
+        attacks = dict(zip(attackers, chosen))
+
+        game.combat.declare_attackers(attacks)
+
+        for attacker in attacks:
+            if not match.has_vigilance(attacker):
+                attacker.tap()
+
+    yield game.grant_priority()
 
     game.events.trigger(
-        event=events.STEP_ENDED, phase="combat",
-        step="declare attackers", player=game.turn.active_player
+        events.STEP_ENDED("combat", "declare attackers", player)
     )
 
 
+@suspendable
 def declare_blockers(game):
     """
     Perform the :ref:`declare-blockers-step`.
 
     """
 
+    player, combat = game.turn.active_player, game.combat
+
     game.events.trigger(
-        event=events.STEP_BEGAN, phase="combat",
-        step="declare blockers", player=game.turn.active_player
+        events.STEP_BEGAN("combat", "declare blockers", player)
     )
 
+    if combat.attacks:
+        for defending in player.opponents:
+            legal = combat.legal_blocks(defending)
+            if not any(legal.itervalues()):
+                continue
+
+            with game.timings.waiting():
+                blocks = yield defending.user.select_blocks(legal)
+            combat.declare_blockers(defending, dict(blocks))
+
+        for attacker, blockers in combat.blockers.iteritems():
+            if len(blockers) > 1:
+                with game.timings.waiting():
+                    order = yield player.user.select(
+                        blockers, how_many=len(blockers),
+                    )
+                if order:
+                    combat.order_blockers(attacker, order)
+
+    yield game.grant_priority()
+
     game.events.trigger(
-        event=events.STEP_ENDED, phase="combat",
-        step="declare blockers", player=game.turn.active_player
+        events.STEP_ENDED("combat", "declare blockers", player)
     )
 
 
+@suspendable
 def combat_damage(game):
     """
     Perform the :ref:`combat-damage-step`.
 
+    If any attacking or blocking creature has first strike or double strike,
+    there are two combat damage steps.
+
     """
 
-    game.events.trigger(
-        event=events.STEP_BEGAN, phase="combat",
-        step="combat damage", player=game.turn.active_player
-    )
+    player, combat = game.turn.active_player, game.combat
 
-    game.events.trigger(
-        event=events.STEP_ENDED, phase="combat",
-        step="combat damage", player=game.turn.active_player
-    )
+    for _ in range(combat.damage_passes):
+        game.events.trigger(
+            events.STEP_BEGAN("combat", "combat damage", player)
+        )
+
+        combat.deal_damage()
+        yield game.grant_priority()
+
+        game.events.trigger(
+            events.STEP_ENDED("combat", "combat damage", player)
+        )
 
 
 def end_of_combat(game):
@@ -230,29 +296,27 @@ def end_of_combat(game):
     """
 
     game.events.trigger(
-        event=events.STEP_BEGAN, phase="combat",
-        step="end", player=game.turn.active_player
+        events.STEP_BEGAN("combat", "end", game.turn.active_player)
     )
     game.events.trigger(
-        event=events.STEP_ENDED, phase="combat",
-        step="end", player=game.turn.active_player
+        events.STEP_ENDED("combat", "end", game.turn.active_player)
     )
 
+    game.combat = None
+
 
+@suspendable
 def second_main(game):
     player = game.turn.active_player
 
-    game.events.trigger(
-        event=events.PHASE_BEGAN, phase="second main", player=player,
-    )
+    game.events.trigger(events.PHASE_BEGAN("second main", player))
 
-    _main(game)
+    yield _main(game)
 
-    game.events.trigger(
-        event=events.PHASE_ENDED, phase="second main", player=player,
-    )
+    game.events.trigger(events.PHASE_ENDED("second main", player))
 
 
+@suspendable
 def end(game):
     """
     Perform the :ref:`end-step`.
@@ -266,18 +330,17 @@ def end(game):
     """
 
     game.events.trigger(
-        event=events.STEP_BEGAN, phase="ending",
-        step="end", player=game.turn.active_player
+        events.STEP_BEGAN("ending", "end", game.turn.active_player)
     )
 
-    game.grant_priority()
+    yield game.grant_priority()
 
     game.events.trigger(
-        event=events.STEP_ENDED, phase="ending",
-        step="end", player=game.turn.active_player
+        events.STEP_ENDED("ending", "end", game.turn.active_player)
     )
 
 
+@suspendable
 def cleanup(game):
     """
     Perform the :ref:`cleanup-step`.
@@ -285,28 +348,30 @@ def cleanup(game):
     """
 
     # 1. Hand size is trimmed to the max hand size (usually 7)
-    # 2. XXX: All damage is removed and end of turn effects end.
+    # 2. All damage is removed and end of turn effects end (both of which are
+    #    scheduled with the turn manager for this step)
     # 3. No players get priority # XXX: except for the exception in rule 514.3a
 
     game.events.trigger(
-        event=events.STEP_BEGAN, phase="ending",
-        step="cleanup", player=game.turn.active_player
+        events.STEP_BEGAN("ending", "cleanup", game.turn.active_player)
     )
 
     player = game.turn.active_player
     discard = len(player.hand) - player.hand_size
 
     if discard > 0:
-        selection = player.user.select_cards(
-            zone=player.hand, how_many=discard,
-        )
+        with game.timings.waiting():
+            selection = yield player.user.select_cards(
+                zone=player.hand, how_many=discard,
+            )
 
         for card in selection:
-            card.owner.graveyard.move(card)
+            yield card.owner.graveyard.move(card)
+
+    game.turn.expire()
 
     game.events.trigger(
-        event=events.STEP_ENDED, phase="ending",
-        step="cleanup", player=game.turn.active_player
+        events.STEP_ENDED("ending", "cleanup", game.turn.active_player)
     )
 
 
@@ -0,0 +1,123 @@
+"""
+Standing instructions to pass :term:`priority`.
+
+Rather than being asked what to do each time they receive priority, a player
+can ask to keep passing it until one of a number of stops is reached (e.g.
+"until end of turn, unless an opponent casts a spell"). The instruction is
+checked by the game itself each time the player would receive priority, and
+the player is only asked to act once a stop is reached, at which point the
+instruction is cancelled.
+
+Stops are registered by name in :data:`STOPS`. Each is a function that takes
+the game and player at the time the instruction is given and returns a
+function checking whether the stop has been reached.
+
+.. seealso::
+    :ref:`grant-priority`
+
+"""
+
+from cardboard import phases
+from cardboard.util import populate
+
+
+__all__ = ["PassUntil", "STOPS"]
+
+
+#: stop name -> function creating a check for the stop
+STOPS = {}
+stop = populate(STOPS, allow_overwrite=False)
+
+
+@stop("end of turn")
+def end_of_turn(game, player):
+    """
+    Stop once the current turn has ended.
+
+    """
+
+    turns = game.turn.turns
+    return lambda : game.turn.turns != turns
+
+
+@stop("stack")
+def stack(game, player):
+    """
+    Stop once something new is put on the stack.
+
+    """
+
+    before = list(game.stack)
+    return lambda : any(item not in before for item in game.stack)
+
+
+@stop("my main phase")
+def my_main_phase(game, player):
+    """
+    Stop at the player's next main phase.
+
+    """
+
+    started = game.turn.turns, game.turn.phase
+
+    def reached():
+        turn = game.turn
+        return (
+            turn.active_player is player and
+            turn.phase in {phases.first_main, phases.second_main} and
+            (turn.turns, turn.phase) != started
+        )
+    return reached
+
+
+@stop("opponent casts")
+def opponent_casts(game, player):
+    """
+    Stop once an opponent puts a spell on the stack.
+
+    """
+
+    before = list(game.stack)
+
+    def reached():
+        opponents = player.opponents
+        return any(
+            _controller(item) in opponents
+            for item in game.stack if item not in before
+        )
+    return reached
+
+
+def _controller(item):
+    card = getattr(item, "card", None) or item
+    return getattr(card, "controller", None)
+
+
+class PassUntil(object):
+    """
+    A standing instruction to pass priority until any of the given stops is
+    reached.
+
+    """
+
+    def __init__(self, game, player, stops):
+        super(PassUntil, self).__init__()
+
+        unknown = set(stops) - set(STOPS)
+        if unknown:
+            raise ValueError("Unknown stops: {}".format(sorted(unknown)))
+
+        self.stops = list(stops)
+        self._checks = [STOPS[name](game, player) for name in self.stops]
+
+    def __repr__(self):
+        return "<Pass Until: {}>".format(", ".join(self.stops))
+
+    @property
+    def reached(self):
+        """
+        Whether any of the stops has been reached.
+
+        """
+
+        return any(check() for check in self._checks)
@@ -0,0 +1,273 @@
+"""
+Keeps track of the games being played on a server.
+
+Each game registered is given a stable :class:`Handle` by its game ID, which
+follows it through its states:
+
+    * open: waiting for players to join
+    * running: started, and being played
+    * ended: over, but still kept around in full (e.g. to be looked over)
+    * archived: released, with only its summary left behind
+
+Games that have ended are released once they've been ended for longer than
+the registry's retention period (see :meth:`GameRegistry.reclaim`), at which
+point their summary is passed to the registry's archiver, if any, to be
+persisted. Only a limited number of archived summaries is kept, so that the
+memory used by a long-running server stays flat.
+
+"""
+
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from itertools import count
+import time
+
+from cardboard import events, exceptions
+
+
+__all__ = ["GameRegistry", "Handle", "STATES"]
+
+
+STATES = ("open", "running", "ended", "archived")
+
+
+class Handle(object):
+    """
+    A registered game.
+
+    """
+
+    __slots__ = [
+        "deltas", "ended_at", "game", "gameID", "players", "spectators",
+        "state",
+    ]
+
+    def __init__(self, gameID, game):
+        self.gameID = gameID
+        self.game = game
+
+        #: (auth, player) pairs, indexed by player ID
+        self.players = []
+
+        #: the game's :class:`~cardboard.deltas.StateDeltas`, if any
+        self.deltas = None
+
+        #: the game's :class:`~cardboard.spectators.Spectators`, if any
+        self.spectators = None
+
+        self.state = "open"
+        self.ended_at = None
+
+    def __repr__(self):
+        return "<Game {0.gameID} ({0.state})>".format(self)
+
+
+class GameRegistry(object):
+    """
+    The games registered on a server, keyed by game ID.
+
+    Arguments
+    ---------
+
+    * retention: how long (in seconds) to keep games after they've ended
+    * archive: a function called with the summary of each game as it is
+               released (e.g. to persist it)
+    * keep: how many summaries of archived games to keep
+    * clock: a function returning the current time in seconds
+    * ids: an iterator of the IDs to give to new games (so that e.g. each of
+           a number of registries can be given distinct IDs)
+
+    """
+
+    def __init__(
+        self,
+        retention=300, archive=None, keep=1000, clock=time.time, ids=None,
+    ):
+        super(GameRegistry, self).__init__()
+
+        if ids is None:
+            ids = count()
+
+        self.retention = retention
+        self.archive = archive
+        self.keep = keep
+        self.clock = clock
+
+        self._handles = {}
+        self._archived = deque()
+        self._ended = OrderedDict()
+        self._ids = ids
+
+        # gameID -> summary, in the order that they last changed
+        self.summaries = OrderedDict()
+        self.version = 0
+
+        # (version, gameID) for each change, in version order (superseded
+        # changes are skipped, and compacted away once they pile up)
+        self._changes = []
+
+    def __repr__(self):
+        return "<Game Registry: {} games>".format(len(self))
+
+    def __contains__(self, gameID):
+        return gameID in self._handles
+
+    def __getitem__(self, gameID):
+        handle = self._handles.get(gameID)
+        if handle is None:
+            raise exceptions.NoSuchObject(self, "game", gameID)
+        return handle
+
+    def __iter__(self):
+        return iter(self._handles)
+
+    def __len__(self):
+        return len(self._handles)
+
+    def changed_since(self, version):
+        """
+        Iterate over the summaries of the games that changed after the given
+        version, in the order that they last changed.
+
+        Finding where to start is a binary search, so that a page of
+        summaries costs only as much as the summaries on it.
+
+        """
+
+        changes = self._changes
+        start = bisect_left(changes, (version + 1,))
+        for index in xrange(start, len(changes)):
+            changed, gameID = changes[index]
+            summary = self.summaries.get(gameID)
+            if summary is not None and summary["version"] == changed:
+                yield summary
+
+    def game(self, gameID):
+        """
+        Get a game that hasn't been archived.
+
+        Archived games no longer exist as far as their players are
+        concerned, so are looked up as though they were never registered.
+
+        """
+
+        handle = self[gameID]
+        if handle.game is None:
+            raise exceptions.NoSuchObject(self, "game", gameID)
+        return handle.game
+
+    def player(self, gameID, playerID):
+        """
+        Get the (auth, player) pair of a player in a game that hasn't been
+        archived.
+
+        """
+
+        self.game(gameID)
+        handle = self[gameID]
+        if not 0 <= playerID < len(handle.players):
+            raise exceptions.NoSuchObject(handle, "player", playerID)
+        return handle.players[playerID]
+
+    def register(self, game):
+        """
+        Register a new game, returning its handle.
+
+        """
+
+        handle = Handle(next(self._ids), game)
+        self._handles[handle.gameID] = handle
+
+        game.events.subscribe(
+            lambda handler : self._change(handle, "running"),
+            event=events.GAME_BEGAN,
+        )
+        game.events.subscribe(
+            lambda handler : self._change(handle, "ended"),
+            event=events.GAME_ENDED,
+        )
+
+        self._summarize(handle)
+        return handle
+
+    def join(self, gameID, auth, player):
+        """
+        Record a player who joined a game, returning their player ID.
+
+        """
+
+        handle = self[gameID]
+        handle.players.append((auth, player))
+        self._summarize(handle)
+        return len(handle.players) - 1
+
+    def reclaim(self):
+        """
+        Release every game whose retention period has passed.
+
+        """
+
+        cutoff = self.clock() - self.retention
+        while self._ended:
+            gameID, handle = next(self._ended.iteritems())
+            if handle.ended_at > cutoff:
+                break
+            self.release(gameID)
+
+    def release(self, gameID):
+        """
+        Archive an ended game, releasing the game, its players and its
+        spectators.
+
+        """
+
+        handle = self[gameID]
+        if handle.state != "ended":
+            raise exceptions.InvalidAction(
+                "Only ended games can be archived ({!r} is {}).".format(
+                    handle, handle.state,
+                )
+            )
+
+        self._ended.pop(gameID, None)
+        self._change(handle, "archived")
+
+        handle.game.events.clear()
+        handle.game, handle.players = None, []
+        handle.deltas = handle.spectators = None
+
+        if self.archive is not None:
+            self.archive(dict(self.summaries[gameID]))
+
+        self._archived.append(gameID)
+        while len(self._archived) > self.keep:
+            forgotten = self._archived.popleft()
+            del self._handles[forgotten]
+            del self.summaries[forgotten]
+
+    def _change(self, handle, state):
+        handle.state = state
+        if state == "ended":
+            handle.ended_at = self.clock()
+            self._ended[handle.gameID] = handle
+        self._summarize(handle)
+
+    def _summarize(self, handle):
+        """
+        Update the cached summary of a game.
+
+        """
+
+        self.version += 1
+        self.summaries.pop(handle.gameID, None)
+        self.summaries[handle.gameID] = {
+            "gameID" : handle.gameID, "state" : handle.state,
+            "players" : len(handle.players), "version" : self.version,
+        }
+
+        self._changes.append((self.version, handle.gameID))
+        if len(self._changes) > 2 * len(self.summaries) + 16:
+            self._changes = [
+                (summary["version"], gameID)
+                for gameID, summary in self.summaries.iteritems()
+            ]
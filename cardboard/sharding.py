@@ -0,0 +1,496 @@
+"""
+Spreads the games played on a server across a number of worker processes.
+
+Each worker is an ordinary engine (an :class:`~cardboard.api.APIController`
+behind the engine protocol), listening only locally, and owning the games
+whose IDs it hands out: worker ``i`` of ``n`` gives out the IDs ``i``,
+``i + n``, ``i + 2n``, and so on (see :func:`registry_for`), so the worker
+owning any game is just its ID modulo the number of workers.
+
+Clients connect to a router instead, which speaks the same protocol. It
+forwards each call to the worker owning the game it names, opening one
+connection to each worker per client connection so that the notifications
+the worker pushes over it can be relayed back as they are. New games are
+created on each worker in turn, and game listings are gathered from all of
+them.
+
+Calls that a worker makes to the client (e.g. asking its user to select
+something) are relayed to it under a request ID of the router's own, since
+each worker numbers its calls separately, and the client's answer is sent
+back to the worker that made the call under the worker's ID.
+
+If the router can't reach a worker, or loses its connection to one, the
+calls still waiting on that worker are answered with server errors, and the
+next call routed to it connects again.
+
+"""
+
+from collections import OrderedDict, defaultdict
+from itertools import count
+import json
+import os
+import sys
+
+from twisted.application import service
+from twisted.internet import protocol, reactor
+from twisted.internet.endpoints import TCP4ClientEndpoint
+from twisted.protocols import basic
+from twisted.python import log
+
+from cardboard import api, encoding, registry
+
+
+__all__ = [
+    "RouterFactory", "RouterProtocol", "WorkerProcesses",
+    "registry_for", "shard_of",
+]
+
+
+def shard_of(gameID, shards):
+    """
+    The worker that owns a game.
+
+    """
+
+    return gameID % shards
+
+
+def registry_for(shard, shards, **kwargs):
+    """
+    Create a registry for a worker, which only gives out the IDs it owns.
+
+    """
+
+    return registry.GameRegistry(ids=count(shard, shards), **kwargs)
+
+
+class _Reply(object):
+    """
+    The responses to a request (or batch) from a client, as they come in.
+
+    """
+
+    def __init__(self, send, single):
+        self.send = send
+        self.single = single
+
+        self.responses = []
+        self.outstanding = 0
+        self.ready = False
+
+    def slot(self):
+        """
+        Reserve a place for a response, returning a function that fills it.
+
+        """
+
+        position = len(self.responses)
+        self.responses.append(None)
+        self.outstanding += 1
+
+        def fill(response):
+            self.responses[position] = response
+            self.outstanding -= 1
+            self.finish()
+        return fill
+
+    def finish(self):
+        if not self.ready or self.outstanding or not self.responses:
+            return
+        elif self.single:
+            self.send(self.responses[0])
+        else:
+            self.send(self.responses)
+
+
+def _disconnect(worker):
+    if worker is not None:
+        worker.transport.loseConnection()
+
+
+class ShardConnection(basic.NetstringReceiver):
+    """
+    A router's connection to a worker, on behalf of one client.
+
+    """
+
+    def __init__(self, router, shard):
+        self.router = router
+        self.shard = shard
+
+    def stringReceived(self, string):
+        self.router.workerReceived(self.shard, string)
+
+    def connectionLost(self, reason):
+        self.router.workerLost(self.shard, "Lost the connection to a worker.")
+        basic.NetstringReceiver.connectionLost(self, reason)
+
+
+class RouterProtocol(api.EngineProtocol):
+    """
+    A client's connection to the router.
+
+    """
+
+    def connectionMade(self):
+        api.EngineProtocol.connectionMade(self)
+
+        self._workers = {}
+        self._expected = defaultdict(list)
+
+        # the router's request ID -> (shard, the worker's request ID) for
+        # each of the workers' calls that the client hasn't answered yet
+        self._relayed = {}
+
+    def connectionLost(self, reason):
+        self._expected.clear()
+        self._relayed.clear()
+        for connecting in list(self._workers.itervalues()):
+            connecting.addCallback(_disconnect)
+        api.EngineProtocol.connectionLost(self, reason)
+
+    def stringReceived(self, string):
+        if self._negotiable:
+            self._negotiable = False
+            if self.negotiate(string):
+                return
+
+        try:
+            request = self.encoding.loads(string)
+        except Exception:
+            self.respond(
+                api.error_response(None, api.PARSE_ERROR, "Parse error."),
+            )
+            return
+
+        if isinstance(request, list):
+            if not request:
+                empty = "Empty batch."
+                self.respond(
+                    api.error_response(None, api.INVALID_REQUEST, empty),
+                )
+                return
+            self.route(request, single=False)
+        else:
+            self.route([request], single=True)
+
+    def respond(self, response):
+        self.sendString(self.encoding.dumps(response))
+
+    def route(self, requests, single):
+        """
+        Forward requests to the workers that should handle them.
+
+        """
+
+        reply = _Reply(self.respond, single)
+        forwarded = defaultdict(list)
+
+        for request in requests:
+            if api._is_response(request):
+                self._answer_worker(request)
+                continue
+            elif not isinstance(request, dict) or "method" not in request:
+                invalid = "Invalid request."
+                reply.slot()(
+                    api.error_response(None, api.INVALID_REQUEST, invalid),
+                )
+                continue
+
+            fill = reply.slot() if "id" in request else None
+            if request["method"] == "Game.list":
+                self._list(request, fill, forwarded)
+            else:
+                forwarded[self._shard(request)].append((request, fill))
+
+        for shard, members in forwarded.iteritems():
+            self._forward(shard, members)
+
+        reply.ready = True
+        reply.finish()
+
+    def workerReceived(self, shard, string):
+        """
+        A worker sent a response, a call to the client, or notifications.
+
+        """
+
+        message = json.loads(string)
+        if isinstance(message, dict) and "method" in message:
+            self._relay_call(shard, message)
+            return
+        elif isinstance(message, list) and message and "method" in message[0]:
+            if self.encoding is encoding.JSON:
+                self.sendString(string)
+            else:
+                self.sendString(self.encoding.dumps(message))
+            return
+
+        expected = self._expected[shard]
+        if not expected:
+            return
+
+        if not isinstance(message, list):
+            message = [message]
+        for (_, fill), response in zip(expected.pop(0), message):
+            fill(response)
+
+    def workerLost(self, shard, reason):
+        """
+        A worker couldn't be reached, or its connection dropped.
+
+        Each call still waiting on it is answered with a server error.
+
+        """
+
+        self._workers.pop(shard, None)
+        for expecting in self._expected.pop(shard, ()):
+            for id, fill in expecting:
+                fill(api.error_response(id, api.SERVER_ERROR, reason))
+
+        for id, (calling, _) in self._relayed.items():
+            if calling == shard:
+                del self._relayed[id]
+
+    def _relay_call(self, shard, call):
+        """
+        Relay a call that a worker made to the client.
+
+        """
+
+        if "id" in call:
+            id = next(self._call_ids)
+            self._relayed[id] = shard, call["id"]
+            call = dict(call, id=id)
+        self.respond(call)
+
+    def _answer_worker(self, response):
+        """
+        Send the client's answer to a call back to the worker that made it.
+
+        """
+
+        id = response.get("id")
+        relayed = self._relayed.pop(id, None) if isinstance(id, int) else None
+        if relayed is None:
+            log.msg("Ignoring a response to no call: {!r}".format(response))
+            return
+
+        shard, workerID = relayed
+        self._send(shard, json.dumps(dict(response, id=workerID)))
+
+    def _shard(self, request):
+        params = request.get("params")
+        if isinstance(params, dict) and isinstance(params.get("gameID"), int):
+            return shard_of(params["gameID"], self.factory.shards)
+        elif request["method"] == "Game.create":
+            return self.factory.next_shard()
+        return 0
+
+    def _forward(self, shard, members):
+        requests = [request for request, _ in members]
+        expecting = [
+            (request.get("id"), fill)
+            for request, fill in members if fill is not None
+        ]
+        if expecting:
+            self._expected[shard].append(expecting)
+
+        self._send(shard, json.dumps(requests))
+
+    def _send(self, shard, data):
+        def send(worker):
+            if worker is not None:
+                worker.sendString(data)
+            return worker
+        self._connect(shard).addCallback(send)
+
+    def _connect(self, shard):
+        connecting = self._workers.get(shard)
+        if connecting is None:
+            connecting = self._workers[shard] = self.factory.connect(
+                self, shard,
+            )
+            connecting.addErrback(self._unreachable, shard)
+        return connecting
+
+    def _unreachable(self, failure, shard):
+        log.err(failure, "Couldn't connect to worker {}.".format(shard))
+        self.workerLost(shard, "Couldn't reach a worker.")
+
+    def _list(self, request, fill, forwarded):
+        """
+        Ask every worker for its part of a game listing.
+
+        The cursor that a client is given is the router's own, standing for
+        the cursor of each of the workers.
+
+        """
+
+        params = dict(request.get("params") or {})
+        cursors = self.factory.cursor(params.pop("since", 0))
+        limit = params.get("limit", 50)
+
+        listings = [None] * self.factory.shards
+        remaining = [self.factory.shards]
+
+        def listed(shard):
+            def _listed(response):
+                listings[shard] = response
+                remaining[0] -= 1
+                if not remaining[0] and fill is not None:
+                    fill(self._merge(request["id"], listings, cursors, limit))
+            return _listed
+
+        for shard, since in enumerate(cursors):
+            forwarded[shard].append((
+                dict(request, id=request.get("id"), params=dict(
+                    params, since=since,
+                )),
+                listed(shard),
+            ))
+
+    def _merge(self, id, listings, since, limit):
+        """
+        Merge each worker's listing, up to the limit.
+
+        """
+
+        for listing in listings:
+            if "error" in listing:
+                return dict(listing, id=id)
+
+        games, cursors, more = [], [], False
+        for listing, cursor in zip(listings, since):
+            result = listing["result"]
+            taken = result["games"][:max(limit - len(games), 0)]
+            games.extend(taken)
+
+            if len(taken) < len(result["games"]):
+                if taken:
+                    cursor = taken[-1]["version"]
+                more = True
+            else:
+                cursor = result["version"]
+                more = more or result["more"]
+            cursors.append(cursor)
+
+        result = {
+            "games" : games, "more" : more,
+            "version" : self.factory.remember(cursors),
+        }
+        return {"jsonrpc" : "2.0", "id" : id, "result" : result}
+
+
+class RouterFactory(api.EngineFactory):
+    """
+    Routes the engine protocol to the workers listening at the given ports.
+
+    """
+
+    protocol = RouterProtocol
+
+    #: how many listing cursors to remember
+    cursors = 1000
+
+    def __init__(self, ports, host="127.0.0.1", reactor=reactor):
+        api.EngineFactory.__init__(self, None)
+
+        self.ports = ports
+        self.host = host
+        self.reactor = reactor
+
+        self.shards = len(ports)
+        self._creating = count()
+        self._cursors = OrderedDict()
+        self._cursor_ids = count(1)
+
+    def connect(self, router, shard):
+        """
+        Connect to a worker on behalf of a client.
+
+        """
+
+        endpoint = TCP4ClientEndpoint(
+            self.reactor, self.host, self.ports[shard],
+        )
+        factory = protocol.Factory()
+        factory.protocol = lambda : ShardConnection(router, shard)
+        return endpoint.connect(factory)
+
+    def next_shard(self):
+        """
+        The worker to create the next game on.
+
+        """
+
+        return next(self._creating) % self.shards
+
+    def cursor(self, since):
+        """
+        The cursor of each worker that a listing cursor stands for.
+
+        Unknown (e.g. forgotten) cursors start the listing over.
+
+        """
+
+        return self._cursors.get(since, (0,) * self.shards)
+
+    def remember(self, cursors):
+        """
+        Give a listing cursor to the given cursors of each worker.
+
+        """
+
+        cursorID = next(self._cursor_ids)
+        self._cursors[cursorID] = tuple(cursors)
+        while len(self._cursors) > self.cursors:
+            self._cursors.popitem(last=False)
+        return cursorID
+
+
+class WorkerProcesses(service.Service):
+    """
+    Runs the workers, each as a separate twistd process.
+
+    Each worker runs the given tac file, with the ``CARDBOARD_SHARD``,
+    ``CARDBOARD_SHARDS`` and ``CARDBOARD_PORT`` environment variables telling
+    it which worker it is and where to listen.
+
+    """
+
+    def __init__(self, tac, ports, reactor=reactor):
+        self.tac = tac
+        self.ports = ports
+        self.reactor = reactor
+
+        self.processes = []
+
+    def startService(self):
+        service.Service.startService(self)
+
+        for shard, port in enumerate(self.ports):
+            env = dict(
+                os.environ,
+                CARDBOARD_SHARD=str(shard),
+                CARDBOARD_SHARDS=str(len(self.ports)),
+                CARDBOARD_PORT=str(port),
+            )
+            args = [
+                sys.executable, "-c",
+                "from twisted.scripts.twistd import run; run()",
+                "--nodaemon", "--pidfile=", "--python", self.tac,
+            ]
+            self.processes.append(
+                self.reactor.spawnProcess(
+                    protocol.ProcessProtocol(), sys.executable, args, env=env,
+                )
+            )
+
+    def stopService(self):
+        service.Service.stopService(self)
+
+        processes, self.processes = self.processes, []
+        for process in processes:
+            if process.pid is not None:
+                process.signalProcess("TERM")
@@ -0,0 +1,149 @@
+"""
+Broadcasts the public state deltas of a game to the connections watching it.
+
+Unlike players, every spectator of a game sees exactly the same thing (only
+what's public), so each delta is redacted just once, by the game's
+:class:`~cardboard.deltas.StateDeltas`, and the notifications pushed during a
+reactor tick are encoded just once (per encoding in use) into a single frame
+that's written as is to each spectator's transport.
+
+Spectators whose connections can't keep up (whose transports have paused
+them) are skipped, so that nothing is buffered for them. Once a skipped
+spectator can be written to again, it's sent a fresh snapshot of the public
+state of the game in place of the deltas it missed. A spectator that misses
+more than :attr:`Spectators.lag` frames in a row is disconnected.
+
+"""
+
+from twisted.internet import reactor
+
+from cardboard import deltas
+
+
+__all__ = ["Spectators", "netstring"]
+
+
+def netstring(string):
+    """
+    Frame a string as a netstring (as the engine port does).
+
+    """
+
+    return "{}:{},".format(len(string), string)
+
+
+class Spectators(object):
+    """
+    The connections watching a game.
+
+    Arguments
+    ---------
+
+    * clock: an :class:`~twisted.internet.interfaces.IReactorTime` provider
+    * lag: how many frames in a row a spectator may miss before it's dropped
+    * snapshot: a function returning a snapshot of the public state of the
+                game (see :meth:`cardboard.deltas.StateDeltas.snapshot`), to
+                resync skipped spectators with
+
+    """
+
+    def __init__(self, clock=reactor, lag=50, snapshot=None):
+        super(Spectators, self).__init__()
+
+        self.clock = clock
+        self.lag = lag
+        self.snapshot = snapshot
+
+        # connection -> how many frames in a row it's missed
+        self.connections = {}
+        self.pending = []
+        self._call = None
+
+    def __contains__(self, connection):
+        return connection in self.connections
+
+    def __iter__(self):
+        return iter(self.connections)
+
+    def __len__(self):
+        return len(self.connections)
+
+    def __repr__(self):
+        return "<Spectators: {} watching>".format(len(self))
+
+    def add(self, connection):
+        """
+        Start broadcasting to a connection.
+
+        """
+
+        self.connections.setdefault(connection, 0)
+
+    def remove(self, connection):
+        """
+        Stop broadcasting to a connection.
+
+        """
+
+        self.connections.pop(connection, None)
+
+    def push(self, delta):
+        """
+        Queue a (public) delta, broadcasting it at the end of the current tick.
+
+        """
+
+        if not self.connections:
+            return
+
+        self.pending.append(delta)
+        if self._call is None:
+            self._call = self.clock.callLater(0, self.flush)
+
+    def flush(self):
+        """
+        Broadcast all of the queued deltas now.
+
+        """
+
+        if self._call is not None and self._call.active():
+            self._call.cancel()
+        self._call = None
+
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+
+        frame = [_notification(delta) for delta in deltas.coalesce(pending)]
+        resync = None
+
+        encoded, resynced = {}, {}
+        for connection, missed in self.connections.items():
+            if connection.paused:
+                if missed >= self.lag:
+                    self.remove(connection)
+                    connection.transport.loseConnection()
+                else:
+                    self.connections[connection] = missed + 1
+                continue
+
+            self.connections[connection] = 0
+
+            if missed and self.snapshot is not None:
+                if resync is None:
+                    resync = [_notification(self.snapshot())]
+                data = _encoded(resync, connection.encoding, resynced)
+            else:
+                data = _encoded(frame, connection.encoding, encoded)
+            connection.transport.write(data)
+
+
+def _notification(delta):
+    return {"jsonrpc" : "2.0", "method" : "stateChanged", "params" : delta}
+
+
+def _encoded(frame, encoding, cache):
+    data = cache.get(encoding)
+    if data is None:
+        data = cache[encoding] = netstring(encoding.dumps(frame))
+    return data
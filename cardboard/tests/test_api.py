@@ -1,133 +1,146 @@
+import json
+
+from twisted.internet import defer, error, task
+from twisted.python import failure
 from twisted.trial import unittest
 import jsonschema
 import mock
 
-from cardboard import api
+from cardboard import (
+    api, core, encoding, events, exceptions, phases, timing, types,
+)
+from cardboard import card as c
 
 
 class TestUser(unittest.TestCase):
+    def setUp(self):
+        self.cards = [u"a", u"b", u"c"]
+        self.players = [u"alice", u"bob"]
 
-    skip = True
+        self.user = api.User()
+        self.user.game = mock.Mock(players=self.players)
+        self.user.card_id = {card : i for i, card in enumerate(self.cards)}.get
+        self.user.player_id = {u"alice" : 0, u"bob" : 1}.get
+        self.user.protocol = mock.Mock()
+
+    def reply(self, result):
+        self.user.protocol.callRemote.side_effect = (
+            lambda *args, **kwargs : defer.succeed(result)
+        )
 
     def test_select(self):
-        self.user.select([u"foo", u"bar", u"baz"])
+        card = mock.Mock(spec=c.Card)
+        card.name = u"Island"
+        self.user.card_id = {card : 3}.get
 
-        self.protocol.callRemote.assert_called_with(
-            communicate.Select,
-            choices=[u"foo", u"bar", u"baz"],
-            how_many=1,
-            duplicates=False,
-        )
+        player = mock.Mock(spec=core.Player)
+        self.user.player_id = {player : 1}.get
 
-        self.user.select([u"foo"], how_many=2, duplicates=True)
+        self.reply([2, 0])
+        selecting = self.user.select([card, player, u"Foo"], how_many=2)
 
-        self.protocol.callRemote.assert_called_with(
-            communicate.Select,
-            choices=[u"foo"],
+        self.user.protocol.callRemote.assert_called_once_with(
+            api.Select,
+            choices=[
+                {"card" : 3, "name" : u"Island"}, {"player" : 1},
+                {"name" : u"Foo"},
+            ],
             how_many=2,
-            duplicates=True,
+            duplicates=False,
         )
+        self.assertEqual(self.successResultOf(selecting), [u"Foo", card])
+
+    def test_select_not_offered(self):
+        self.reply([3])
+        selecting = self.user.select([u"foo", u"bar", u"baz"])
+        self.failureResultOf(selecting, exceptions.BadSelection)
 
     def test_select_cards(self):
-        # Instead of a real zone, let's just match a list
-        self.user.select_cards([1, 2, 3, 4])
+        self.reply([2])
+        selecting = self.user.select_cards(
+            self.cards, match=lambda card : card != u"b",
+        )
 
-        self.protocol.callRemote.assert_called_with(
-            communicate.SelectCards,
-            cards=[1, 2, 3, 4],
+        self.user.protocol.callRemote.assert_called_once_with(
+            api.SelectCards,
+            cards=[0, 2],
             how_many=1,
             duplicates=False,
             bad=True,
         )
+        self.assertEqual(self.successResultOf(selecting), [u"c"])
 
-        # match should be evaluated immediately,
-        # since we can't serialize the match function
-        self.user.select_cards(
-            [1, 2, 3, 4], match=lambda x : x % 2,
-            how_many=3, duplicates=True, bad=False
+    def test_select_cards_not_offered(self):
+        self.reply([1])
+        selecting = self.user.select_cards(
+            self.cards, match=lambda card : card != u"b",
         )
+        self.failureResultOf(selecting, exceptions.BadSelection)
 
-        self.protocol.callRemote.assert_called_with(
-            communicate.SelectCards,
-            cards=[1, 3],
-            how_many=3,
-            duplicates=True,
-            bad=False,
-        )
+    def test_select_cards_not_ids(self):
+        self.reply(12)
+        selecting = self.user.select_cards(self.cards)
+        self.failureResultOf(selecting, exceptions.BadSelection)
 
-    def test_select_players(self):
-        self.user.game.players = [1, 2, 3, 4]
+    def test_select_cards_too_many(self):
+        self.reply([0, 1])
+        selecting = self.user.select_cards(self.cards)
+        self.failureResultOf(selecting, exceptions.BadSelection)
 
-        self.user.select_players()
+    def test_select_cards_duplicates(self):
+        self.reply([0, 0])
+        selecting = self.user.select_cards(self.cards, how_many=2)
+        self.failureResultOf(selecting, exceptions.BadSelection)
 
-        self.protocol.callRemote.assert_called_with(
-            communicate.SelectPlayers,
-            players=[1, 2, 3, 4],
-            how_many=1,
-            duplicates=False,
-            bad=True,
+        selecting = self.user.select_cards(
+            self.cards, how_many=2, duplicates=True,
         )
+        self.assertEqual(self.successResultOf(selecting), [u"a", u"a"])
 
-        self.user.select_players(
-            match=lambda x : x % 2, how_many=4, duplicates=True, bad=False,
-        )
+    def test_select_players(self):
+        self.reply([1])
+        selecting = self.user.select_players(how_many=None)
 
-        self.protocol.callRemote.assert_called_with(
-            communicate.SelectPlayers,
-            players=[1, 3],
-            how_many=4,
-            duplicates=True,
-            bad=False,
+        self.user.protocol.callRemote.assert_called_once_with(
+            api.SelectPlayers,
+            players=[0, 1],
+            how_many=None,
+            duplicates=False,
+            bad=True,
         )
+        self.assertEqual(self.successResultOf(selecting), [u"bob"])
 
     def test_select_combined(self):
-        self.user.game.players = [1, 2, 3, 4]
-
-        self.user.select_combined(zone=[2, 4, 6, 8])
+        self.reply({"cards" : [0, 2], "players" : [0]})
+        selecting = self.user.select_combined(
+            zone=self.cards, how_many_cards=2,
+            match_players=lambda player : player == u"alice",
+        )
 
-        self.protocol.callRemote.assert_called_with(
-            communicate.SelectCombined,
-            cards=[2, 4, 6, 8],
-            players=[1, 2, 3, 4],
-            how_many_cards=1,
+        self.user.protocol.callRemote.assert_called_once_with(
+            api.SelectCombined,
+            cards=[0, 1, 2],
+            players=[0],
+            how_many_cards=2,
             how_many_players=1,
             duplicate_cards=False,
             duplicate_players=False,
             bad=True,
         )
-
-        self.user.select_combined(
-            zone=[2, 4, 6, 8], bad=False, how_many_cards=2, how_many_players=4,
-            match_cards=lambda x : x > 4, match_players=lambda x : x % 2,
-            duplicate_cards=True, duplicate_players=True,
+        self.assertEqual(
+            self.successResultOf(selecting), ([u"a", u"c"], [u"alice"]),
         )
 
-        self.protocol.callRemote.assert_called_with(
-            communicate.SelectCombined,
-            cards=[6, 8],
-            players=[1, 3],
-            how_many_cards=2,
-            how_many_players=4,
-            duplicate_cards=True,
-            duplicate_players=True,
-            bad=False,
-        )
+    def test_select_combined_incomplete(self):
+        self.reply({"cards" : [0]})
+        selecting = self.user.select_combined(zone=self.cards)
+        self.failureResultOf(selecting, exceptions.BadSelection)
 
     def test_select_range(self):
-        self.user.select_range(2, 24)
-
-        self.protocol.callRemote.assert_called_with(
-            communicate.SelectRange,
-            start=2,
-            stop=24,
-            how_many=1,
-            duplicates=False,
-        )
-
         self.user.select_range(2, 4, how_many=3, duplicates=True)
 
-        self.protocol.callRemote.assert_called_with(
-            communicate.SelectRange,
+        self.user.protocol.callRemote.assert_called_once_with(
+            api.SelectRange,
             start=2,
             stop=4,
             how_many=3,
@@ -135,6 +148,94 @@ class TestUser(unittest.TestCase):
         )
 
 
+class TestSelectBlocks(unittest.TestCase):
+    def setUp(self):
+        self.blocker, self.attacker, self.other = "blocks", "attacks", "other"
+        ids = {self.blocker : 0, self.attacker : 1, self.other : 2}
+
+        self.user = api.User()
+        self.user.card_id = ids.get
+        self.user.protocol = mock.Mock()
+        self.legal = {self.blocker : frozenset([self.attacker, self.other])}
+
+    def test_select_blocks(self):
+        self.user.protocol.callRemote.return_value = defer.succeed(
+            {u"0" : 2},
+        )
+
+        selecting = self.user.select_blocks(self.legal)
+
+        self.user.protocol.callRemote.assert_called_once_with(
+            api.SelectBlocks, legal={0 : [1, 2]},
+        )
+        self.assertEqual(
+            self.successResultOf(selecting), {self.blocker : self.other},
+        )
+
+    def test_unknown_card(self):
+        self.user.protocol.callRemote.return_value = defer.succeed({0 : 7})
+        selecting = self.user.select_blocks(self.legal)
+        self.failureResultOf(selecting, exceptions.BadSelection)
+
+
+class TestExposed(unittest.TestCase):
+    def setUp(self):
+        self.controller = mock.Mock(timings=timing.MethodTimings())
+        self.validator = mock.Mock()
+
+    def expose(self, request_schema):
+        def api_Thing_do(controller, **request):
+            """
+            Do a thing.
+
+            """
+
+            return request
+
+        return api.exposed(
+            request_schema, {}, validator=self.validator,
+        )(api_Thing_do)
+
+    def test_validator_compiled_once(self):
+        schema = {"type" : "object"}
+        fn = self.expose(schema)
+
+        self.validator.check_schema.assert_called_once_with(schema)
+        self.validator.assert_called_once_with(schema)
+
+        fn(self.controller, foo=1)
+        fn(self.controller, foo=2)
+
+        self.assertEqual(self.validator.call_count, 1)
+        self.validator.return_value.validate.assert_called_with({"foo" : 2})
+
+    def test_empty_schema_not_validated(self):
+        fn = self.expose({})
+        self.assertEqual(fn(self.controller, foo=1), {"foo" : 1})
+
+        self.assertFalse(self.validator.called)
+        self.assertFalse(self.validator.check_schema.called)
+
+    def test_invalid_schema(self):
+        with self.assertRaises(jsonschema.SchemaError):
+            api.exposed({"type" : 12}, {})
+
+    def test_timed(self):
+        fn = self.expose({"type" : "object"})
+        fn(self.controller)
+        fn(self.controller)
+
+        self.assertEqual(self.controller.timings["Thing.do"].count, 2)
+
+    def test_timed_on_error(self):
+        fn = self.expose({"type" : "object"})
+        self.validator.return_value.validate.side_effect = ValueError
+
+        with self.assertRaises(ValueError):
+            fn(self.controller)
+        self.assertEqual(self.controller.timings["Thing.do"].count, 1)
+
+
 class TestAPIController(unittest.TestCase):
     def setUp(self):
         self.api = api.APIController()
@@ -160,15 +261,26 @@ class TestAPIController(unittest.TestCase):
         self.assertEqual(response, {"gameID" : 1})
         self.assertEqual(len(self.api.games), 2)
 
-        game = self.api.games[0]
+        game = self.api.games.game(0)
 
         response = self.call(info, gameID=0)
-        expected = {"gameID" : 0, "teams" : game.teams, "started" : False}
+        expected = {
+            "gameID" : 0, "teams" : game.teams, "started" : False,
+            "version" : 0,
+        }
         self.assertEqual(response, expected)
 
         response = self.call(lst)
-        expected = [info(gameID=0), info(gameID=1)]
-        self.assertEqual(response, expected)
+        expected = [
+            {"gameID" : 0, "state" : "open", "players" : 0, "version" : 1},
+            {"gameID" : 1, "state" : "open", "players" : 0, "version" : 2},
+        ]
+        self.assertEqual(
+            response, {"games" : expected, "more" : False, "version" : 2},
+        )
+
+        # listing games doesn't go through Game.info
+        self.assertEqual(self.api.timings["Game.info"].count, 1)
 
         response = self.call(join, gameID=0, name="Foo")
         auth = response.pop("auth")
@@ -176,11 +288,129 @@ class TestAPIController(unittest.TestCase):
 
         response = self.call(start, gameID=0)
         self.assertEqual(response, {})
-        self.assertTrue(self.api.games[0].started)
+        self.assertTrue(self.api.games.game(0).started)
 
         response = self.call(end, gameID=0)
         self.assertEqual(response, {})
-        self.assertTrue(self.api.games[0].ended)
+        self.assertTrue(self.api.games.game(0).ended)
+
+    def test_Game_list(self):
+        create = self.api.lookupMethod("Game.create")
+        join = self.api.lookupMethod("Game.join")
+        lst = self.api.lookupMethod("Game.list")
+
+        for _ in range(4):
+            create()
+        join(gameID=0, name="Foo")
+        join(gameID=2, name="Bar")
+        join(gameID=2, name="Baz")
+        self.api.games.game(2).start()
+        self.api.games.game(3).end()
+
+        def listed(**kwargs):
+            response = self.call(lst, **kwargs)
+            return [game["gameID"] for game in response["games"]], response
+
+        # most recently changed last, ended games left out
+        gameIDs, response = listed()
+        self.assertEqual(gameIDs, [1, 0, 2])
+        self.assertEqual(response["version"], self.api.games.version)
+
+        gameIDs, _ = listed(states=["ended"])
+        self.assertEqual(gameIDs, [3])
+
+        gameIDs, _ = listed(states=["open", "running", "ended"], players=0)
+        self.assertEqual(gameIDs, [1, 3])
+
+        gameIDs, _ = listed(states=["running"], players=2)
+        self.assertEqual(gameIDs, [2])
+
+        self.assertRaises(
+            jsonschema.ValidationError, lst, states=["abandoned"],
+        )
+
+    def test_Game_list_pages(self):
+        create = self.api.lookupMethod("Game.create")
+        lst = self.api.lookupMethod("Game.list")
+
+        for _ in range(5):
+            create()
+
+        response = self.call(lst, limit=2)
+        self.assertTrue(response["more"])
+        self.assertEqual([g["gameID"] for g in response["games"]], [0, 1])
+
+        response = self.call(lst, limit=2, since=response["version"])
+        self.assertTrue(response["more"])
+        self.assertEqual([g["gameID"] for g in response["games"]], [2, 3])
+
+        response = self.call(lst, limit=2, since=response["version"])
+        self.assertFalse(response["more"])
+        self.assertEqual([g["gameID"] for g in response["games"]], [4])
+
+        # nothing changed since
+        since = response["version"]
+        response = self.call(lst, since=since)
+        self.assertEqual(response["games"], [])
+        self.assertEqual(response["version"], since)
+
+        # only what changed is listed
+        self.api.lookupMethod("Game.join")(gameID=1, name="Foo")
+        response = self.call(lst, since=since)
+        self.assertEqual(
+            response["games"], [
+                {
+                    "gameID" : 1, "state" : "open", "players" : 1,
+                    "version" : since + 1,
+                },
+            ],
+        )
+
+    def test_state_deltas(self):
+        gameID = self.api.lookupMethod("Game.create")()["gameID"]
+        join = self.api.lookupMethod("Game.join")
+        join(gameID=gameID, name="Foo")
+        join(gameID=gameID, name="Bar")
+
+        (_, foo), (_, bar) = self.api.games[gameID].players
+        for player in foo, bar:
+            player.user.protocol = mock.Mock()
+
+        self.api.games.game(gameID).events.trigger(events.LIFE_LOST(foo, 2))
+
+        delta = {"type" : "life", "player" : 0, "amount" : -2, "version" : 1}
+        for player in foo, bar:
+            push = player.user.protocol.notifications.push
+            push.assert_called_once_with(
+                "stateChanged", delta, snapshot=player.user.snapshot,
+            )
+
+        info = self.api.lookupMethod("Game.info")(gameID=gameID)
+        self.assertEqual(info["version"], 1)
+
+    def test_joined_connection_notified(self):
+        protocol = api.EngineFactory(self.api.lookupMethod).buildProtocol(None)
+        protocol.sendString = mock.Mock()
+        protocol.connectionMade()
+
+        gameID = self.api.lookupMethod("Game.create")()["gameID"]
+        protocol.stringReceived(json.dumps([{
+            "jsonrpc" : "2.0", "id" : 1, "method" : "Game.join",
+            "params" : {"gameID" : gameID, "name" : "Foo"},
+        }]))
+        protocol.sendString.reset_mock()
+
+        (_, foo), = self.api.games[gameID].players
+        self.api.games.game(gameID).events.trigger(events.LIFE_LOST(foo, 2))
+        protocol.notifications.flush()
+
+        sent, = protocol.sendString.call_args[0]
+        notification, = json.loads(sent)
+        self.assertEqual(notification["method"], "stateChanged")
+        self.assertEqual(
+            notification["params"],
+            {"type" : "life", "player" : 0, "amount" : -2, "version" : 1},
+        )
 
     def test_Player(self):
         gameID = self.api.lookupMethod("Game.create")()["gameID"]
@@ -208,10 +438,797 @@ class TestAPIController(unittest.TestCase):
             api.NotAuthorized,
             concede, auth="wrong", gameID=gameID, playerID=playerID
         )
-        self.assertFalse(self.api.players[0][0][1].dead)
+        self.assertFalse(self.api.games[0].players[0][1].dead)
 
         response = self.call(
             concede, auth=auth, gameID=gameID, playerID=playerID,
         )
-        self.assertTrue(self.api.players[0][0][1].dead)
+        self.assertTrue(self.api.games[0].players[0][1].dead)
+        self.assertEqual(response, {})
+
+    def test_no_such_player(self):
+        gameID = self.api.lookupMethod("Game.create")()["gameID"]
+        p = self.api.lookupMethod("Game.join")(gameID=gameID, name="Foo")
+        auth = p["auth"]
+
+        info = self.api.lookupMethod("Player.info")
+        concede = self.api.lookupMethod("concede")
+
+        for playerID in 1, -1:
+            with self.assertRaises(exceptions.NoSuchObject):
+                info(gameID=gameID, playerID=playerID)
+            with self.assertRaises(exceptions.NoSuchObject):
+                concede(auth=auth, gameID=gameID, playerID=playerID)
+
+    def test_archived(self):
+        gameID = self.api.lookupMethod("Game.create")()["gameID"]
+        p = self.api.lookupMethod("Game.join")(gameID=gameID, name="Foo")
+        auth, playerID = p["auth"], p["playerID"]
+
+        self.api.games.game(gameID).end()
+        self.api.games.release(gameID)
+
+        with self.assertRaises(exceptions.NoSuchObject):
+            self.api.lookupMethod("Player.info")(
+                gameID=gameID, playerID=playerID,
+            )
+        with self.assertRaises(exceptions.NoSuchObject):
+            self.api.lookupMethod("concede")(
+                auth=auth, gameID=gameID, playerID=playerID,
+            )
+        with self.assertRaises(exceptions.NoSuchObject):
+            self.api.lookupMethod("Game.info")(gameID=gameID)
+
+    def test_pass_until(self):
+        gameID = self.api.lookupMethod("Game.create")()["gameID"]
+        p = self.api.lookupMethod("Game.join")(gameID=gameID, name="Foo")
+        auth, playerID = p["auth"], p["playerID"]
+        player = self.api.games[gameID].players[playerID][1]
+
+        pass_until = self.api.lookupMethod("Player.passUntil")
+
+        self.assertRaises(
+            api.NotAuthorized, pass_until,
+            auth="wrong", gameID=gameID, playerID=playerID, stops=[],
+        )
+
+        self.assertRaises(
+            jsonschema.ValidationError, pass_until,
+            auth=auth, gameID=gameID, playerID=playerID, stops=["never"],
+        )
+
+        self.api.games.game(gameID).start()
+
+        stops = ["end of turn", "opponent casts"]
+        response = self.call(
+            pass_until, auth=auth, gameID=gameID, playerID=playerID,
+            stops=stops,
+        )
         self.assertEqual(response, {})
+        self.assertEqual(player.passing.stops, stops)
+
+        self.call(
+            pass_until, auth=auth, gameID=gameID, playerID=playerID, stops=[],
+        )
+        self.assertIsNone(player.passing)
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.api = api.APIController()
+
+    def run_batch(self, *batch):
+        return api.run_batch(self.api.lookupMethod, list(batch))
+
+    def test_in_order(self):
+        responses = self.run_batch(
+            {"jsonrpc" : "2.0", "id" : 1, "method" : "Game.create"},
+            {
+                "jsonrpc" : "2.0", "id" : 2, "method" : "Game.join",
+                "params" : {"gameID" : 0, "name" : "Foo"},
+            },
+            {
+                "jsonrpc" : "2.0", "id" : 3, "method" : "Player.info",
+                "params" : {"gameID" : 0, "playerID" : 0},
+            },
+        )
+
+        self.assertEqual([r["id"] for r in responses], [1, 2, 3])
+        self.assertEqual(responses[0]["result"], {"gameID" : 0})
+        self.assertEqual(responses[2]["result"]["name"], "Foo")
+
+    def test_notifications(self):
+        responses = self.run_batch(
+            {"jsonrpc" : "2.0", "method" : "Game.create"},
+            {"jsonrpc" : "2.0", "id" : 1, "method" : "Game.list"},
+        )
+        self.assertEqual(len(self.api.games), 1)
+        self.assertEqual(len(responses), 1)
+        self.assertEqual(len(responses[0]["result"]["games"]), 1)
+
+    def test_errors(self):
+        responses = self.run_batch(
+            {"jsonrpc" : "2.0", "id" : 1, "method" : "Game.explode"},
+            {
+                "jsonrpc" : "2.0", "id" : 2, "method" : "Game.info",
+                "params" : {"gameID" : "zero"},
+            },
+            {
+                "jsonrpc" : "2.0", "id" : 3, "method" : "Game.info",
+                "params" : [0],
+            },
+            {
+                "jsonrpc" : "2.0", "id" : 4, "method" : "concede",
+                "params" : {"auth" : "", "gameID" : 0, "playerID" : 0},
+            },
+            12,
+            {"jsonrpc" : "2.0", "id" : 5, "method" : "Game.create"},
+        )
+
+        codes = [r.get("error", {}).get("code") for r in responses]
+        self.assertEqual(
+            codes, [
+                api.METHOD_NOT_FOUND, api.INVALID_PARAMS, api.INVALID_PARAMS,
+                api.SERVER_ERROR, api.INVALID_REQUEST, None,
+            ],
+        )
+        self.assertEqual(responses[-1]["result"], {"gameID" : 0})
+
+    def test_empty(self):
+        response = self.run_batch()
+        self.assertEqual(response["error"]["code"], api.INVALID_REQUEST)
+
+    def test_engine_type_error(self):
+        """
+        Only a call that doesn't match a method's signature is the client's
+        fault, not a TypeError raised while running it.
+
+        """
+
+        def explode(fuse):
+            raise TypeError("Boom.")
+
+        def run(params):
+            request = {
+                "jsonrpc" : "2.0", "id" : 1, "method" : "explode",
+                "params" : params,
+            }
+            response = api.run_request(lambda name : explode, request)
+            return response["error"]["code"]
+
+        self.assertEqual(run({"fuse" : 1}), api.SERVER_ERROR)
+        self.assertEqual(run({}), api.INVALID_PARAMS)
+        self.assertEqual(run({"fuse" : 1, "bomb" : 2}), api.INVALID_PARAMS)
+
+    def test_exposed_signature(self):
+        response, = self.run_batch(
+            {
+                "jsonrpc" : "2.0", "id" : 1, "method" : "Game.list",
+                "params" : {"connection" : 12},
+            },
+        )
+        self.assertEqual(response["error"]["code"], api.INVALID_PARAMS)
+
+    def connect(self):
+        protocol = api.EngineFactory(self.api.lookupMethod).buildProtocol(None)
+        protocol.sendString = mock.Mock()
+        protocol.connectionMade()
+        return protocol
+
+    def sent(self, protocol):
+        return [
+            json.loads(string)
+            for (string,), _ in protocol.sendString.call_args_list
+        ]
+
+    def test_protocol(self):
+        protocol = self.connect()
+
+        protocol.stringReceived(
+            '[{"jsonrpc" : "2.0", "id" : 1, "method" : "Game.create"},'
+            ' {"jsonrpc" : "2.0", "id" : 2, "method" : "Game.create"}]'
+        )
+
+        sent, = protocol.sendString.call_args[0]
+        self.assertEqual(
+            [response["result"] for response in json.loads(sent)],
+            [{"gameID" : 0}, {"gameID" : 1}],
+        )
+
+    def test_protocol_parse_error(self):
+        protocol = self.connect()
+        protocol.stringReceived('[{"jsonrpc" : "2.0", "id" : 1, "meth')
+
+        response, = self.sent(protocol)
+        self.assertEqual(
+            response,
+            api.error_response(None, api.PARSE_ERROR, "Parse error."),
+        )
+
+    def test_protocol_compact_parse_error(self):
+        protocol = self.connect()
+        protocol._negotiable = False
+        protocol.encoding = mock.Mock(dumps=json.dumps)
+        protocol.encoding.loads.side_effect = ValueError
+
+        protocol.stringReceived("\xc1")
+
+        response, = self.sent(protocol)
+        self.assertEqual(response["error"]["code"], api.PARSE_ERROR)
+
+    def test_call_remote(self):
+        protocol = self.connect()
+
+        calling = protocol.callRemote(api.Select, choices=[1, 2])
+        request, = self.sent(protocol)
+        self.assertEqual(
+            request, {
+                "jsonrpc" : "2.0", "id" : 0, "method" : "select",
+                "params" : {"choices" : [1, 2]},
+            },
+        )
+
+        protocol.stringReceived('{"jsonrpc" : "2.0", "id" : 0, "result" : 2}')
+        self.assertEqual(self.successResultOf(calling), 2)
+        self.assertEqual(protocol.sendString.call_count, 1)
+
+    def test_call_remote_error(self):
+        protocol = self.connect()
+
+        calling = protocol.callRemote(api.Select, choices=[1, 2])
+        protocol.stringReceived(json.dumps(
+            api.error_response(0, api.INVALID_PARAMS, "Nope."),
+        ))
+
+        failed = self.failureResultOf(calling, api.RemoteError)
+        self.assertEqual(failed.value.code, api.INVALID_PARAMS)
+        self.assertEqual(protocol.sendString.call_count, 1)
+
+    def test_call_remote_answered_in_a_batch(self):
+        protocol = self.connect()
+
+        calling = protocol.callRemote(api.Select, choices=[1, 2])
+        protocol.stringReceived(json.dumps([
+            {"jsonrpc" : "2.0", "id" : 0, "result" : 1},
+            {"jsonrpc" : "2.0", "id" : 1, "method" : "Game.create"},
+        ]))
+
+        self.assertEqual(self.successResultOf(calling), 1)
+        _, (response,) = self.sent(protocol)
+        self.assertEqual(response["result"], {"gameID" : 0})
+
+    def test_call_remote_encoding(self):
+        """
+        Calls are sent in the negotiated encoding, and so are the answers
+        to them.
+
+        """
+
+        protocol = self.connect()
+        protocol._negotiable = False
+        protocol.encoding = mock.Mock(
+            dumps=lambda obj : "~" + json.dumps(obj),
+            loads=lambda string : json.loads(string[1:]),
+        )
+
+        calling = protocol.callRemote(api.Select, choices=[1, 2])
+        sent, = protocol.sendString.call_args[0]
+        self.assertEqual(json.loads(sent[1:])["method"], "select")
+
+        protocol.stringReceived('~{"jsonrpc" : "2.0", "id" : 0, "result" : 1}')
+        self.assertEqual(self.successResultOf(calling), 1)
+        self.assertEqual(protocol.sendString.call_count, 1)
+
+    def test_call_remote_connection_lost(self):
+        protocol = self.connect()
+
+        calling = protocol.callRemote(api.Select, choices=[1, 2])
+        protocol.connectionLost(failure.Failure(error.ConnectionDone()))
+
+        self.failureResultOf(calling, error.ConnectionDone)
+
+    def test_remote_selection(self):
+        """
+        A remote user is sent the IDs of the cards they may choose, and the
+        IDs they reply with are mapped back to the cards in their game.
+
+        """
+
+        protocol = self.connect()
+        protocol.notifications.clock = task.Clock()
+
+        gameID = self.api.lookupMethod("Game.create")()["gameID"]
+        for name in u"Foo", u"Bar":
+            protocol.stringReceived(json.dumps({
+                "jsonrpc" : "2.0", "method" : "Game.join",
+                "params" : {"gameID" : gameID, "name" : name},
+            }))
+        self.api.lookupMethod("Game.start")(gameID=gameID)
+
+        game = self.api.games.game(gameID)
+        player = game.turn.active_player
+
+        db_card = mock.Mock(
+            types={types.instant}, subtypes=set(), supertypes=set(),
+            abilities=[], mana_cost=u"U", loyalty=None,
+            power=None, toughness=None,
+        )
+        db_card.name = u"Test Instant"
+        cards = [c.Card(db_card) for _ in range(player.hand_size + 1)]
+        for card in cards:
+            card.game, card.owner, card.controller = game, player, player
+        player.hand.update(cards, silent=True)
+
+        protocol.sendString.reset_mock()
+        cleaning_up = phases.cleanup(game)
+
+        call, = self.sent(protocol)
+        self.assertEqual(call["method"], api.SelectCards)
+        card_id = self.api.games[gameID].deltas.card_id
+        self.assertEqual(
+            sorted(call["params"]["cards"]),
+            sorted(card_id(card) for card in cards),
+        )
+
+        discarded = cards[3]
+        protocol.stringReceived(json.dumps({
+            "jsonrpc" : "2.0", "id" : call["id"],
+            "result" : [card_id(discarded)],
+        }))
+
+        self.successResultOf(cleaning_up)
+        self.assertEqual(list(player.graveyard), [discarded])
+        self.assertEqual(len(player.hand), player.hand_size)
+
+    def test_remote_selection_not_offered(self):
+        protocol = self.connect()
+        gameID = self.api.lookupMethod("Game.create")()["gameID"]
+        protocol.stringReceived(json.dumps({
+            "jsonrpc" : "2.0", "method" : "Game.join",
+            "params" : {"gameID" : gameID, "name" : u"Foo"},
+        }))
+
+        (_, player), = self.api.games[gameID].players
+        selecting = player.user.select_cards([u"a", u"b"])
+        call, = self.sent(protocol)
+
+        unknown = max(call["params"]["cards"]) + 1
+        protocol.stringReceived(json.dumps({
+            "jsonrpc" : "2.0", "id" : call["id"], "result" : [unknown],
+        }))
+        self.failureResultOf(selecting, exceptions.BadSelection)
+
+    def test_protocol_only_notifications(self):
+        protocol = self.connect()
+
+        protocol.stringReceived(
+            '[{"jsonrpc" : "2.0", "method" : "Game.create"}]'
+        )
+        self.assertFalse(protocol.sendString.called)
+        self.assertEqual(len(self.api.games), 1)
+
+
+class TestDrafts(unittest.TestCase):
+    def setUp(self):
+        pools = {
+            u"A" : {
+                u"C" : tuple(u"Common {}".format(i) for i in range(20)),
+                u"U" : tuple(u"Uncommon {}".format(i) for i in range(5)),
+                u"R" : (u"Rare",),
+            },
+        }
+        self.clock = task.Clock()
+        self.api = api.APIController(pools=pools, clock=self.clock)
+
+    def call(self, method, **params):
+        return self.api.lookupMethod(method)(**params)
+
+    def test_create(self):
+        draftID = self.call("Draft.create", sets=[u"A"] * 3, seats=2)
+        self.assertEqual(draftID, {"draftID" : 0})
+
+        info = self.call("Draft.info", draftID=0)
+        self.assertEqual(
+            info, {
+                "draftID" : 0, "state" : "open", "round" : 0,
+                "sets" : [u"A"] * 3, "seats" : 2, "drafters" : [],
+            },
+        )
+
+    def test_create_unknown_set(self):
+        with self.assertRaises(exceptions.InvalidAction):
+            self.call("Draft.create", sets=[u"Z"])
+
+    def test_list(self):
+        self.call("Draft.create", sets=[u"A"])
+        self.call("Draft.create", sets=[u"A"])
+        self.call("Draft.join", draftID=1, name=u"Foo")
+        self.call("Draft.join", draftID=1, name=u"Bar")
+        self.call("Draft.start", draftID=1)
+
+        drafts = self.call("Draft.list")["drafts"]
+        self.assertEqual([draft["draftID"] for draft in drafts], [0])
+
+    def test_draft(self):
+        self.call("Draft.create", sets=[u"A"])
+
+        protocol = mock.Mock()
+        join = self.api.lookupMethod("Draft.join")
+        foo = join(draftID=0, name=u"Foo", connection=protocol)
+        bar = join(draftID=0, name=u"Bar", connection=protocol)
+        self.assertEqual(
+            [foo["drafterID"], bar["drafterID"]], [0, 1],
+        )
+
+        self.call("Draft.start", draftID=0)
+
+        push = protocol.notifications.push
+        self.assertEqual(push.call_count, 2)
+        method, params = push.call_args[0]
+        self.assertEqual(method, "packReceived")
+        self.assertEqual(len(params["pack"]), 15)
+
+        (_, drafter), _ = self.api.drafters[0]
+        card = drafter.pack[0]
+
+        with self.assertRaises(api.NotAuthorized):
+            self.call(
+                "Draft.pick", auth=bar["auth"], draftID=0, drafterID=0,
+                card=card,
+            )
+
+        self.call(
+            "Draft.pick", auth=foo["auth"], draftID=0, drafterID=0, card=card,
+        )
+        self.assertEqual(drafter.picks, [card])
+
+        picks = self.call(
+            "Draft.picks", auth=foo["auth"], draftID=0, drafterID=0,
+        )
+        self.assertEqual(picks, {"picks" : [card]})
+        with self.assertRaises(api.NotAuthorized):
+            self.call("Draft.picks", auth=bar["auth"], draftID=0, drafterID=0)
+
+        self.call("Draft.end", draftID=0)
+        push.assert_any_call("draftEnded", {"draftID" : 0, "picks" : [card]})
+        with self.assertRaises(exceptions.NoSuchObject):
+            self.call("Draft.info", draftID=0)
+        self.assertEqual((self.api.drafts, self.api.drafters), ({}, {}))
+
+    def test_unknown_drafter(self):
+        self.call("Draft.create", sets=[u"A"])
+        foo = self.call("Draft.join", draftID=0, name=u"Foo")
+        self.call("Draft.join", draftID=0, name=u"Bar")
+        self.call("Draft.start", draftID=0)
+
+        for drafterID in 2, -1:
+            with self.assertRaises(exceptions.NoSuchObject):
+                self.call(
+                    "Draft.pick", auth=foo["auth"], draftID=0,
+                    drafterID=drafterID, card=u"Rare",
+                )
+
+    def test_auto_picked(self):
+        self.call("Draft.create", sets=[u"A"], timeout=10)
+
+        protocol = mock.Mock()
+        join = self.api.lookupMethod("Draft.join")
+        join(draftID=0, name=u"Foo", connection=protocol)
+        join(draftID=0, name=u"Bar")
+        self.call("Draft.start", draftID=0)
+
+        self.clock.advance(10)
+
+        (_, drafter), _ = self.api.drafters[0]
+        card, = drafter.picks
+        protocol.notifications.push.assert_any_call(
+            "autoPicked", {"draftID" : 0, "card" : card},
+        )
+
+    def test_released_once_ended(self):
+        self.call("Draft.create", sets=[u"A"], timeout=10)
+        self.call("Draft.join", draftID=0, name=u"Foo")
+        self.call("Draft.join", draftID=0, name=u"Bar")
+        self.call("Draft.start", draftID=0)
+
+        draft = self.api.drafts[0]
+        while draft.state == "drafting":
+            self.clock.advance(10)
+
+        self.assertEqual((self.api.drafts, self.api.drafters), ({}, {}))
+
+
+class TestSpectating(unittest.TestCase):
+    def setUp(self):
+        self.api = api.APIController()
+        self.factory = api.EngineFactory(self.api.lookupMethod)
+        self.gameID = self.api.lookupMethod("Game.create")()["gameID"]
+
+    def connect(self):
+        protocol = self.factory.buildProtocol(None)
+        protocol.sendString = mock.Mock()
+        protocol.transport = mock.Mock()
+        protocol.connectionMade()
+        return protocol
+
+    def call(self, protocol, method, **params):
+        protocol.stringReceived(json.dumps([{
+            "jsonrpc" : "2.0", "id" : 1, "method" : method, "params" : params,
+        }]))
+        response, = json.loads(protocol.sendString.call_args[0][0])
+        return response
+
+    def test_watch(self):
+        protocol = self.connect()
+        protocol.transport.registerProducer.assert_called_once_with(
+            protocol, True,
+        )
+
+        response = self.call(protocol, "Game.watch", gameID=self.gameID)
+        self.assertEqual(
+            response["result"],
+            self.api.games[self.gameID].deltas.snapshot(),
+        )
+        self.assertEqual(response["result"]["type"], "snapshot")
+
+        spectators = self.api.games[self.gameID].spectators
+        self.assertIn(protocol, spectators)
+
+        self.call(protocol, "Game.unwatch", gameID=self.gameID)
+        self.assertNotIn(protocol, spectators)
+
+    def test_watch_needs_a_connection(self):
+        watch = self.api.lookupMethod("Game.watch")
+        with self.assertRaises(exceptions.InvalidAction):
+            watch(gameID=self.gameID)
+
+    def test_connection_cannot_be_passed(self):
+        protocol = self.connect()
+        response = self.call(
+            protocol, "Game.watch", gameID=self.gameID, connection=12,
+        )
+        self.assertEqual(response["error"]["code"], api.INVALID_PARAMS)
+
+    def test_disconnecting_stops_watching(self):
+        protocol = self.connect()
+        self.call(protocol, "Game.watch", gameID=self.gameID)
+
+        protocol.connectionLost(None)
+        self.assertEqual(len(self.api.games[self.gameID].spectators), 0)
+
+    def test_paused(self):
+        protocol = self.connect()
+        self.assertFalse(protocol.paused)
+        protocol.pauseProducing()
+        self.assertTrue(protocol.paused)
+        protocol.resumeProducing()
+        self.assertFalse(protocol.paused)
+
+
+class TestBackpressure(unittest.TestCase):
+    def setUp(self):
+        self.api = api.APIController()
+        self.factory = api.EngineFactory(self.api.lookupMethod)
+        self.protocol = self.factory.buildProtocol(None)
+        self.protocol.transport = mock.Mock()
+        self.protocol.connectionMade()
+        self.write = self.protocol.transport.write
+
+    def test_budget(self):
+        self.assertEqual(
+            self.protocol.transport.bufferSize, self.protocol.budget,
+        )
+
+    def test_backlog(self):
+        self.protocol.sendString("foo")
+        self.assertEqual(self.protocol.backlog, 0)
+
+        self.protocol.pauseProducing()
+        self.protocol.sendString("foo")
+        self.protocol.sendString("quux")
+        self.assertEqual(self.protocol.backlog, 7)
+        self.assertEqual(self.write.call_count, 3)
+
+        self.protocol.resumeProducing()
+        self.assertEqual(self.protocol.backlog, 0)
+
+    def test_dropped_past_the_limit(self):
+        self.protocol.limit = 5
+
+        self.protocol.pauseProducing()
+        self.protocol.sendString("foo")
+        self.protocol.transport.abortConnection.assert_has_calls([])
+
+        self.protocol.sendString("foo")
+        self.protocol.transport.abortConnection.assert_called_once_with()
+        self.assertEqual(self.write.call_count, 1)
+
+    def test_deltas_collapse_into_a_snapshot(self):
+        self.protocol.stringReceived(json.dumps([
+            {"jsonrpc" : "2.0", "id" : 1, "method" : "Game.create"},
+            {
+                "jsonrpc" : "2.0", "id" : 2, "method" : "Game.join",
+                "params" : {"gameID" : 0, "name" : "Foo"},
+            },
+        ]))
+        self.write.reset_mock()
+
+        (_, player), = self.api.games[0].players
+        self.assertIs(player.user.protocol, self.protocol)
+
+        self.protocol.pauseProducing()
+        player.life -= 2
+        player.life -= 3
+        self.protocol.notifications.flush()
+        self.assertFalse(self.write.called)
+
+        self.protocol.resumeProducing()
+        self.protocol.notifications.flush()
+
+        data, = self.write.call_args[0]
+        frame, = json.loads(data[data.index(":") + 1:-1])
+        self.assertEqual(frame["params"]["type"], "snapshot")
+        self.assertEqual(frame["params"]["version"], 2)
+        self.assertEqual(frame["params"]["players"][0]["life"], 15)
+
+
+class TestEncodingNegotiation(unittest.TestCase):
+    def setUp(self):
+        self.api = api.APIController()
+        self.factory = api.EngineFactory(self.api.lookupMethod)
+        self.protocol = self.factory.buildProtocol(None)
+        self.protocol.sendString = mock.Mock()
+        self.protocol.connectionMade()
+
+    def negotiate(self, name):
+        self.protocol.stringReceived(json.dumps({
+            "jsonrpc" : "2.0", "id" : 0, "method" : "encoding",
+            "params" : {"name" : name},
+        }))
+        return json.loads(self.protocol.sendString.call_args[0][0])
+
+    def test_default(self):
+        self.assertIs(self.protocol.encoding, encoding.JSON)
+
+    def test_negotiate(self):
+        reverse = mock.Mock(
+            dumps=lambda obj : json.dumps(obj)[::-1],
+            loads=lambda string : json.loads(string[::-1]),
+        )
+
+        with mock.patch.dict(encoding.ENCODINGS, {"reverse" : reverse}):
+            response = self.negotiate("reverse")
+        self.assertEqual(response["result"], {"name" : "reverse"})
+        self.assertIs(self.protocol.encoding, reverse)
+
+        request = {"jsonrpc" : "2.0", "id" : 1, "method" : "Game.create"}
+        self.protocol.stringReceived(json.dumps(request)[::-1])
+
+        sent = self.protocol.sendString.call_args[0][0]
+        self.assertEqual(
+            json.loads(sent[::-1]),
+            {"jsonrpc" : "2.0", "id" : 1, "result" : {"gameID" : 0}},
+        )
+        self.assertIs(self.protocol.notifications.encode, reverse.dumps)
+
+    def test_unknown(self):
+        response = self.negotiate("morse")
+        self.assertEqual(response["error"]["code"], api.INVALID_PARAMS)
+        self.assertIs(self.protocol.encoding, encoding.JSON)
+
+    def test_only_first_message(self):
+        self.protocol.stringReceived(
+            '[{"jsonrpc" : "2.0", "id" : 1, "method" : "Game.create"}]'
+        )
+        self.protocol.stringReceived(
+            '[{"jsonrpc" : "2.0", "id" : 1, "method" : "encoding",'
+            ' "params" : {"name" : "json"}}]'
+        )
+
+        response, = json.loads(self.protocol.sendString.call_args[0][0])
+        self.assertEqual(response["error"]["code"], api.METHOD_NOT_FOUND)
+
+
+class TestNotificationQueue(unittest.TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.send = mock.Mock()
+        self.queue = api.NotificationQueue(self.send, clock=self.clock)
+
+    def sent(self):
+        return [json.loads(frame) for (frame,), _ in self.send.call_args_list]
+
+    def test_one_frame_per_tick(self):
+        self.queue.push("foo", {"bar" : 1})
+        self.queue.push("baz", {"quux" : 2})
+        self.assertFalse(self.send.called)
+
+        self.clock.advance(0)
+        self.assertEqual(
+            self.sent(), [
+                [
+                    {
+                        "jsonrpc" : "2.0", "method" : "foo",
+                        "params" : {"bar" : 1},
+                    },
+                    {
+                        "jsonrpc" : "2.0", "method" : "baz",
+                        "params" : {"quux" : 2},
+                    },
+                ],
+            ],
+        )
+        self.assertEqual(len(self.queue), 0)
+
+        self.queue.push("foo", {"bar" : 3})
+        self.clock.advance(0)
+        self.assertEqual(len(self.sent()), 2)
+
+    def test_flush(self):
+        self.queue.push("foo", {})
+        self.queue.flush()
+        self.assertEqual(len(self.sent()), 1)
+
+        # the scheduled flush was cancelled
+        self.clock.advance(0)
+        self.assertEqual(len(self.sent()), 1)
+
+    def test_flush_nothing(self):
+        self.queue.flush()
+        self.assertFalse(self.send.called)
+
+    def test_fallen_behind(self):
+        snapshot = mock.Mock(return_value={"type" : "snapshot"})
+
+        self.queue.push("stateChanged", {"version" : 1}, snapshot=snapshot)
+        self.queue.fall_behind()
+        self.queue.push("stateChanged", {"version" : 2}, snapshot=snapshot)
+        self.queue.push("foo", {})
+        self.clock.advance(0)
+
+        frame, = self.sent()
+        self.assertEqual([each["method"] for each in frame], ["foo"])
+        self.assertFalse(snapshot.called)
+
+        self.queue.catch_up()
+        self.clock.advance(0)
+
+        _, frame = self.sent()
+        self.assertEqual(
+            frame, [
+                {
+                    "jsonrpc" : "2.0", "method" : "stateChanged",
+                    "params" : {"type" : "snapshot"},
+                },
+            ],
+        )
+        snapshot.assert_called_once_with()
+
+    def test_caught_up_without_falling_behind(self):
+        self.queue.fall_behind()
+        self.queue.catch_up()
+        self.clock.advance(0)
+        self.assertFalse(self.send.called)
+
+    def test_coalesced(self):
+        self.queue.push("stateChanged", {
+            "type" : "life", "player" : 0, "amount" : -2, "version" : 1,
+        })
+        self.queue.push("foo", {})
+        self.queue.push("stateChanged", {
+            "type" : "life", "player" : 0, "amount" : -3, "version" : 2,
+        })
+        self.clock.advance(0)
+
+        frame, = self.sent()
+        self.assertEqual(
+            [(each["method"], each["params"]) for each in frame], [
+                (
+                    "stateChanged", {
+                        "type" : "life", "player" : 0, "amount" : -5,
+                        "version" : 2, "merged" : [1],
+                    },
+                ),
+                ("foo", {}),
+            ],
+        )
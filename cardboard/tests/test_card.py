@@ -3,6 +3,7 @@ import unittest
 import mock
 
 from cardboard import card as c, ability, events, exceptions, types
+from cardboard.cards import keywords
 from cardboard.db import models as m
 from cardboard.tests.util import GameTestCase
 
@@ -63,6 +64,18 @@ class TestCard(GameTestCase):
         card = c.Card(self.instant_db_card, _cards={})
         self.assertEqual(card.abilities, [ability.AbilityNotImplemented] * 2)
 
+    def test_keywords(self):
+        db_card = mock_card(types.creature, abilities=["Flying, trample"])
+        db_card.name = "Test Keywords"
+
+        card = c.Card(db_card)
+        self.assertEqual(card.keywords, keywords.mask(u"Flying", u"Trample"))
+
+        # parsed once per card
+        with mock.patch.object(keywords, "parse") as parse:
+            self.assertEqual(c.Card(db_card).keywords, card.keywords)
+        self.assertFalse(parse.called)
+
     def test_sort(self):
         c1 = c.Card(self.creature_db_card)
         c1.name = "Foo"
@@ -276,6 +289,35 @@ class TestStatus(GameTestCase):
         # didn't fire any events
         self.assertFalse(self.events.trigger.called)
 
+    def test_statuses_are_per_card(self):
+        other = c.Card(self.creature_db_card)
+        other.game = self.game
+        self.game.battlefield.move(self.creature)
+        self.game.battlefield.add(other)
+
+        self.creature.tap()
+        self.assertTrue(self.creature.is_tapped)
+        self.assertFalse(other.is_tapped)
+
+    def test_change_statuses(self):
+        other = c.Card(self.creature_db_card)
+        other.game = self.game
+        self.game.battlefield.move(self.creature)
+        self.game.battlefield.add(other)
+        self.creature.tap()
+
+        changes = [
+            (self.creature, events.UNTAPPED), (other, events.PHASED_OUT),
+        ]
+        with self.assertTriggers(
+            event=events.STATUSES_CHANGED, changes=changes,
+        ):
+            c.change_statuses(self.game, changes)
+
+        self.assertFalse(self.creature.is_tapped)
+        self.assertTrue(self.creature.is_phased_in)
+        self.assertFalse(other.is_phased_in)
+
 
 class TestSpell(GameTestCase):
     def setUp(self):
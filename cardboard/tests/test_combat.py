@@ -0,0 +1,456 @@
+import mock
+
+from cardboard import combat as c, events, exceptions, phases as p, types
+from cardboard.cards import keywords
+from cardboard.tests.util import GameTestCase
+
+
+class CombatTestCase(GameTestCase):
+    def setUp(self):
+        super(CombatTestCase, self).setUp()
+
+        self.game.start()
+        self.attacking, self.defending = self.game.turn.order
+        self.combat = self.game.combat = c.Combat(self.game)
+
+    def creature(self, power, toughness, *names, **kwargs):
+        characteristics = dict(
+            power=power, toughness=toughness, damage=0, loyalty=None,
+            types={types.creature}, subtypes=set(), colors=set(),
+            keywords=keywords.mask(*names), keyword_parameters={},
+            abilities=[], is_tapped=False, can_block=True,
+            controller=self.attacking,
+        )
+        characteristics.update(kwargs)
+
+        creature = mock.Mock(**characteristics)
+        self.game.battlefield.add(creature, silent=True)
+        return creature
+
+    def blocker(self, power, toughness, *names, **kwargs):
+        kwargs.setdefault("controller", self.defending)
+        return self.creature(power, toughness, *names, **kwargs)
+
+    def damage_events(self):
+        return [
+            payload for (payload,), _ in self.events.trigger.call_args_list
+            if payload.event == events.COMBAT_DAMAGE_DEALT
+        ]
+
+
+class TestDeclarations(CombatTestCase):
+    def test_declare_attackers(self):
+        attacker = self.creature(2, 2)
+
+        with self.assertTriggers(
+            event=events.ATTACKERS_DECLARED, player=self.attacking,
+            attacks={attacker : self.defending},
+        ):
+            self.combat.declare_attackers({attacker : self.defending})
+
+        self.assertIn(attacker, self.combat)
+        self.assertFalse(self.combat.is_blocked(attacker))
+
+    def test_declare_blockers(self):
+        attacker, blocker = self.creature(2, 2), self.blocker(2, 2)
+        self.combat.declare_attackers({attacker : self.defending})
+
+        with self.assertTriggers(
+            event=events.BLOCKERS_DECLARED, player=self.defending,
+            blocks={blocker : attacker},
+        ):
+            self.combat.declare_blockers(self.defending, {blocker : attacker})
+
+        self.assertIn(blocker, self.combat)
+        self.assertTrue(self.combat.is_blocked(attacker))
+
+    def test_block_non_attacker(self):
+        creature, blocker = self.creature(2, 2), self.blocker(2, 2)
+
+        with self.assertRaises(exceptions.InvalidAction):
+            self.combat.declare_blockers(self.defending, {blocker : creature})
+        self.assertNotIn(blocker, self.combat)
+
+    def test_already_in_combat(self):
+        attacker = self.creature(2, 2)
+        self.combat.declare_attackers({attacker : self.defending})
+
+        with self.assertRaises(exceptions.InvalidAction):
+            self.combat.declare_attackers({attacker : self.defending})
+
+    def test_order_blockers(self):
+        attacker = self.creature(6, 4)
+        first, second = self.blocker(0, 3), self.blocker(1, 1)
+
+        self.combat.declare_attackers({attacker : self.defending})
+        self.combat.declare_blockers(
+            self.defending, {first : attacker, second : attacker},
+        )
+
+        self.combat.order_blockers(attacker, [second, first])
+        self.assertEqual(self.combat.blockers[attacker], [second, first])
+
+        with self.assertRaises(exceptions.BadSelection):
+            self.combat.order_blockers(attacker, [second])
+
+    def test_remove(self):
+        attacker, blocker = self.creature(2, 2), self.blocker(2, 2)
+        self.combat.declare_attackers({attacker : self.defending})
+        self.combat.declare_blockers(self.defending, {blocker : attacker})
+
+        self.combat.remove(blocker)
+        self.assertNotIn(blocker, self.combat)
+
+        # it stays blocked
+        self.assertTrue(self.combat.is_blocked(attacker))
+
+        with self.assertRaises(exceptions.NoSuchObject):
+            self.combat.remove(blocker)
+
+
+class TestCombatDamage(CombatTestCase):
+    def test_unblocked(self):
+        attacker = self.creature(3, 3)
+        self.combat.declare_attackers({attacker : self.defending})
+
+        self.assertEqual(self.combat.damage_passes, 1)
+        dealt = self.combat.deal_damage()
+
+        self.assertEqual(dealt, [(attacker, self.defending, 3)])
+        self.assertEqual(self.defending.life, 17)
+
+    def test_one_event_per_pass(self):
+        tokens = [self.creature(1, 1) for _ in range(100)]
+        self.combat.declare_attackers(
+            dict.fromkeys(tokens, self.defending)
+        )
+
+        self.resetEvents()
+        self.combat.deal_damage()
+
+        damage, = self.damage_events()
+        self.assertEqual(len(damage.damage), 100)
+        self.assertFalse(damage.first_strike)
+
+        self.assertEqual(self.defending.life, -80)
+        self.assertTriggered(
+            [{"event" : events.LIFE_LOST, "player" : self.defending,
+              "amount" : 100}]
+        )
+
+    def test_blocked(self):
+        attacker, blocker = self.creature(3, 3), self.blocker(2, 4)
+        self.combat.declare_attackers({attacker : self.defending})
+        self.combat.declare_blockers(self.defending, {blocker : attacker})
+
+        self.combat.deal_damage()
+
+        self.assertEqual(attacker.damage, 2)
+        self.assertEqual(blocker.damage, 3)
+        self.assertEqual(self.defending.life, 20)
+
+    def test_damage_removed_at_cleanup(self):
+        attacker = self.creature(2, 2, u"Deathtouch")
+        blocker = self.blocker(1, 4)
+        self.combat.declare_attackers({attacker : self.defending})
+        self.combat.declare_blockers(self.defending, {blocker : attacker})
+
+        self.combat.deal_damage()
+        self.assertTrue(blocker._deathtouch_damage)
+
+        self.game.turn.expire()
+        self.assertEqual((attacker.damage, blocker.damage), (1, 2))
+
+        self.game.turn._step = p.cleanup
+        self.game.turn.expire()
+
+        self.assertEqual((attacker.damage, blocker.damage), (0, 0))
+        self.assertFalse(blocker._deathtouch_damage)
+
+    def test_damage_assignment_order(self):
+        """
+        Lethal damage is assigned to each blocker in order, with the rest
+        going to the last.
+
+        .. seealso::
+            :ref:`combat-damage-step`
+
+        """
+
+        craw_wurm = self.creature(6, 4)
+        wall, cadet = self.blocker(0, 3), self.blocker(1, 1)
+
+        self.combat.declare_attackers({craw_wurm : self.defending})
+        self.combat.declare_blockers(
+            self.defending, {wall : craw_wurm, cadet : craw_wurm},
+        )
+        self.combat.order_blockers(craw_wurm, [wall, cadet])
+
+        self.combat.deal_damage()
+
+        self.assertEqual(wall.damage, 3)
+        self.assertEqual(cadet.damage, 3)
+
+    def test_already_damaged_blocker(self):
+        attacker = self.creature(4, 4)
+        first, second = self.blocker(0, 3), self.blocker(0, 3)
+        first.damage = 2
+
+        self.combat.declare_attackers({attacker : self.defending})
+        self.combat.declare_blockers(
+            self.defending, {first : attacker, second : attacker},
+        )
+        self.combat.order_blockers(attacker, [first, second])
+
+        self.combat.deal_damage()
+
+        self.assertEqual(first.damage, 3)
+        self.assertEqual(second.damage, 3)
+
+    def test_trample(self):
+        attacker = self.creature(6, 6, u"Trample")
+        blocker = self.blocker(2, 2)
+
+        self.combat.declare_attackers({attacker : self.defending})
+        self.combat.declare_blockers(self.defending, {blocker : attacker})
+        self.combat.deal_damage()
+
+        self.assertEqual(blocker.damage, 2)
+        self.assertEqual(self.defending.life, 16)
+
+    def test_trample_deathtouch(self):
+        attacker = self.creature(6, 6, u"Trample", u"Deathtouch")
+        blocker = self.blocker(2, 5)
+
+        self.combat.declare_attackers({attacker : self.defending})
+        self.combat.declare_blockers(self.defending, {blocker : attacker})
+        self.combat.deal_damage()
+
+        self.assertEqual(blocker.damage, 1)
+        self.assertTrue(blocker._deathtouch_damage)
+        self.assertEqual(self.defending.life, 15)
+
+    def test_blockers_removed(self):
+        attacker, blocker = self.creature(3, 3), self.blocker(2, 2)
+
+        self.combat.declare_attackers({attacker : self.defending})
+        self.combat.declare_blockers(self.defending, {blocker : attacker})
+        self.game.battlefield.remove(blocker, silent=True)
+
+        self.assertEqual(self.combat.deal_damage(), [])
+        self.assertEqual(self.defending.life, 20)
+
+    def test_first_strike(self):
+        attacker = self.creature(2, 2, u"First Strike")
+        blocker = self.blocker(2, 3)
+
+        self.combat.declare_attackers({attacker : self.defending})
+        self.combat.declare_blockers(self.defending, {blocker : attacker})
+
+        self.assertEqual(self.combat.damage_passes, 2)
+
+        self.combat.deal_damage()
+        self.assertEqual((attacker.damage, blocker.damage), (0, 2))
+
+        self.combat.deal_damage()
+        self.assertEqual((attacker.damage, blocker.damage), (2, 2))
+
+        first, regular = self.damage_events()
+        self.assertTrue(first.first_strike)
+        self.assertFalse(regular.first_strike)
+
+    def test_double_strike(self):
+        attacker = self.creature(2, 2, u"Double Strike")
+        self.combat.declare_attackers({attacker : self.defending})
+
+        self.combat.deal_damage()
+        self.combat.deal_damage()
+
+        self.assertEqual(self.defending.life, 16)
+
+
+class TestCombatSteps(CombatTestCase):
+    def test_combat_damage_steps(self):
+        attacker = self.creature(2, 2, u"First Strike")
+        self.combat.declare_attackers({attacker : self.defending})
+
+        self.game.grant_priority = mock.Mock()
+        p.combat_damage(self.game)
+
+        self.assertEqual(self.game.grant_priority.call_count, 2)
+        self.assertEqual(len(self.damage_events()), 2)
+        self.assertTriggered([
+            {"event" : events.STEP_BEGAN, "phase" : "combat",
+             "step" : "combat damage", "player" : self.attacking},
+            {"event" : events.STEP_ENDED, "phase" : "combat",
+             "step" : "combat damage", "player" : self.attacking},
+            {"event" : events.STEP_BEGAN, "phase" : "combat",
+             "step" : "combat damage", "player" : self.attacking},
+            {"event" : events.STEP_ENDED, "phase" : "combat",
+             "step" : "combat damage", "player" : self.attacking},
+        ])
+
+    def test_declare_attackers_step(self):
+        attacker = self.creature(2, 2)
+        self.game.grant_priority = mock.Mock()
+
+        with self.attacking.user.select_cards.will_return(attacker):
+            p.declare_attackers(self.game)
+
+        self.assertEqual(self.combat.attacks, {attacker : self.defending})
+        attacker.tap.assert_called_once_with()
+
+    def test_end_of_combat(self):
+        p.end_of_combat(self.game)
+        self.assertIsNone(self.game.combat)
+
+
+class TestLegalBlocks(CombatTestCase):
+    def attack(self, *attackers):
+        self.combat.declare_attackers(dict.fromkeys(attackers, self.defending))
+
+    def test_legal_blocks(self):
+        attacker, other = self.creature(2, 2), self.creature(2, 2)
+        blocker = self.blocker(2, 2)
+        self.creature(2, 2, controller=self.defending, types={types.land})
+
+        self.attack(attacker, other)
+
+        self.assertEqual(
+            self.combat.legal_blocks(self.defending),
+            {blocker : frozenset([attacker, other])},
+        )
+        # nothing is attacking the attacking player
+        legal = self.combat.legal_blocks(self.attacking)
+        self.assertFalse(any(legal.itervalues()))
+
+    def test_tapped_or_cant_block(self):
+        attacker = self.creature(2, 2)
+        tapped = self.blocker(2, 2, is_tapped=True)
+        cant = self.blocker(2, 2, can_block=False)
+        self.attack(attacker)
+
+        legal = self.combat.legal_blocks(self.defending)
+        self.assertFalse(legal[tapped] or legal[cant])
+
+    def test_evasion(self):
+        flier = self.creature(2, 2, u"Flying")
+        shadow = self.creature(2, 2, u"Shadow")
+        fear = self.creature(2, 2, u"Fear")
+        intimidate = self.creature(2, 2, u"Intimidate", colors={u"R"})
+        self.attack(flier, shadow, fear, intimidate)
+
+        ground = self.blocker(2, 2, colors={u"G"})
+        reach = self.blocker(2, 2, u"Reach", colors={u"B"})
+        shade = self.blocker(2, 2, u"Shadow", colors={u"R"})
+
+        legal = self.combat.legal_blocks(self.defending)
+        self.assertEqual(legal[ground], frozenset())
+        self.assertEqual(legal[reach], frozenset([flier, fear]))
+        self.assertEqual(legal[shade], frozenset([shadow]))
+
+    def test_landwalk_and_protection(self):
+        walker = self.creature(
+            2, 2, u"Landwalk", keyword_parameters={u"Landwalk" : {u"Swamp"}},
+        )
+        protected = self.creature(
+            2, 2, u"Protection",
+            keyword_parameters={u"Protection" : {u"G"}},
+        )
+        self.attack(walker, protected)
+        blocker = self.blocker(2, 2, colors={u"G"})
+
+        self.assertEqual(
+            self.combat.legal_blocks(self.defending)[blocker],
+            frozenset([walker]),
+        )
+
+        self.creature(
+            0, 0, controller=self.defending,
+            types={types.land}, subtypes={u"Swamp"},
+        )
+        self.assertEqual(
+            self.combat.legal_blocks(self.defending)[blocker], frozenset(),
+        )
+
+    def test_restrictions(self):
+        attacker, other = self.creature(2, 2), self.creature(2, 2)
+        blocker = self.blocker(2, 2)
+        self.attack(attacker, other)
+
+        self.combat.legal_blocks(self.defending)
+        self.combat.add_restriction(lambda b, a : a is not other)
+
+        self.assertEqual(
+            self.combat.legal_blocks(self.defending)[blocker],
+            frozenset([attacker]),
+        )
+
+    def test_cached(self):
+        attacker, blocker = self.creature(2, 2), self.blocker(2, 2)
+        self.attack(attacker)
+
+        legal = self.combat.legal_blocks(self.defending)
+        self.assertEqual(legal[blocker], frozenset([attacker]))
+
+        with mock.patch.object(self.combat, "_can_block") as can_block:
+            self.assertIs(self.combat.legal_blocks(self.defending), legal)
+        self.assertFalse(can_block.called)
+
+    def test_incremental_update(self):
+        """
+        Only the pairs involving a creature that changed are recalculated.
+
+        """
+
+        attackers = [self.creature(2, 2) for _ in range(3)]
+        blockers = [self.blocker(2, 2) for _ in range(3)]
+        self.attack(*attackers)
+        self.combat.legal_blocks(self.defending)
+
+        flash = self.blocker(1, 1, u"Reach")
+        attackers[0].keywords = keywords.mask(u"Flying")
+        self.game.continuous.changed(attackers[0])
+
+        checked = []
+        can_block = self.combat._can_block
+
+        def check(blocker, blocking, attacker, attacking, lands):
+            checked.append((blocker, attacker))
+            return can_block(blocker, blocking, attacker, attacking, lands)
+
+        with mock.patch.object(self.combat, "_can_block", check):
+            legal = self.combat.legal_blocks(self.defending)
+
+        self.assertEqual(
+            sorted(checked),
+            sorted(
+                [(flash, attacker) for attacker in attackers] +
+                [(blocker, attackers[0]) for blocker in blockers]
+            ),
+        )
+        self.assertEqual(legal[flash], frozenset(attackers))
+        for blocker in blockers:
+            self.assertEqual(legal[blocker], frozenset(attackers[1:]))
+
+    def test_illegal_block(self):
+        flier, blocker = self.creature(2, 2, u"Flying"), self.blocker(2, 2)
+        self.attack(flier)
+
+        with self.assertRaises(exceptions.InvalidAction):
+            self.combat.declare_blockers(self.defending, {blocker : flier})
+
+    def test_declare_blockers_step(self):
+        attacker, blocker = self.creature(2, 2), self.blocker(2, 2)
+        self.attack(attacker)
+        self.game.grant_priority = mock.Mock()
+
+        user = self.defending.user
+        with mock.patch.object(user, "select_blocks") as select_blocks:
+            select_blocks.return_value = [(blocker, attacker)]
+            p.declare_blockers(self.game)
+
+        select_blocks.assert_called_once_with(
+            {blocker : frozenset([attacker])},
+        )
+        self.assertEqual(self.combat.blocks, {blocker : attacker})
@@ -1,6 +1,12 @@
+import unittest
+
 import mock
+from twisted.internet import defer
 
-from cardboard import core as c, events, exceptions, phases
+from cardboard import (
+    core as c, effects, events, exceptions, phases, timing, types,
+)
+from cardboard.tests.user import TestingUser
 from cardboard.tests.util import GameTestCase
 
 
@@ -334,6 +340,7 @@ class TestGame(GameTestCase):
             self.game.end()
 
         self.assertTrue(self.game.ended)
+        self.events.clear.assert_called_once_with()
 
     def test_check_for_win(self):
         """
@@ -485,6 +492,62 @@ class TestStateBasedEffects(GameTestCase):
         self.assertEqual(self.p1.death_by, "poison")
 
 
+    def creature(self, toughness, damage=0):
+        creature = mock.Mock(
+            power=2, toughness=toughness, damage=damage,
+            types={types.creature}, subtypes=set(), abilities=[],
+            owner=self.p1, _deathtouch_damage=False,
+        )
+        self.game.battlefield.add(creature)
+        creature.zone = self.game.battlefield
+        return creature
+
+    def test_lethal_damage(self):
+        """
+        A creature with lethal damage is put into its owner's graveyard,
+        after applying any effects to its toughness.
+
+        .. seealso::
+            :ref:`sba-list`
+
+        """
+
+        dying, boosted = self.creature(2, damage=2), self.creature(2, damage=2)
+
+        def boost(creature, characteristics):
+            characteristics["toughness"] += 1
+        self.game.continuous.add(
+            effects.ContinuousEffect(
+                boost, layer=effects.PT_MODIFYING, affects=[boosted],
+            )
+        )
+
+        self.game._check_state_based_actions()
+        self.assertIn(dying, self.p1.graveyard)
+        self.assertIn(boosted, self.game.battlefield)
+
+    def test_no_toughness(self):
+        """
+        A creature with 0 or less toughness (after effects) is put into its
+        owner's graveyard.
+
+        .. seealso::
+            :ref:`sba-list`
+
+        """
+
+        creature = self.creature(1)
+
+        def shrink(creature, characteristics):
+            characteristics["toughness"] -= 1
+        self.game.continuous.add(
+            effects.ContinuousEffect(shrink, layer=effects.PT_MODIFYING),
+        )
+
+        self.game._check_state_based_actions()
+        self.assertIn(creature, self.p1.graveyard)
+
+
 class TestTurnManager(GameTestCase):
     def setUp(self):
         super(TestTurnManager, self).setUp()
@@ -534,6 +597,138 @@ class TestTurnManager(GameTestCase):
         self.turn.end()
         self.assertEqual(self.turn.number, 2)
 
+    def test_turns(self):
+        self.assertIsNone(self.turn.turns)
+
+        self.game.start()
+        self.assertEqual(self.turn.turns, 1)
+
+        self.turn.end()
+        self.turn.end()
+        self.assertEqual(self.turn.turns, 3)
+
+    def test_at(self):
+        self.game.start()
+        active, other = self.turn.order
+
+        action = mock.Mock()
+        bucket = self.turn.at(action, phases.upkeep)
+        self.assertEqual(bucket, (1, "beginning", "upkeep", active))
+
+        self.turn.next()
+        action.assert_called_once_with()
+
+        self.turn.next()
+        self.assertEqual(action.call_count, 1)
+
+    def test_at_next_occurrence(self):
+        self.game.start()
+        active, other = self.turn.order
+        self.turn.next()
+
+        action = mock.Mock()
+        bucket = self.turn.at(action, phases.upkeep)
+        self.assertEqual(bucket, (2, "beginning", "upkeep", other))
+
+        for _ in range(11):
+            self.turn.next()
+            self.assertFalse(action.called)
+
+        self.assertEqual(self.turn.active_player, other)
+        self.turn.next()
+        action.assert_called_once_with()
+
+    def test_at_player(self):
+        self.game.start()
+        active, other = self.turn.order
+        self.turn.next()
+
+        action = mock.Mock()
+        bucket = self.turn.at(action, phases.draw, player=other)
+        self.assertEqual(bucket, (2, "beginning", "draw", other))
+
+        bucket = self.turn.at(action, phases.draw, player=active)
+        self.assertEqual(bucket, (1, "beginning", "draw", active))
+
+        bucket = self.turn.at(action, phases.upkeep, player=active)
+        self.assertEqual(bucket, (3, "beginning", "upkeep", active))
+
+    def test_at_unseated_player(self):
+        self.game.start()
+
+        with self.assertRaises(exceptions.InvalidAction):
+            self.turn.at(mock.Mock(), phases.draw, player=self.p3)
+
+    def test_until(self):
+        self.game.start()
+
+        action = mock.Mock()
+        self.turn.until(action, phases.draw)
+        self.turn.next()
+        self.turn.next()
+        self.assertFalse(action.called)
+
+        self.turn.next()
+        action.assert_called_once_with()
+
+        with self.assertRaises(exceptions.InvalidAction):
+            self.turn.until(action, phases.upkeep)
+
+    def test_until_end_of_turn(self):
+        """
+        "Until end of turn" effects end during the cleanup step.
+
+        .. seealso::
+            :ref:`cleanup-step`
+
+        """
+
+        self.game.start()
+
+        action = mock.Mock()
+        self.turn.until_end_of_turn(action)
+
+        while self.turn.step != phases.end:
+            self.turn.next()
+            self.assertFalse(action.called)
+
+        self.turn.next()
+        action.assert_called_once_with()
+
+    def test_unstarted_schedule(self):
+        with self.assertRaises(exceptions.InvalidAction):
+            self.turn.at(mock.Mock(), phases.upkeep)
+        with self.assertRaises(exceptions.InvalidAction):
+            self.turn.until_end_of_turn(mock.Mock())
+
+    def test_steps_are_timed(self):
+        self.game.start()
+        self.turn.next()
+
+        untap = self.game.timings[("beginning", "untap")]
+        upkeep = self.game.timings[("beginning", "upkeep")]
+        self.assertEqual((untap.count, upkeep.count), (1, 1))
+
+    def test_next_waits_on_priority(self):
+        self.game.start()
+        player = self.game.turn.active_player
+        player.mana_pool.red = 2
+
+        granted = defer.Deferred()
+        with mock.patch.object(player.user, "priority_granted") as priority:
+            priority.return_value = granted
+            running = self.turn.next()
+
+        self.assertIsInstance(running, defer.Deferred)
+        self.assertNotIn(("beginning", "upkeep"), self.game.timings)
+        self.assertEqual(player.mana_pool.red, 2)
+
+        granted.callback(None)
+
+        self.assertTrue(running.called)
+        self.assertEqual(self.game.timings[("beginning", "upkeep")].count, 1)
+        self.assertEqual(player.mana_pool.red, 0)
+
     def test_next(self):
         self.game.start()
         p = self.game.turn.active_player
@@ -747,3 +942,83 @@ class TestTurnManager(GameTestCase):
     def test_advance_unstarted_game(self):
         self.assertRaises(exceptions.InvalidAction, self.turn.next)
         self.assertRaises(exceptions.InvalidAction, self.turn.end)
+
+
+class TestFastForward(unittest.TestCase):
+    def setUp(self):
+        self.game = c.Game(events.EventHandler())
+        self.p1, self.p2 = (
+            self.game.add_player(user=TestingUser(), library=self.library())
+            for _ in range(2)
+        )
+
+        self.game.start()
+        self.game.turn.fast_forward = True
+        self.game.timings = timing.Timings()
+
+    def card(self, *card_types, **kwargs):
+        kwargs.setdefault("abilities", [])
+        return mock.Mock(types=set(card_types), keywords=0, **kwargs)
+
+    def library(self):
+        return [self.card(types.land) for _ in range(20)]
+
+    def advance_turn(self):
+        active = self.game.turn.active_player
+        while self.game.turn.active_player is active:
+            self.game.turn.next()
+        return {step for _, step in self.game.timings}
+
+    def test_skips_idle_steps(self):
+        self.assertEqual(
+            self.advance_turn(),
+            {"draw", "first_main", "second_main", "cleanup", "untap"},
+        )
+
+    def test_empty_hand(self):
+        for player in self.p1, self.p2:
+            player.draw = mock.Mock()
+            for card in list(player.hand):
+                player.hand.remove(card, silent=True)
+
+        self.assertEqual(self.advance_turn(), {"draw", "cleanup", "untap"})
+
+    def test_creatures(self):
+        self.game.grant_priority = mock.Mock()
+
+        active = self.game.turn.active_player
+        creature = self.card(
+            types.creature, controller=active, is_tapped=False,
+        )
+        self.game.battlefield.add(creature, silent=True)
+
+        ran = self.advance_turn()
+        self.assertIn("beginning_of_combat", ran)
+        self.assertIn("declare_attackers", ran)
+        self.assertNotIn("declare_blockers", ran)
+        self.assertNotIn("combat_damage", ran)
+        self.assertNotIn("end_of_combat", ran)
+        self.assertIsNone(self.game.combat)
+
+    def test_instant_speed_options(self):
+        self.p2.hand.add(self.card(types.instant), silent=True)
+        self.assertEqual(len(self.advance_turn()), 12)
+
+    def test_scheduled(self):
+        action = mock.Mock()
+        self.game.turn.until(action, phases.combat_damage)
+
+        self.assertIn("combat_damage", self.advance_turn())
+        action.assert_called_once_with()
+        self.assertIsNone(self.game.combat)
+
+    def test_watched(self):
+        self.game.events.subscribe(
+            lambda handler : None, event=events.STEP_BEGAN, step="upkeep",
+        )
+        self.assertEqual(len(self.advance_turn()), 12)
+
+    def test_turns_still_end(self):
+        for _ in range(10):
+            self.advance_turn()
+        self.assertEqual(self.game.turn.turns, 11)
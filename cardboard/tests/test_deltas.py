@@ -0,0 +1,249 @@
+import unittest
+
+import mock
+
+from cardboard import core, deltas, events
+from cardboard.tests.user import TestingUser
+
+
+class TestStateDeltas(unittest.TestCase):
+    def setUp(self):
+        self.game = core.Game(events.EventHandler())
+        self.alice = self.game.add_player(library=[], user=TestingUser())
+        self.bob = self.game.add_player(library=[], user=TestingUser())
+
+        self.pushed = []
+        self.deltas = deltas.StateDeltas(
+            self.game, lambda player, delta : self.pushed.append(
+                (self.deltas.players[player], delta)
+            ),
+        )
+        self.deltas.players.update({self.alice : 0, self.bob : 1})
+
+    def card(self, owner, name="Island"):
+        card = mock.Mock(owner=owner, is_face_up=True, abilities=[])
+        card.name = name
+        return card
+
+    def deltas_for(self, playerID):
+        return [delta for each, delta in self.pushed if each == playerID]
+
+    def test_life(self):
+        self.game.events.trigger(events.LIFE_LOST(self.alice, 3))
+        self.game.events.trigger(events.LIFE_GAINED(self.bob, 2))
+
+        self.assertEqual(
+            self.deltas_for(1), [
+                {"type" : "life", "player" : 0, "amount" : -3, "version" : 1},
+                {"type" : "life", "player" : 1, "amount" : 2, "version" : 2},
+            ],
+        )
+        self.assertEqual(self.deltas_for(0), self.deltas_for(1))
+        self.assertEqual(self.deltas.version, 2)
+
+    def test_mana(self):
+        self.game.events.trigger(events.MANA_ADDED("green", self.bob, 2))
+        self.game.events.trigger(events.MANA_REMOVED("green", self.bob, 1))
+
+        pushed = self.deltas_for(0)
+        self.assertEqual(
+            [(delta["color"], delta["amount"]) for delta in pushed],
+            [("green", 2), ("green", -1)],
+        )
+
+    def test_statuses(self):
+        card, other = self.card(self.alice), self.card(self.bob)
+
+        self.game.events.trigger(events.STATUS_CHANGED(card, "tapped"))
+        self.game.events.trigger(
+            events.STATUSES_CHANGED([(card, "untapped"), (other, "untapped")])
+        )
+
+        self.assertEqual(
+            self.deltas_for(0), [
+                {
+                    "type" : "status", "version" : 1,
+                    "changes" : [[0, "tapped"]],
+                },
+                {
+                    "type" : "status", "version" : 2,
+                    "changes" : [[0, "untapped"], [1, "untapped"]],
+                },
+            ],
+        )
+
+    def test_move(self):
+        card = self.card(self.alice, name="Grizzly Bears")
+
+        self.game.events.trigger(events.LEFT_ZONE(card, self.alice.hand))
+        self.game.events.trigger(
+            events.ENTERED_ZONE(card, self.game.battlefield)
+        )
+
+        expected = {
+            "type" : "move", "card" : 0, "name" : "Grizzly Bears",
+            "from" : ["hand", 0], "to" : ["battlefield", None], "version" : 1,
+        }
+        self.assertEqual(self.deltas_for(0), [expected])
+        self.assertEqual(self.deltas_for(1), [expected])
+
+    def test_move_hidden(self):
+        card = self.card(self.alice, name="Grizzly Bears")
+
+        self.game.events.trigger(events.LEFT_ZONE(card, self.alice.library))
+        self.game.events.trigger(events.ENTERED_ZONE(card, self.alice.hand))
+
+        delta, = self.deltas_for(0)
+        self.assertEqual((delta["card"], delta["name"]), (0, "Grizzly Bears"))
+
+        delta, = self.deltas_for(1)
+        self.assertEqual(
+            delta, {
+                "type" : "move", "card" : None, "name" : None,
+                "from" : ["library", 0], "to" : ["hand", 0], "version" : 1,
+            },
+        )
+
+    def test_move_face_down(self):
+        card = self.card(self.bob)
+        card.is_face_up = False
+
+        self.game.events.trigger(
+            events.ENTERED_ZONE(card, self.game.battlefield)
+        )
+
+        delta, = self.deltas_for(0)
+        self.assertEqual((delta["card"], delta["name"]), (0, None))
+
+    def test_broadcast(self):
+        broadcast = []
+        self.deltas.broadcast = broadcast.append
+
+        card = self.card(self.alice, name="Grizzly Bears")
+        self.game.events.trigger(events.LEFT_ZONE(card, self.alice.library))
+        self.game.events.trigger(events.ENTERED_ZONE(card, self.alice.hand))
+        self.game.events.trigger(events.LIFE_LOST(self.alice, 3))
+
+        self.assertEqual(
+            broadcast, [
+                {
+                    "type" : "move", "card" : None, "name" : None,
+                    "from" : ["library", 0], "to" : ["hand", 0],
+                    "version" : 1,
+                },
+                {"type" : "life", "player" : 0, "amount" : -3, "version" : 2},
+            ],
+        )
+
+    def test_snapshot(self):
+        bears = self.card(self.alice, name="Grizzly Bears")
+        bears.is_tapped, bears.is_flipped = True, False
+        bears.is_face_up, bears.is_phased_in = True, True
+        self.game.battlefield.add(bears, silent=True)
+
+        island = self.card(self.alice)
+        self.alice.hand.add(island, silent=True)
+
+        self.game.events.trigger(events.LIFE_LOST(self.alice, 3))
+        self.alice._life, self.alice.mana_pool._green = 17, 2
+
+        snapshot = self.deltas.snapshot(self.bob)
+        self.assertEqual(
+            (snapshot["type"], snapshot["version"]), ("snapshot", 1),
+        )
+
+        alice, bob = snapshot["players"]
+        self.assertEqual((alice["player"], alice["life"]), (0, 17))
+        self.assertEqual(alice["mana"]["green"], 2)
+        self.assertEqual(bob["life"], 20)
+
+        zones = {
+            tuple(zone["zone"]) : zone["cards"] for zone in snapshot["zones"]
+        }
+        self.assertEqual(
+            zones[("battlefield", None)], [
+                {"card" : 0, "name" : "Grizzly Bears", "status" : ["tapped"]},
+            ],
+        )
+        self.assertEqual(
+            zones[("hand", 0)],
+            [{"card" : None, "name" : None, "status" : []}],
+        )
+        self.assertEqual(
+            self.deltas.snapshot(self.alice)["zones"][2]["cards"],
+            [{"card" : 1, "name" : "Island", "status" : []}],
+        )
+
+    def test_only_registered_players(self):
+        del self.deltas.players[self.bob]
+        self.game.events.trigger(events.LIFE_LOST(self.alice, 3))
+        self.assertEqual([each for each, _ in self.pushed], [0])
+
+    def test_released_with_game(self):
+        self.game.end()
+        self.game.events.trigger(events.LIFE_LOST(self.alice, 3))
+        self.assertEqual(self.pushed, [])
+
+
+class TestCoalesce(unittest.TestCase):
+    def test_life_and_mana(self):
+        coalesced = deltas.coalesce([
+            {"type" : "life", "player" : 0, "amount" : -3, "version" : 1},
+            {
+                "type" : "mana", "player" : 0, "color" : "red",
+                "amount" : 2, "version" : 2,
+            },
+            {"type" : "life", "player" : 1, "amount" : 1, "version" : 3},
+            {"type" : "life", "player" : 0, "amount" : 1, "version" : 4},
+            {
+                "type" : "mana", "player" : 0, "color" : "red",
+                "amount" : -2, "version" : 5,
+            },
+        ])
+
+        self.assertEqual(
+            coalesced, [
+                {
+                    "type" : "life", "player" : 0, "amount" : -2,
+                    "version" : 4, "merged" : [1],
+                },
+                {
+                    "type" : "mana", "player" : 0, "color" : "red",
+                    "amount" : 0, "version" : 5, "merged" : [2],
+                },
+                {"type" : "life", "player" : 1, "amount" : 1, "version" : 3},
+            ],
+        )
+
+    def test_statuses(self):
+        coalesced = deltas.coalesce([
+            {"type" : "status", "changes" : [[0, "tapped"]], "version" : 1},
+            {
+                "type" : "status", "version" : 2,
+                "changes" : [[1, "tapped"], [0, "phased out"]],
+            },
+            {"type" : "status", "changes" : [[0, "untapped"]], "version" : 3},
+        ])
+
+        self.assertEqual(
+            coalesced, [
+                {
+                    "type" : "status", "version" : 3, "merged" : [1, 2],
+                    "changes" : [[1, "tapped"], [0, "phased out"],
+                                 [0, "untapped"]],
+                },
+            ],
+        )
+
+    def test_moves_left_alone(self):
+        moves = [
+            {"type" : "move", "card" : 0, "version" : 1},
+            {"type" : "move", "card" : 0, "version" : 2},
+        ]
+        self.assertEqual(deltas.coalesce(moves), moves)
+
+    def test_unchanged(self):
+        delta = {"type" : "life", "player" : 0, "amount" : -3, "version" : 1}
+        coalesced, = deltas.coalesce([delta])
+        self.assertEqual(coalesced, delta)
+        self.assertIsNot(coalesced, delta)
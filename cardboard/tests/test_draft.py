@@ -0,0 +1,188 @@
+import random
+import unittest
+
+from twisted.internet import task
+import mock
+
+from cardboard import draft as d, exceptions
+
+
+def pool(commons=20, uncommons=10, rares=5, mythics=0, lands=0):
+    pool = {}
+    for rarity, n in (
+        (d.COMMON, commons), (d.UNCOMMON, uncommons), (d.RARE, rares),
+        (d.MYTHIC, mythics), (d.LAND, lands),
+    ):
+        if n:
+            pool[rarity] = tuple(
+                u"{} {}".format(rarity, i) for i in range(n)
+            )
+    return pool
+
+
+class TestRarityPools(unittest.TestCase):
+    def test_rarity_pools(self):
+        pools = d.rarity_pools([
+            (u"M11", u"Voltaic Key", u"U"),
+            (u"US", u"Voltaic Key", u"U"),
+            (u"M11", u"Llanowar Elves", u"C"),
+            (u"M11", u"Giant Growth", u"C"),
+        ])
+        self.assertEqual(
+            pools, {
+                u"M11" : {
+                    u"U" : (u"Voltaic Key",),
+                    u"C" : (u"Giant Growth", u"Llanowar Elves"),
+                },
+                u"US" : {u"U" : (u"Voltaic Key",)},
+            },
+        )
+
+
+class TestBooster(unittest.TestCase):
+    def test_booster(self):
+        pack = d.booster(pool(lands=5), random=random.Random(0))
+
+        self.assertEqual(len(pack), 15)
+        self.assertEqual(len(set(pack)), 15)
+        self.assertEqual(
+            sorted(card[0] for card in pack),
+            sorted(u"CCCCCCCCCCLRUUU"),
+        )
+
+    def test_missing_rarities_filled_with_commons(self):
+        pack = d.booster(pool(rares=0), random=random.Random(0))
+        self.assertEqual(
+            sorted(card[0] for card in pack), sorted(u"CCCCCCCCCCCCUUU"),
+        )
+
+    def test_mythics(self):
+        rng = mock.Mock(random=lambda : 0, sample=random.sample)
+        pack = d.booster(pool(mythics=2), random=rng)
+        self.assertIn(u"M", [card[0] for card in pack])
+
+        rng.random = lambda : 0.5
+        pack = d.booster(pool(mythics=2), random=rng)
+        self.assertNotIn(u"M", [card[0] for card in pack])
+
+    def test_small_pool(self):
+        pack = d.booster(pool(commons=2, uncommons=0, rares=0))
+        self.assertEqual(sorted(pack), [u"C 0", u"C 1"])
+
+
+class TestDraft(unittest.TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.offer = mock.Mock()
+        self.picked = mock.Mock()
+        self.ended = mock.Mock()
+        self.pools = {u"A" : pool(), u"B" : pool(lands=3)}
+        self.draft = d.Draft(
+            self.pools, [u"A", u"B", u"A"], seats=3, timeout=30,
+            offer=self.offer, picked=self.picked, ended=self.ended,
+            clock=self.clock, random=random.Random(0),
+        )
+
+    def join(self, n=3):
+        return [self.draft.join(u"Drafter {}".format(i)) for i in range(n)]
+
+    def test_unknown_set(self):
+        with self.assertRaises(exceptions.InvalidAction):
+            d.Draft(self.pools, [u"C"])
+
+    def test_join(self):
+        drafters = self.join()
+        self.assertEqual(self.draft.drafters, drafters)
+
+        with self.assertRaises(exceptions.InvalidAction):
+            self.draft.join(u"Too Many")
+
+    def test_start(self):
+        first, second = self.join(2)
+        self.draft.start()
+
+        self.assertEqual((self.draft.state, self.draft.round), ("drafting", 1))
+        for drafter in first, second:
+            self.assertEqual(len(drafter.pack), 15)
+        self.assertEqual(self.offer.call_count, 2)
+
+        with self.assertRaises(exceptions.InvalidAction):
+            self.draft.join(u"Late")
+        with self.assertRaises(exceptions.InvalidAction):
+            self.draft.start()
+
+    def test_start_alone(self):
+        self.join(1)
+        with self.assertRaises(exceptions.InvalidAction):
+            self.draft.start()
+
+    def test_pick_and_pass(self):
+        first, second, third = self.join()
+        self.draft.start()
+
+        pack = list(first.pack)
+        self.draft.pick(first, pack[0])
+
+        self.assertEqual(first.picks, [pack[0]])
+        self.assertEqual(list(second.packs[1]), pack[1:])
+        self.assertEqual(len(first.packs), 0)
+
+    def test_passes_right_in_the_second_round(self):
+        first, second, third = self.join()
+        self.draft.round = 2
+        self.assertIs(self.draft.neighbor(first), third)
+        self.draft.round = 1
+        self.assertIs(self.draft.neighbor(first), second)
+
+    def test_bad_pick(self):
+        first, _, _ = self.join()
+        self.draft.start()
+
+        with self.assertRaises(exceptions.BadSelection):
+            self.draft.pick(first, u"Black Lotus")
+
+    def test_pick_without_a_pack(self):
+        first, _, _ = self.join()
+        self.draft.start()
+        self.draft.pick(first, first.pack[0])
+
+        with self.assertRaises(exceptions.InvalidAction):
+            self.draft.pick(first, u"C 0")
+
+    def test_timeout(self):
+        first, second, third = self.join()
+        self.draft.start()
+
+        self.clock.advance(29)
+        self.assertEqual(first.picks, [])
+
+        self.clock.advance(1)
+        for drafter in first, second, third:
+            self.assertEqual(len(drafter.picks), 1)
+            self.picked.assert_any_call(drafter, drafter.picks[0])
+        self.assertEqual(self.picked.call_count, 3)
+
+    def test_whole_draft(self):
+        drafters = self.join()
+        self.draft.start()
+
+        while self.draft.state == "drafting":
+            self.clock.advance(30)
+
+        for drafter in drafters:
+            self.assertEqual(len(drafter.picks), 3 * 15)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        self.ended.assert_called_once_with(self.draft)
+
+    def test_end(self):
+        drafters = self.join()
+        self.draft.start()
+        self.draft.end()
+
+        self.assertEqual(self.draft.state, "ended")
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        with self.assertRaises(exceptions.InvalidAction):
+            self.draft.pick(drafters[0], u"C 0")
+
+        self.draft.end()
+        self.ended.assert_called_once_with(self.draft)
@@ -0,0 +1,538 @@
+import unittest
+
+from twisted.internet import defer
+import mock
+
+from cardboard import ability, core, effects as e, events, exceptions
+from cardboard.card import Card
+from cardboard.cards import keywords
+from cardboard.tests.util import GameTestCase
+
+
+class TestReplacements(GameTestCase):
+    def setUp(self):
+        super(TestReplacements, self).setUp()
+        self.replacements = self.game.replacements
+
+    def test_no_effects(self):
+        payload = events.DRAW(self.p1)
+        self.assertIs(self.replacements.replace(payload), payload)
+
+    def test_add_remove(self):
+        effect = e.ReplacementEffect(events.DRAW, mock.Mock())
+
+        self.replacements.add(effect)
+        self.assertIn(effect, self.replacements)
+        self.assertEqual(list(self.replacements), [effect])
+
+        self.replacements.remove(effect)
+        self.assertNotIn(effect, self.replacements)
+        self.assertEqual(len(self.replacements), 0)
+
+        with self.assertRaises(exceptions.NoSuchObject):
+            self.replacements.remove(effect)
+
+    def test_timestamps(self):
+        first = self.replacements.add(e.ReplacementEffect(events.DRAW, id))
+        second = self.replacements.add(e.ReplacementEffect(events.DRAW, id))
+        self.assertLess(first.timestamp, second.timestamp)
+
+    def test_affected(self):
+        replace = mock.Mock(return_value=None)
+        effect = e.ReplacementEffect(events.DRAW, replace, affected=self.p1)
+        self.replacements.add(effect)
+
+        payload = events.DRAW(self.p2)
+        self.assertIs(self.replacements.replace(payload), payload)
+        self.assertFalse(replace.called)
+
+        payload = events.DRAW(self.p1)
+        self.assertIsNone(self.replacements.replace(payload))
+        replace.assert_called_once_with(payload)
+
+    def test_applies(self):
+        replace = mock.Mock(return_value=None)
+        self.replacements.add(
+            e.ReplacementEffect(
+                events.LIFE_LOST, replace,
+                applies=lambda payload : payload.amount > 2,
+            )
+        )
+
+        payload = events.LIFE_LOST(self.p1, 2)
+        self.assertIs(self.replacements.replace(payload), payload)
+
+        self.assertIsNone(
+            self.replacements.replace(events.LIFE_LOST(self.p1, 3))
+        )
+
+    def test_applied_once_per_event(self):
+        replace = mock.Mock(side_effect=lambda payload : payload)
+        self.replacements.add(e.ReplacementEffect(events.DRAW, replace))
+
+        self.replacements.replace(events.DRAW(self.p1))
+        self.assertEqual(replace.call_count, 1)
+
+        self.replacements.replace(events.DRAW(self.p1))
+        self.assertEqual(replace.call_count, 2)
+
+    def test_once(self):
+        effect = e.ReplacementEffect(events.DRAW, lambda p : None, once=True)
+        self.replacements.add(effect)
+
+        self.assertIsNone(self.replacements.replace(events.DRAW(self.p1)))
+        self.assertNotIn(effect, self.replacements)
+
+    def test_affected_player_chooses(self):
+        """
+        The affected player chooses which effect applies first.
+
+        .. seealso::
+            :ref:`interaction-replacement`
+
+        """
+
+        order = []
+
+        def replacement(name):
+            def replace(payload):
+                order.append(name)
+                return payload
+            return e.ReplacementEffect(events.DRAW, replace, description=name)
+
+        first = self.replacements.add(replacement("first"))
+        second = self.replacements.add(replacement("second"))
+
+        with self.p1.user.select.will_return(second):
+            self.replacements.replace(events.DRAW(self.p1))
+
+        # once the second applied, only the first was left to apply
+        self.assertEqual(order, ["second", "first"])
+        self.assertEqual(list(self.replacements), [first, second])
+
+        with self.p1.user.select.will_return(object()):
+            with self.assertRaises(exceptions.BadSelection):
+                self.replacements.replace(events.DRAW(self.p1))
+
+    def test_waits_for_choice(self):
+        order = []
+
+        def replacement(name):
+            def replace(payload):
+                order.append(name)
+                return payload
+            return e.ReplacementEffect(events.DRAW, replace, description=name)
+
+        self.replacements.add(replacement("first"))
+        second = self.replacements.add(replacement("second"))
+
+        payload = events.DRAW(self.p1)
+        selecting = defer.Deferred()
+        with mock.patch.object(
+            self.p1.user, "select", return_value=selecting,
+        ):
+            replacing = self.replacements.replace(payload)
+
+        replaced = []
+        replacing.addCallback(replaced.append)
+        self.assertEqual(order, [])
+
+        selecting.callback([second])
+        self.assertEqual(order, ["second", "first"])
+        self.assertEqual(replaced, [payload])
+
+    def test_self_replacement_first(self):
+        order = []
+
+        def replacement(name, **kwargs):
+            def replace(payload):
+                order.append(name)
+                return payload
+            return e.ReplacementEffect(events.DRAW, replace, **kwargs)
+
+        self.replacements.add(replacement("other"))
+        self.replacements.add(replacement("self", self_replacement=True))
+
+        self.replacements.replace(events.DRAW(self.p1))
+        self.assertEqual(order, ["self", "other"])
+
+    def test_prevention(self):
+        self.replacements.add(e.prevention(events.LIFE_LOST, self.p1, 3))
+
+        payload = self.replacements.replace(events.LIFE_LOST(self.p1, 2))
+        self.assertIsNone(payload)
+
+        payload = self.replacements.replace(events.LIFE_LOST(self.p1, 5))
+        self.assertEqual(payload.amount, 4)
+
+        self.assertEqual(len(self.replacements), 0)
+
+    def test_prevent_all(self):
+        effect = e.prevention(events.LIFE_LOST, self.p1)
+        self.replacements.add(effect)
+
+        for _ in range(3):
+            payload = self.replacements.replace(events.LIFE_LOST(self.p1, 5))
+            self.assertIsNone(payload)
+
+        self.assertIn(effect, self.replacements)
+
+
+class TestReplacedActions(GameTestCase):
+    def test_draw(self):
+        self.game.start()
+        self.game.replacements.add(
+            e.ReplacementEffect(events.DRAW, lambda p : None, once=True)
+        )
+
+        hand = len(self.p1.hand)
+        self.resetEvents()
+        self.p1.draw(2)
+
+        self.assertEqual(len(self.p1.hand), hand + 1)
+
+        draws = [
+            payload for (payload,), _ in self.events.trigger.call_args_list
+            if payload.event == events.DRAW
+        ]
+        self.assertEqual(len(draws), 1)
+
+    def test_life(self):
+        self.game.start()
+        self.game.replacements.add(
+            e.prevention(events.LIFE_LOST, self.p1, amount=3)
+        )
+
+        self.p1.life -= 2
+        self.assertEqual(self.p1.life, 20)
+
+        with self.assertTriggers(
+            event=events.LIFE_LOST, player=self.p1, amount=4,
+        ):
+            self.p1.life -= 5
+
+        self.assertEqual(self.p1.life, 16)
+
+    def test_zone_change(self):
+        self.game.start()
+        card = mock.Mock(spec=Card, owner=self.p1, zone=self.p1.hand)
+        self.p1.hand.add(card, silent=True)
+
+        def exile_instead(payload):
+            payload.zone = payload.card.owner.exile
+            return payload
+
+        self.game.replacements.add(
+            e.ReplacementEffect(
+                events.ENTERED_ZONE, exile_instead,
+                applies=lambda payload : payload.zone.name == "graveyard",
+            )
+        )
+
+        self.p1.graveyard.move(card)
+
+        self.assertIn(card, self.p1.exile)
+        self.assertNotIn(card, self.p1.graveyard)
+        self.assertNotIn(card, self.p1.hand)
+
+    def test_zone_change_waits_for_choice(self):
+        self.game.start()
+        card = mock.Mock(spec=Card, owner=self.p1, zone=self.p1.hand)
+        self.p1.hand.add(card, silent=True)
+
+        def to(name):
+            def instead(payload):
+                payload.zone = getattr(payload.card.owner, name)
+                return payload
+            return e.ReplacementEffect(
+                events.ENTERED_ZONE, instead,
+                applies=lambda payload : payload.zone.name == "graveyard",
+            )
+
+        self.game.replacements.add(to("exile"))
+        library = self.game.replacements.add(to("library"))
+
+        selecting = defer.Deferred()
+        with mock.patch.object(
+            self.p1.user, "select", return_value=selecting,
+        ):
+            moving = self.p1.graveyard.move(card)
+
+        self.assertIn(card, self.p1.hand)
+
+        selecting.callback([library])
+        self.assertTrue(moving.called)
+        self.assertIn(card, self.p1.library)
+        self.assertNotIn(card, self.p1.hand)
+
+
+class TestContinuousEffects(unittest.TestCase):
+    def setUp(self):
+        self.game = core.Game(events.EventHandler())
+        self.continuous = self.game.continuous
+
+    def creature(self, power=2, toughness=2, abilities=()):
+        return mock.Mock(
+            power=power, toughness=toughness, types={"Creature"},
+            abilities=list(abilities),
+        )
+
+    def anthem(self, **kwargs):
+        def apply(creature, characteristics):
+            characteristics["power"] += 1
+            characteristics["toughness"] += 1
+        return e.ContinuousEffect(apply, layer=e.PT_MODIFYING, **kwargs)
+
+    def test_no_effects(self):
+        creature = self.creature()
+        self.game.battlefield.add(creature)
+
+        self.assertEqual(self.continuous.get(creature, "power"), 2)
+        self.assertEqual(self.continuous.get(creature, "types"), {"Creature"})
+
+    def test_add_remove(self):
+        creature = self.creature()
+        self.game.battlefield.add(creature)
+
+        effect = self.continuous.add(self.anthem())
+        self.assertIn(effect, self.continuous)
+        self.assertEqual(self.continuous.get(creature, "power"), 3)
+        self.assertEqual(creature.power, 2)
+
+        self.continuous.remove(effect)
+        self.assertNotIn(effect, self.continuous)
+        self.assertEqual(self.continuous.get(creature, "power"), 2)
+
+        with self.assertRaises(exceptions.NoSuchObject):
+            self.continuous.remove(effect)
+
+    def test_only_applies_in_scope(self):
+        creature = self.creature()
+        self.continuous.add(self.anthem())
+        self.assertEqual(self.continuous.get(creature, "power"), 2)
+
+    def test_cached(self):
+        creature = self.creature()
+        self.game.battlefield.add(creature)
+
+        apply = mock.Mock()
+        self.continuous.add(e.ContinuousEffect(apply, layer=e.TYPE))
+
+        self.continuous.characteristics(creature)
+        self.continuous.characteristics(creature)
+        self.assertEqual(apply.call_count, 1)
+
+        # an unrelated object changing doesn't cause a recalculation
+        self.continuous.changed(object())
+        self.continuous.characteristics(creature)
+        self.assertEqual(apply.call_count, 1)
+
+        self.continuous.changed(creature)
+        self.continuous.characteristics(creature)
+        self.assertEqual(apply.call_count, 2)
+
+    def test_affects(self):
+        """
+        An effect affecting particular objects only applies to (and only
+        invalidates) them.
+
+        """
+
+        creature, other = self.creature(), self.creature()
+        self.game.battlefield.update([creature, other])
+
+        apply = mock.Mock()
+        self.continuous.add(e.ContinuousEffect(apply, layer=e.TYPE))
+        self.continuous.characteristics(other)
+        self.assertEqual(apply.call_count, 1)
+
+        effect = self.continuous.add(self.anthem(affects=[creature]))
+        self.assertEqual(self.continuous.get(creature, "power"), 3)
+        self.assertEqual(self.continuous.get(other, "power"), 2)
+        self.assertEqual(apply.call_count, 2)
+
+        self.continuous.remove(effect)
+        self.assertEqual(self.continuous.get(creature, "power"), 2)
+        self.assertEqual(apply.call_count, 3)
+
+    def test_affects_only_in_scope(self):
+        creature = self.creature()
+        self.continuous.add(self.anthem(affects=[creature]))
+        self.assertEqual(self.continuous.get(creature, "power"), 2)
+
+        self.game.battlefield.add(creature)
+        self.assertEqual(self.continuous.get(creature, "power"), 3)
+
+    def test_other_scopes_not_walked(self):
+        creature = self.creature()
+        self.game.battlefield.add(creature)
+
+        apply = mock.Mock()
+        self.continuous.add(
+            e.ContinuousEffect(apply, layer=e.TYPE, scope=self.game.stack),
+        )
+
+        self.continuous.characteristics(creature)
+        self.assertFalse(apply.called)
+
+    def test_layer_order(self):
+        """
+        Effects in earlier layers apply first, regardless of timestamp.
+
+        .. seealso::
+            :ref:`interaction-continuous`
+
+        """
+
+        creature = self.creature()
+        self.game.battlefield.add(creature)
+
+        def set_base(creature, characteristics):
+            characteristics["power"] = characteristics["toughness"] = 0
+
+        self.continuous.add(self.anthem())
+        self.continuous.add(e.ContinuousEffect(set_base, layer=e.PT_SETTING))
+
+        self.assertEqual(self.continuous.get(creature, "power"), 1)
+
+    def test_timestamp_order(self):
+        creature = self.creature()
+        self.game.battlefield.add(creature)
+
+        def setter(power):
+            def set_power(creature, characteristics):
+                characteristics["power"] = power
+            return e.ContinuousEffect(set_power, layer=e.PT_SETTING)
+
+        self.continuous.add(setter(5))
+        self.continuous.add(setter(1))
+
+        self.assertEqual(self.continuous.get(creature, "power"), 1)
+
+    def test_dependencies(self):
+        """
+        Effects that depend on a zone are reapplied when it changes.
+
+        """
+
+        battlefield = self.game.battlefield
+
+        def apply(creature, characteristics):
+            characteristics["power"] += len(battlefield)
+
+        creature = self.creature(power=0)
+        battlefield.add(creature)
+        self.continuous.add(
+            e.ContinuousEffect(
+                apply, layer=e.PT_MODIFYING, reads=[battlefield],
+            )
+        )
+
+        self.assertEqual(self.continuous.get(creature, "power"), 1)
+        battlefield.add(self.creature())
+        self.assertEqual(self.continuous.get(creature, "power"), 2)
+
+    def test_keywords(self):
+        flying, reach = keywords.mask(u"Flying"), keywords.mask(u"Reach")
+
+        creature = self.creature()
+        creature.keywords = flying
+        self.game.battlefield.add(creature)
+
+        self.assertTrue(self.continuous.has_keywords(creature, flying))
+        self.assertFalse(self.continuous.has_keywords(creature, reach))
+
+        granted = self.continuous.add(e.grant_keywords(reach))
+        removed = self.continuous.add(e.remove_keywords(flying))
+
+        self.assertTrue(self.continuous.has_keywords(creature, reach))
+        self.assertFalse(self.continuous.has_keywords(creature, flying))
+        self.assertEqual(creature.keywords, flying)
+
+        self.continuous.remove(granted)
+        self.continuous.remove(removed)
+        self.assertEqual(self.continuous.get(creature, "keywords"), flying)
+
+    def test_static_abilities(self):
+        """
+        The static abilities of permanents generate effects while they are on
+        the battlefield.
+
+        """
+
+        anthem = ability.Ability(
+            action=self.anthem, description="+1/+1", type="static",
+        )
+        source = self.creature(abilities=[anthem])
+        creature = self.creature()
+
+        self.game.battlefield.add(creature)
+        self.assertEqual(self.continuous.get(creature, "power"), 2)
+
+        self.game.battlefield.add(source)
+        self.assertEqual(self.continuous.get(creature, "power"), 3)
+        self.assertEqual(self.continuous.get(source, "power"), 3)
+
+        effect, = self.continuous
+        self.assertIs(effect.source, source)
+
+        self.game.battlefield.remove(source)
+        self.assertEqual(self.continuous.get(creature, "power"), 2)
+        self.assertEqual(len(self.continuous), 0)
+
+    def test_doesnt_untap_left_battlefield(self):
+        creature = self.creature()
+        self.game.battlefield.add(creature)
+        self.continuous.doesnt_untap.add(creature, owner=mock.Mock())
+
+        self.game.battlefield.remove(creature)
+        self.assertNotIn(creature, self.continuous.doesnt_untap)
+
+    def test_doesnt_untap_effect_ends(self):
+        creature = self.creature()
+        self.game.battlefield.add(creature)
+
+        effect = self.continuous.add(self.anthem())
+        other = self.continuous.add(self.anthem())
+        doesnt_untap = self.continuous.doesnt_untap
+        doesnt_untap.add(creature, owner=effect)
+        doesnt_untap.add(creature, owner=other)
+
+        self.continuous.remove(effect)
+        self.assertIn(creature, doesnt_untap)
+
+        self.continuous.remove(other)
+        self.assertNotIn(creature, doesnt_untap)
+        self.assertFalse(doesnt_untap)
+
+    def test_doesnt_untap_source_removed(self):
+        creature, source = self.creature(), self.creature()
+        self.game.battlefield.update([creature, source])
+        self.continuous.doesnt_untap.add(creature, owner=source)
+
+        self.game.battlefield.remove(source)
+        self.assertNotIn(creature, self.continuous.doesnt_untap)
+
+    def test_doesnt_untap_remove(self):
+        creature, owner = self.creature(), mock.Mock()
+        doesnt_untap = self.continuous.doesnt_untap
+
+        doesnt_untap.add(creature, owner)
+        with self.assertRaises(exceptions.NoSuchObject):
+            doesnt_untap.remove(creature, owner=mock.Mock())
+
+        doesnt_untap.remove(creature, owner)
+        self.assertNotIn(creature, doesnt_untap)
+        with self.assertRaises(exceptions.NoSuchObject):
+            doesnt_untap.remove(creature, owner)
+
+    def test_statuses_changed(self):
+        creature = self.creature()
+        self.game.battlefield.add(creature)
+        self.assertEqual(self.continuous.get(creature, "power"), 2)
+
+        creature.power = 5
+        self.game.events.trigger(
+            events.STATUSES_CHANGED([(creature, events.TAPPED)])
+        )
+        self.assertEqual(self.continuous.get(creature, "power"), 5)
@@ -0,0 +1,77 @@
+import json
+
+from twisted.trial import unittest
+
+from cardboard import encoding
+
+
+class TestKeys(unittest.TestCase):
+    def test_shrink(self):
+        shrunk = encoding.shrink({
+            "jsonrpc" : "2.0", "unknown" : [{"life" : 20}], "id" : 1,
+        })
+        self.assertEqual(
+            shrunk, {
+                encoding.KEYS.index("jsonrpc") : "2.0",
+                "unknown" : [{encoding.KEYS.index("life") : 20}],
+                encoding.KEYS.index("id") : 1,
+            },
+        )
+
+    def test_round_trip(self):
+        message = {
+            "jsonrpc" : "2.0", "method" : "stateChanged",
+            "params" : {
+                "type" : "move", "card" : 3, "from" : ["hand", 0],
+                "to" : ["battlefield", None], "version" : 12,
+            },
+            "other" : (1, 2),
+        }
+        expanded = encoding.expand(encoding.shrink(message))
+        self.assertEqual(expanded, dict(message, other=[1, 2]))
+
+    def test_round_trip_integer_keys(self):
+        """
+        Maps keyed by IDs come back keyed by them as strings (as they would
+        from JSON), rather than being mistaken for field names.
+
+        """
+
+        message = {
+            "jsonrpc" : "2.0", "method" : "selectBlocks",
+            "params" : {"legal" : {0 : [1, 2], 7 : [3], 1000 : [4]}},
+        }
+        expanded = encoding.expand(encoding.shrink(message))
+        self.assertEqual(expanded, json.loads(json.dumps(message)))
+        self.assertEqual(
+            expanded["params"]["legal"],
+            {u"0" : [1, 2], u"7" : [3], u"1000" : [4]},
+        )
+
+    def test_expand_unknown_field(self):
+        with self.assertRaises(ValueError):
+            encoding.expand({len(encoding.KEYS) : 1})
+
+    def test_keys_unique(self):
+        self.assertEqual(len(set(encoding.KEYS)), len(encoding.KEYS))
+
+
+class TestJSON(unittest.TestCase):
+    def test_round_trip(self):
+        message = {"jsonrpc" : "2.0", "id" : 1, "result" : {"life" : 20}}
+        dumped = encoding.JSON.dumps(message)
+        self.assertEqual(encoding.JSON.loads(dumped), message)
+
+
+class TestCompact(unittest.TestCase):
+    if encoding.msgpack is None:
+        skip = "msgpack is not installed."
+
+    def test_round_trip(self):
+        message = {"jsonrpc" : "2.0", "id" : 1, "result" : {"life" : 20}}
+        dumped = encoding.Compact.dumps(message)
+        self.assertEqual(encoding.Compact.loads(dumped), message)
+        self.assertLess(len(dumped), len(encoding.JSON.dumps(message)))
+
+    def test_available(self):
+        self.assertIs(encoding.ENCODINGS["compact"], encoding.Compact)
@@ -0,0 +1,274 @@
+import unittest
+
+import mock
+
+from cardboard import events
+
+
+class TestEvent(unittest.TestCase):
+    def test_codes_are_unique_and_small(self):
+        codes = [event.code for event in events.Event._by_code]
+        self.assertEqual(codes, range(len(codes)))
+
+    def test_compares_to_name(self):
+        self.assertEqual(events.ENTERED_ZONE, "entered zone")
+        self.assertEqual("entered zone", events.ENTERED_ZONE)
+        self.assertNotEqual(events.ENTERED_ZONE, "left zone")
+        self.assertNotEqual(events.ENTERED_ZONE, events.LEFT_ZONE)
+
+        self.assertEqual(hash(events.DRAW), hash("draw"))
+        self.assertEqual({"draw" : 1}[events.DRAW], 1)
+        self.assertEqual(str(events.DRAW), "draw")
+
+    def test_lookup(self):
+        self.assertIs(events.Event.lookup("draw"), events.DRAW)
+        self.assertIs(events.Event.lookup(events.DRAW.code), events.DRAW)
+        self.assertIs(events.Event.lookup(events.DRAW), events.DRAW)
+
+        with self.assertRaises(LookupError):
+            events.Event.lookup("not an event")
+
+        with self.assertRaises(LookupError):
+            events.Event.lookup(len(events.Event._by_code))
+
+
+class TestPayload(unittest.TestCase):
+    def test_payload(self):
+        card, zone = object(), object()
+        payload = events.ENTERED_ZONE(card, zone)
+
+        self.assertIs(payload.event, events.ENTERED_ZONE)
+        self.assertIs(payload.card, card)
+        self.assertIs(payload.zone, zone)
+
+        self.assertEqual(
+            payload.as_dict(),
+            {"event" : events.ENTERED_ZONE, "card" : card, "zone" : zone},
+        )
+
+    def test_keyword_parameters(self):
+        player = object()
+        payload = events.LIFE_LOST(player, amount=3)
+        self.assertEqual(
+            payload.as_dict(),
+            {"event" : events.LIFE_LOST, "player" : player, "amount" : 3},
+        )
+
+    def test_is_slotted(self):
+        payload = events.DRAW(object())
+        self.assertFalse(hasattr(payload, "__dict__"))
+
+        with self.assertRaises(AttributeError):
+            payload.foo = 12
+
+    def test_too_many_parameters(self):
+        with self.assertRaises(TypeError):
+            events.DRAW(1, 2)
+
+    def test_mapping_interface(self):
+        payload = events.DRAW(12)
+
+        self.assertIn("event", payload)
+        self.assertIn("player", payload)
+        self.assertNotIn("card", payload)
+
+        self.assertEqual(payload["player"], 12)
+        with self.assertRaises(KeyError):
+            payload["card"]
+
+
+class TestEventHandler(unittest.TestCase):
+    def setUp(self):
+        self.handler = events.EventHandler()
+
+    def test_payloads(self):
+        on_draw = mock.Mock(return_value=None)
+        self.handler.subscribe(on_draw, event=events.DRAW, needs=["player"])
+
+        self.handler.trigger(events.DRAW(12))
+        on_draw.assert_called_once_with(self.handler, player=12)
+
+        self.handler.trigger(events.LIFE_LOST(12, 3))
+        self.assertEqual(on_draw.call_count, 1)
+
+    def test_keywords(self):
+        on_draw = mock.Mock(return_value=None)
+        self.handler.subscribe(on_draw, event=events.DRAW, needs=["player"])
+
+        self.handler.trigger(event=events.DRAW, player=12)
+        on_draw.assert_called_once_with(self.handler, player=12)
+
+        with self.assertRaises(ValueError):
+            self.handler.trigger()
+
+    def test_string_subscriptions(self):
+        on_draw = mock.Mock(return_value=None)
+        self.handler.subscribe(on_draw, event="draw")
+
+        self.handler.trigger(events.DRAW(12))
+        on_draw.assert_called_once_with(self.handler)
+
+    def test_conditions(self):
+        on_draw = mock.Mock(return_value=None)
+        self.handler.subscribe(on_draw, event=events.DRAW, player=1)
+
+        self.handler.trigger(events.DRAW(2))
+        self.assertFalse(on_draw.called)
+
+        self.handler.trigger(events.DRAW(1))
+        self.assertTrue(on_draw.called)
+
+    def test_unconditional_subscribers_hear_everything(self):
+        heard = []
+        self.handler.subscribe(
+            lambda handler, player : heard.append(player), needs=["player"]
+        )
+
+        self.handler.trigger(events.DRAW(1))
+        self.handler.trigger(events.LIFE_GAINED(2, 3))
+        self.handler.trigger(events.GAME_BEGAN(4))
+
+        self.assertEqual(heard, [1, 2])
+
+    def test_order_is_preserved(self):
+        heard = []
+        self.handler.subscribe(lambda h : heard.append(1), event=events.DRAW)
+        self.handler.trigger(events.DRAW(0))
+        self.handler.subscribe(
+            lambda h, player : heard.append(2), needs=["player"],
+        )
+        self.handler.subscribe(lambda h : heard.append(3), event="draw")
+
+        del heard[:]
+        self.handler.trigger(events.DRAW(0))
+        self.assertEqual(heard, [1, 2, 3])
+
+    def test_returns(self):
+        self.handler.subscribe(
+            lambda handler, amount : {"amount" : amount * 2},
+            event=events.LIFE_GAINED, modifies=["amount"],
+        )
+
+        payload = events.LIFE_GAINED(None, 3)
+        self.handler.trigger(payload)
+        self.assertEqual(payload.amount, 6)
+
+
+class TestSubscriptionLifecycle(unittest.TestCase):
+    def setUp(self):
+        self.handler = events.EventHandler()
+
+    def test_unsubscribe(self):
+        on_draw = mock.Mock(return_value=None)
+        self.handler.subscribe(on_draw, event=events.DRAW)
+        self.handler.unsubscribe(on_draw)
+
+        self.handler.trigger(events.DRAW(1))
+        self.assertFalse(on_draw.called)
+
+    def test_unsubscribe_owner(self):
+        owner = mock.Mock(**{"on_draw.return_value" : None})
+        other = mock.Mock(**{"on_draw.return_value" : None})
+        self.handler.subscribe(owner.on_draw, owner=owner, event=events.DRAW)
+        self.handler.subscribe(other.on_draw, owner=other, event=events.DRAW)
+
+        self.handler.unsubscribe(owner=owner)
+        self.handler.trigger(events.DRAW(1))
+
+        self.assertFalse(owner.on_draw.called)
+        self.assertTrue(other.on_draw.called)
+
+    def test_owned_methods_are_weak(self):
+        heard = []
+
+        class Owner(object):
+            def on_draw(self, handler):
+                heard.append(self)
+
+        owner = Owner()
+        self.handler.subscribe(owner.on_draw, owner=owner, event=events.DRAW)
+
+        self.handler.trigger(events.DRAW(1))
+        self.assertEqual(heard, [owner])
+
+        del heard[:], owner
+        self.handler.trigger(events.DRAW(1))
+
+        self.assertEqual(heard, [])
+        self.assertEqual(self.handler.hooks, [])
+
+    def test_unsubscribe_owned_method(self):
+        class Owner(object):
+            on_draw = mock.Mock(return_value=None)
+
+        owner = Owner()
+
+        def on_draw(handler):
+            owner.on_draw()
+
+        self.handler.subscribe(on_draw, owner=owner, event=events.DRAW)
+        self.handler.unsubscribe(on_draw)
+        self.handler.trigger(events.DRAW(1))
+        self.assertFalse(owner.on_draw.called)
+
+    def test_removed_during_trigger(self):
+        second = mock.Mock(return_value=None)
+
+        def first(handler):
+            handler.unsubscribe(second)
+
+        self.handler.subscribe(first, event=events.DRAW)
+        self.handler.subscribe(second, event=events.DRAW)
+
+        self.handler.trigger(events.DRAW(1))
+        self.assertFalse(second.called)
+
+    def test_clear(self):
+        on_draw = mock.Mock(return_value=None)
+        owner = mock.Mock(**{"on_draw.return_value" : None})
+        self.handler.subscribe(on_draw, event=events.DRAW)
+        self.handler.subscribe(owner.on_draw, owner=owner, event=events.DRAW)
+
+        self.handler.clear()
+        self.handler.trigger(events.DRAW(1))
+
+        self.assertFalse(on_draw.called)
+        self.assertFalse(owner.on_draw.called)
+
+    def test_release_on_leaving(self):
+        zone, other_zone = object(), object()
+        owners = [
+            mock.Mock(**{"on_draw.return_value" : None}) for _ in range(3)
+        ]
+        for owner in owners:
+            self.handler.subscribe(
+                owner.on_draw, owner=owner, event=events.DRAW,
+            )
+            self.handler.release_on_leaving(owner, zone)
+
+        leaving = [
+            hook for hook in self.handler.hooks
+            if hook.conditions.get("event") == events.LEFT_ZONE
+        ]
+        self.assertEqual(len(leaving), 1)
+
+        first, second, third = owners
+        self.handler.trigger(events.LEFT_ZONE(first, other_zone))
+        self.handler.trigger(events.LEFT_ZONE(second, zone))
+        self.handler.trigger(events.DRAW(1))
+
+        self.assertTrue(first.on_draw.called)
+        self.assertFalse(second.on_draw.called)
+        self.assertTrue(third.on_draw.called)
+
+    def test_release_on_leaving_after_clear(self):
+        owner = mock.Mock(**{"on_draw.return_value" : None})
+        self.handler.release_on_leaving(owner, None)
+        self.handler.clear()
+
+        self.handler.subscribe(owner.on_draw, owner=owner, event=events.DRAW)
+        self.handler.release_on_leaving(owner, None)
+        self.handler.trigger(events.LEFT_ZONE(owner, None))
+        self.handler.trigger(events.DRAW(1))
+
+        self.assertFalse(owner.on_draw.called)
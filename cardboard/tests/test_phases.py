@@ -1,8 +1,11 @@
 import unittest
 
 import mock
+from twisted.internet import defer
 
-from cardboard import events, phases as p
+from cardboard import events, exceptions, phases as p, types
+from cardboard.card import Card
+from cardboard.cards import keywords
 from cardboard.tests.util import GameTestCase
 
 
@@ -46,17 +49,15 @@ class TestPhaseMechanics(GameTestCase):
         own = [mock.Mock() for _ in range(4)]
         not_own = [mock.Mock() for _ in range(4)]
 
-        # TODO: Just double check that this is how the final implementation is
-        phasing = mock.Mock()
-        phasing.description = "Phasing"
+        phasing = keywords.mask(u"Phasing")
 
-        own[0].abilities = own[1].abilities = []
-        not_own[0].abilities = not_own[1].abilities = []
+        own[0].keywords = own[1].keywords = 0
+        not_own[0].keywords = not_own[1].keywords = 0
 
-        own[2].abilities = own[3].abilities = [phasing]
+        own[2].keywords = own[3].keywords = phasing
         own[2].is_phased_in = False
 
-        not_own[2].abilities = not_own[3].abilities = [phasing]
+        not_own[2].keywords = not_own[3].keywords = phasing
         not_own[2].is_phased_in = False
 
         for n, o in zip(own, not_own):
@@ -73,20 +74,8 @@ class TestPhaseMechanics(GameTestCase):
         # phase out, and all phased-out permanents controlled when they phased
         # out phase in
 
-        self.assertTrue(own[2].phase_in.called)
-        self.assertTrue(own[3].phase_out.called)
-
-        self.assertFalse(not_own[2].phase_in.called)
-        self.assertFalse(not_own[3].phase_out.called)
-
         # the active player determines which permanents he controls will untap
-        # Then he untaps them all simultaneously. 
-
-        for o in own:
-            o.untap.assert_called_once_with()
-
-        for o in not_own:
-            self.assertFalse(o.untap.called)
+        # Then he untaps them all simultaneously.
 
         self.assertTriggered([
             {"event" : events.STEP_BEGAN, "phase" : "beginning",
@@ -95,7 +84,65 @@ class TestPhaseMechanics(GameTestCase):
              "step" : "untap", "player" : self.game.turn.active_player},
         ])
 
-        # XXX: Normally all untap. but effects can keep some from untapping.
+        (payload,), _ = self.events.trigger.call_args_list[-2]
+        self.assertEqual(payload.event, events.STATUSES_CHANGED)
+        self.assertEqual(
+            sorted(payload.changes), sorted([
+                (own[2], events.PHASED_IN), (own[3], events.PHASED_OUT),
+                (own[0], events.UNTAPPED), (own[1], events.UNTAPPED),
+                (own[2], events.UNTAPPED),
+            ]),
+        )
+
+        self.assertIs(own[2]._is_phased_in, True)
+        self.assertIs(own[3]._is_phased_in, False)
+        for o in own[:3]:
+            self.assertIs(o._is_tapped, False)
+
+        for o in own + not_own:
+            self.assertFalse(o.untap.called)
+            self.assertFalse(o.phase_in.called)
+            self.assertFalse(o.phase_out.called)
+
+    def test_untap_doesnt_untap(self):
+        """
+        Effects can keep permanents from untapping during the untap step.
+
+        """
+
+        self.game.start()
+        player = self.game.turn.active_player
+
+        def permanent():
+            db_card = mock.Mock(
+                types={types.enchantment}, subtypes=set(), supertypes=set(),
+                abilities=[], mana_cost=u"", loyalty=None,
+                power=None, toughness=None,
+            )
+            db_card.name = u"Test Enchantment"
+
+            permanent = Card(db_card)
+            permanent.game = self.game
+            permanent.owner = permanent.controller = player
+            self.game.battlefield.add(permanent)
+            permanent.tap()
+            return permanent
+
+        untaps, doesnt_untap = permanent(), permanent()
+        self.game.continuous.doesnt_untap.add(doesnt_untap, owner=mock.Mock())
+
+        p.untap(self.game)
+
+        self.assertFalse(untaps.is_tapped)
+        self.assertTrue(doesnt_untap.is_tapped)
+
+    def test_untap_nothing(self):
+        self.game.start()
+        self.resetEvents()
+
+        p.untap(self.game)
+
+        self.assertEqual(self.events.trigger.call_count, 2)
 
     def test_upkeep(self):
         """
@@ -170,6 +217,115 @@ class TestPhaseMechanics(GameTestCase):
              "player" : self.game.turn.active_player},
         ])
 
+    def creature(self, **kwargs):
+        kwargs.setdefault("is_tapped", False)
+        kwargs.setdefault("keywords", 0)
+        return mock.Mock(types={u"Creature"}, can_attack=True, **kwargs)
+
+    def test_declare_attackers(self):
+        """
+        The active player chooses what each of their attackers attacks with
+        a single selection.
+
+        """
+
+        self.game.start()
+        self.game.combat = mock.Mock()
+        self.game.grant_priority = mock.Mock()
+
+        player = self.game.turn.active_player
+        opponent, = player.opponents
+
+        walker = mock.Mock(types={u"Planeswalker"}, controller=opponent)
+        first, second = attackers = [
+            self.creature(controller=player) for _ in range(2)
+        ]
+        self.game.battlefield.update([walker] + attackers, silent=True)
+
+        with mock.patch.object(player, "user") as user:
+            user.select_cards.return_value = attackers
+            user.select.return_value = [walker, opponent]
+            p.declare_attackers(self.game)
+
+        (targets,), kwargs = user.select.call_args
+        self.assertEqual(set(targets), {opponent, walker})
+        self.assertEqual(kwargs, {"how_many" : 2, "duplicates" : True})
+        self.assertEqual(user.select.call_count, 1)
+
+        self.game.combat.declare_attackers.assert_called_once_with(
+            {first : walker, second : opponent},
+        )
+        first.tap.assert_called_once_with()
+        second.tap.assert_called_once_with()
+
+    def test_declare_attackers_incomplete(self):
+        self.game.start()
+        self.game.combat = mock.Mock()
+
+        player = self.game.turn.active_player
+        opponent, = player.opponents
+
+        walker = mock.Mock(types={u"Planeswalker"}, controller=opponent)
+        attackers = [
+            self.creature(controller=player) for _ in range(2)
+        ]
+        self.game.battlefield.update([walker] + attackers, silent=True)
+
+        with mock.patch.object(player, "user") as user:
+            user.select_cards.return_value = attackers
+            user.select.return_value = [walker]
+            with self.assertRaises(exceptions.BadSelection):
+                p.declare_attackers(self.game)
+
+        self.assertFalse(self.game.combat.declare_attackers.called)
+
+    def test_declare_tapped_attackers(self):
+        """
+        Tapped creatures can't be declared as attackers.
+
+        """
+
+        self.game.start()
+        self.game.combat = mock.Mock()
+
+        player = self.game.turn.active_player
+        untapped = self.creature(controller=player)
+        tapped = self.creature(controller=player, is_tapped=True)
+        self.game.battlefield.update([untapped, tapped], silent=True)
+
+        with mock.patch.object(player, "user") as user:
+            user.select_cards.return_value = [tapped]
+            with self.assertRaises(exceptions.BadSelection):
+                p.declare_attackers(self.game)
+
+        (zone,), kwargs = user.select_cards.call_args
+        self.assertEqual(
+            [card for card in zone if kwargs["match"](card)], [untapped],
+        )
+        self.assertFalse(self.game.combat.declare_attackers.called)
+        self.assertFalse(tapped.tap.called)
+
+    def test_declare_attackers_vigilance(self):
+        self.game.start()
+        self.game.combat = mock.Mock()
+        self.game.grant_priority = mock.Mock()
+
+        player = self.game.turn.active_player
+        vigilant = self.creature(
+            controller=player, keywords=keywords.mask(u"Vigilance"),
+        )
+        self.game.battlefield.update([vigilant], silent=True)
+
+        with mock.patch.object(player, "user") as user:
+            user.select_cards.return_value = [vigilant]
+            p.declare_attackers(self.game)
+
+        opponent, = player.opponents
+        self.game.combat.declare_attackers.assert_called_once_with(
+            {vigilant : opponent},
+        )
+        self.assertFalse(vigilant.tap.called)
+
     def test_end(self):
         """
         The end step should perform the actions in :ref:`end-step`.
@@ -216,3 +372,38 @@ class TestPhaseMechanics(GameTestCase):
             {"event" : events.STEP_ENDED, "phase" : "ending",
              "step" : "cleanup", "player" : self.game.turn.active_player},
         ])
+
+    def test_cleanup_waits_on_selection(self):
+        """
+        A selection that isn't made right away suspends the cleanup step
+        until it is.
+
+        """
+
+        self.game.start()
+
+        player = self.game.turn.active_player
+        player.draw(3)
+
+        discard = list(player.hand)[:-7]
+        selecting = defer.Deferred()
+
+        with mock.patch.object(player.user, "select_cards") as select_cards:
+            select_cards.return_value = selecting
+            done = p.cleanup(self.game)
+
+        self.assertIsInstance(done, defer.Deferred)
+        self.assertEqual(len(player.hand), 10)
+        self.assertFalse(done.called)
+
+        selecting.callback(discard)
+
+        self.assertTrue(done.called)
+        for card in discard:
+            self.assertIn(card, player.graveyard)
+        self.assertTriggered([
+            {"event" : events.STEP_BEGAN, "phase" : "ending",
+             "step" : "cleanup", "player" : self.game.turn.active_player},
+            {"event" : events.STEP_ENDED, "phase" : "ending",
+             "step" : "cleanup", "player" : self.game.turn.active_player},
+        ])
@@ -0,0 +1,112 @@
+import mock
+
+from cardboard import phases, priority as p
+from cardboard.tests.util import GameTestCase
+
+
+class TestPassUntil(GameTestCase):
+    def setUp(self):
+        super(TestPassUntil, self).setUp()
+        self.game.start()
+        self.active, self.other = self.game.turn.order
+
+        self.game.grant_priority = mock.Mock()
+        self.game.turn.next()
+        del self.game.grant_priority
+
+    def move_to(self, phase):
+        while self.game.turn.phase != phase:
+            self.game.turn._phases.rotate(-1)
+
+    def pass_until(self, *stops):
+        return p.PassUntil(self.game, self.active, stops)
+
+    def test_unknown_stop(self):
+        with self.assertRaises(ValueError):
+            self.pass_until(u"end of turn", u"the heat death of the universe")
+
+    def test_end_of_turn(self):
+        passing = self.pass_until(u"end of turn")
+        self.assertFalse(passing.reached)
+
+        self.game.turn.end()
+        self.assertTrue(passing.reached)
+
+    def test_stack(self):
+        self.game.stack.add(mock.Mock(), silent=True)
+
+        passing = self.pass_until(u"stack")
+        self.assertFalse(passing.reached)
+
+        self.game.stack.add(mock.Mock(), silent=True)
+        self.assertTrue(passing.reached)
+
+    def test_my_main_phase(self):
+        passing = self.pass_until(u"my main phase")
+
+        self.move_to(phases.first_main)
+        self.assertTrue(passing.reached)
+
+        self.game.turn.end()
+        self.assertFalse(passing.reached)
+
+    def test_my_main_phase_not_the_current_one(self):
+        self.move_to(phases.first_main)
+
+        passing = self.pass_until(u"my main phase")
+        self.assertFalse(passing.reached)
+
+        self.move_to(phases.second_main)
+        self.assertTrue(passing.reached)
+
+    def test_opponent_casts(self):
+        passing = self.pass_until(u"opponent casts")
+
+        ability = mock.Mock(card=None, controller=self.active)
+        self.game.stack.add(ability, silent=True)
+        self.assertFalse(passing.reached)
+
+        spell = mock.Mock()
+        spell.card.controller = self.other
+        self.game.stack.add(spell, silent=True)
+        self.assertTrue(passing.reached)
+
+    def test_any_stop(self):
+        passing = self.pass_until(u"end of turn", u"opponent casts")
+        self.assertFalse(passing.reached)
+
+        spell = mock.Mock()
+        spell.card.controller = self.other
+        self.game.stack.add(spell, silent=True)
+        self.assertTrue(passing.reached)
+
+
+class TestGrantPriority(GameTestCase):
+    def setUp(self):
+        super(TestGrantPriority, self).setUp()
+        self.game.start()
+        self.player = self.game.turn.active_player
+        self.player.user = mock.Mock()
+
+    def test_passes_until_stop(self):
+        self.player.pass_until(u"stack")
+
+        self.game.grant_priority()
+        self.assertFalse(self.player.user.priority_granted.called)
+        self.assertIsNotNone(self.player.passing)
+
+        self.game.stack.add(mock.Mock(), silent=True)
+        self.game.grant_priority()
+        self.player.user.priority_granted.assert_called_once_with()
+
+        # the instruction was used up
+        self.assertIsNone(self.player.passing)
+        self.game.grant_priority()
+        self.assertEqual(self.player.user.priority_granted.call_count, 2)
+
+    def test_cancel(self):
+        self.player.pass_until(u"end of turn")
+        self.player.pass_until()
+
+        self.game.grant_priority()
+        self.player.user.priority_granted.assert_called_once_with()
@@ -0,0 +1,151 @@
+from twisted.trial import unittest
+import mock
+
+from cardboard import core, events, exceptions, registry
+
+
+class TestGameRegistry(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.archive = mock.Mock()
+        self.registry = registry.GameRegistry(
+            retention=10, archive=self.archive, clock=lambda : self.now,
+        )
+
+    def register(self):
+        return self.registry.register(core.Game(events.EventHandler()))
+
+    def test_register(self):
+        first, second = self.register(), self.register()
+        self.assertEqual((first.gameID, second.gameID), (0, 1))
+        self.assertIs(self.registry[1], second)
+        self.assertEqual(len(self.registry), 2)
+        self.assertEqual(set(self.registry), {0, 1})
+        self.assertEqual(first.state, "open")
+
+    def test_ids(self):
+        self.registry = registry.GameRegistry(ids=iter([3, 5]))
+        first, second = self.register(), self.register()
+        self.assertEqual((first.gameID, second.gameID), (3, 5))
+        self.assertEqual(set(self.registry), {3, 5})
+
+    def test_no_such_game(self):
+        with self.assertRaises(exceptions.NoSuchObject):
+            self.registry[12]
+        self.assertNotIn(12, self.registry)
+
+    def test_join(self):
+        handle = self.register()
+        player = handle.game.add_player(library=[], user=mock.Mock())
+
+        playerID = self.registry.join(handle.gameID, "auth", player)
+        self.assertEqual(playerID, 0)
+        self.assertEqual(handle.players, [("auth", player)])
+        self.assertEqual(self.registry.summaries[0]["players"], 1)
+
+    def test_states(self):
+        handle = self.register()
+        handle.game.add_player(library=[], user=mock.Mock())
+
+        handle.game.start()
+        self.assertEqual(handle.state, "running")
+        self.assertEqual(self.registry.summaries[0]["state"], "running")
+
+        self.now = 3
+        handle.game.end()
+        self.assertEqual(handle.state, "ended")
+        self.assertEqual(handle.ended_at, 3)
+
+    def test_summaries_in_changed_order(self):
+        first, second = self.register(), self.register()
+        first.game.end()
+
+        self.assertEqual(
+            list(self.registry.summaries), [second.gameID, first.gameID],
+        )
+        self.assertEqual(self.registry.summaries[0]["version"], 3)
+        self.assertEqual(self.registry.version, 3)
+
+    def test_changed_since(self):
+        first, second, third = [self.register() for _ in range(3)]
+        first.game.end()
+
+        summaries = self.registry.changed_since(0)
+        self.assertEqual(
+            [summary["gameID"] for summary in summaries],
+            [second.gameID, third.gameID, first.gameID],
+        )
+
+        summaries = self.registry.changed_since(2)
+        self.assertEqual(
+            [summary["gameID"] for summary in summaries],
+            [third.gameID, first.gameID],
+        )
+        self.assertEqual(list(self.registry.changed_since(4)), [])
+
+    def test_changed_since_compacted(self):
+        handle = self.register()
+        for _ in range(100):
+            self.registry.join(handle.gameID, "auth", mock.Mock())
+
+        self.assertLess(len(self.registry._changes), 20)
+        summary, = self.registry.changed_since(50)
+        self.assertEqual(summary["players"], 100)
+
+    def test_release(self):
+        handle = self.register()
+        game = handle.game
+        self.registry.join(0, "auth", game.add_player(library=[], user=None))
+        game.end()
+
+        self.registry.release(0)
+        self.assertEqual(handle.state, "archived")
+        self.assertIsNone(handle.game)
+        self.assertEqual(handle.players, [])
+        self.assertIsNone(handle.spectators)
+        self.assertEqual(game.events.hooks, [])
+
+        summary = self.registry.summaries[0]
+        self.assertEqual(summary["players"], 1)
+        self.archive.assert_called_once_with(summary)
+
+        with self.assertRaises(exceptions.NoSuchObject):
+            self.registry.game(0)
+        with self.assertRaises(exceptions.NoSuchObject):
+            self.registry.player(0, 0)
+
+    def test_release_not_ended(self):
+        self.register()
+        with self.assertRaises(exceptions.InvalidAction):
+            self.registry.release(0)
+
+    def test_reclaim(self):
+        first, second, third = [self.register() for _ in range(3)]
+
+        first.game.end()
+        self.now = 5
+        second.game.end()
+
+        self.now = 12
+        self.registry.reclaim()
+        self.assertEqual(
+            [first.state, second.state, third.state],
+            ["archived", "ended", "open"],
+        )
+
+        self.now = 15
+        self.registry.reclaim()
+        self.assertEqual(second.state, "archived")
+        self.assertEqual(self.archive.call_count, 2)
+
+    def test_keep(self):
+        self.registry.keep = 1
+
+        first, second = self.register(), self.register()
+        first.game.end()
+        second.game.end()
+        self.registry.release(0)
+        self.registry.release(1)
+
+        self.assertEqual(set(self.registry), {1})
+        self.assertEqual(list(self.registry.summaries), [1])
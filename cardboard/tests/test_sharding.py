@@ -0,0 +1,249 @@
+import json
+
+from twisted.internet import defer, task
+from twisted.trial import unittest
+import mock
+
+from cardboard import api, sharding
+
+
+class LoopbackRouterFactory(sharding.RouterFactory):
+    """
+    A router whose workers are controllers in this process.
+
+    """
+
+    def __init__(self, controllers):
+        sharding.RouterFactory.__init__(self, range(len(controllers)))
+        self.controllers = controllers
+        self.clock = task.Clock()
+        self.workers = {}
+
+    def connect(self, router, shard):
+        factory = api.EngineFactory(self.controllers[shard].lookupMethod)
+        worker = factory.buildProtocol(None)
+        worker.sendString = lambda string : router.workerReceived(
+            shard, string,
+        )
+        worker.connectionMade()
+        worker.notifications.clock = self.clock
+        self.workers[shard] = worker
+
+        connection = mock.Mock()
+        connection.sendString = worker.stringReceived
+        return defer.succeed(connection)
+
+
+class TestRouter(unittest.TestCase):
+    def setUp(self):
+        self.controllers = [
+            api.APIController(games=sharding.registry_for(shard, 2))
+            for shard in range(2)
+        ]
+        self.factory = LoopbackRouterFactory(self.controllers)
+        self.router = self.factory.buildProtocol(None)
+        self.router.sendString = mock.Mock()
+        self.router.connectionMade()
+
+        self.ids = iter(range(100))
+
+    def call(self, method, **params):
+        request = {
+            "jsonrpc" : "2.0", "id" : next(self.ids), "method" : method,
+            "params" : params,
+        }
+        self.router.stringReceived(json.dumps(request))
+        response = json.loads(self.router.sendString.call_args[0][0])
+        self.assertEqual(response["id"], request["id"])
+        return response["result"]
+
+    def test_shard_of(self):
+        self.assertEqual(
+            [sharding.shard_of(gameID, 3) for gameID in range(6)],
+            [0, 1, 2, 0, 1, 2],
+        )
+
+    def test_create_round_robin(self):
+        gameIDs = [self.call("Game.create")["gameID"] for _ in range(4)]
+        self.assertEqual(gameIDs, [0, 1, 2, 3])
+        self.assertEqual(
+            [sorted(controller.games) for controller in self.controllers],
+            [[0, 2], [1, 3]],
+        )
+
+    def test_routed_by_game(self):
+        for _ in range(2):
+            self.call("Game.create")
+
+        self.call("Game.join", gameID=1, name="Foo")
+        self.assertEqual(len(self.controllers[1].games[1].players), 1)
+
+        info = self.call("Player.info", gameID=1, playerID=0)
+        self.assertEqual(info["name"], "Foo")
+
+    def test_batch(self):
+        for _ in range(2):
+            self.call("Game.create")
+
+        self.router.stringReceived(json.dumps([
+            {
+                "jsonrpc" : "2.0", "id" : "a", "method" : "Game.join",
+                "params" : {"gameID" : 1, "name" : "Foo"},
+            },
+            {"jsonrpc" : "2.0", "method" : "Game.create"},
+            12,
+            {
+                "jsonrpc" : "2.0", "id" : "b", "method" : "Game.info",
+                "params" : {"gameID" : 0},
+            },
+        ]))
+
+        responses = json.loads(self.router.sendString.call_args[0][0])
+        self.assertEqual(
+            [response["id"] for response in responses], ["a", None, "b"],
+        )
+        self.assertEqual(responses[1]["error"]["code"], api.INVALID_REQUEST)
+        self.assertEqual(responses[2]["result"]["gameID"], 0)
+
+    def test_selection(self):
+        """
+        A worker's calls are relayed to the client, and its answers back to
+        the worker that made each call.
+
+        """
+
+        for _ in range(2):
+            self.call("Game.create")
+
+        first = self.factory.workers[0].callRemote(api.Select, choices=[1, 2])
+        second = self.factory.workers[1].callRemote(api.Select, choices=[3])
+
+        sent = [
+            json.loads(string)
+            for (string,), _ in self.router.sendString.call_args_list[-2:]
+        ]
+        self.assertEqual(
+            [(call["method"], call["params"]) for call in sent],
+            [("select", {"choices" : [1, 2]}), ("select", {"choices" : [3]})],
+        )
+        ids = [call["id"] for call in sent]
+        self.assertEqual(len(set(ids)), 2)
+
+        self.router.stringReceived(json.dumps(
+            {"jsonrpc" : "2.0", "id" : ids[1], "result" : [3]},
+        ))
+        self.router.stringReceived(json.dumps(
+            {"jsonrpc" : "2.0", "id" : ids[0], "result" : [2]},
+        ))
+
+        self.assertEqual(self.successResultOf(first), [2])
+        self.assertEqual(self.successResultOf(second), [3])
+        self.assertEqual(self.router.sendString.call_count, 4)
+
+    def test_selection_unknown_call(self):
+        self.router.stringReceived(json.dumps(
+            {"jsonrpc" : "2.0", "id" : 12, "result" : [3]},
+        ))
+        self.assertFalse(self.router.sendString.called)
+
+    def test_parse_error(self):
+        self.router.stringReceived('{"jsonrpc" : "2.0", "id" : 1, "meth')
+        response = json.loads(self.router.sendString.call_args[0][0])
+        self.assertEqual(response["error"]["code"], api.PARSE_ERROR)
+
+    def test_list(self):
+        for _ in range(5):
+            self.call("Game.create")
+
+        listing = self.call("Game.list", limit=2)
+        self.assertEqual([g["gameID"] for g in listing["games"]], [0, 2])
+        self.assertTrue(listing["more"])
+
+        listing = self.call("Game.list", limit=2, since=listing["version"])
+        self.assertEqual([g["gameID"] for g in listing["games"]], [4, 1])
+        self.assertTrue(listing["more"])
+
+        listing = self.call("Game.list", limit=2, since=listing["version"])
+        self.assertEqual([g["gameID"] for g in listing["games"]], [3])
+        self.assertFalse(listing["more"])
+
+        since = listing["version"]
+        self.assertEqual(self.call("Game.list", since=since)["games"], [])
+
+        self.call("Game.join", gameID=3, name="Foo")
+        listing = self.call("Game.list", since=since)
+        self.assertEqual([g["gameID"] for g in listing["games"]], [3])
+
+    def test_list_unknown_cursor(self):
+        self.call("Game.create")
+        listing = self.call("Game.list", since=12)
+        self.assertEqual([g["gameID"] for g in listing["games"]], [0])
+
+    def test_notifications_relayed(self):
+        self.call("Game.create")
+        self.call("Game.create")
+        self.call("Game.join", gameID=1, name="Foo")
+
+        worker = self.controllers[1]
+        (_, player), = worker.games[1].players
+        player.user.protocol = mock.Mock()
+        player.user.protocol.notifications.push.side_effect = (
+            lambda method, params, snapshot : self.router.workerReceived(
+                1, json.dumps([{"method" : method, "params" : params}]),
+            )
+        )
+        player.life -= 2
+
+        notification, = json.loads(self.router.sendString.call_args[0][0])
+        self.assertEqual(notification["method"], "stateChanged")
+        self.assertEqual(notification["params"]["amount"], -2)
+
+
+class TestUnavailableWorkers(unittest.TestCase):
+    def setUp(self):
+        self.factory = sharding.RouterFactory([1, 2])
+        self.factory.connect = mock.Mock()
+        self.router = self.factory.buildProtocol(None)
+        self.router.sendString = mock.Mock()
+        self.router.connectionMade()
+
+    def request(self, id, gameID):
+        self.router.stringReceived(json.dumps({
+            "jsonrpc" : "2.0", "id" : id, "method" : "Game.info",
+            "params" : {"gameID" : gameID},
+        }))
+
+    def response(self):
+        return json.loads(self.router.sendString.call_args[0][0])
+
+    def test_unreachable(self):
+        self.factory.connect.side_effect = (
+            lambda router, shard : defer.fail(ValueError("Down."))
+        )
+        self.request(1, gameID=1)
+
+        response = self.response()
+        self.assertEqual(response["id"], 1)
+        self.assertEqual(response["error"]["code"], api.SERVER_ERROR)
+        self.assertEqual(len(self.flushLoggedErrors(ValueError)), 1)
+
+        # the next call tries connecting again
+        self.request(2, gameID=1)
+        self.assertEqual(self.factory.connect.call_count, 2)
+        self.assertEqual(len(self.flushLoggedErrors(ValueError)), 1)
+
+    def test_connection_lost(self):
+        worker = sharding.ShardConnection(self.router, 1)
+        worker.sendString = mock.Mock()
+        self.factory.connect.return_value = defer.succeed(worker)
+
+        self.request(1, gameID=1)
+        self.assertEqual(worker.sendString.call_count, 1)
+        self.assertFalse(self.router.sendString.called)
+
+        worker.connectionLost(None)
+
+        response = self.response()
+        self.assertEqual(response["id"], 1)
+        self.assertEqual(response["error"]["code"], api.SERVER_ERROR)
+        self.assertNotIn(1, self.router._workers)
@@ -0,0 +1,144 @@
+import json
+import unittest
+
+from twisted.internet import task
+import mock
+
+from cardboard import encoding, spectators
+
+
+class TestSpectators(unittest.TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.spectators = spectators.Spectators(clock=self.clock, lag=2)
+
+    def connect(self, encoding=encoding.JSON):
+        connection = mock.Mock(encoding=encoding, paused=False)
+        self.spectators.add(connection)
+        return connection
+
+    def written(self, connection):
+        frames = []
+        for (data,), _ in connection.transport.write.call_args_list:
+            length, _, rest = data.partition(":")
+            self.assertEqual(rest[int(length):], ",")
+            frames.append(json.loads(rest[:int(length)]))
+        return frames
+
+    def life(self, version, amount=-1):
+        return {
+            "type" : "life", "player" : 0, "amount" : amount,
+            "version" : version,
+        }
+
+    def test_netstring(self):
+        self.assertEqual(spectators.netstring("abc"), "3:abc,")
+
+    def test_add_remove(self):
+        connection = self.connect()
+        self.assertIn(connection, self.spectators)
+        self.assertEqual(len(self.spectators), 1)
+
+        self.spectators.remove(connection)
+        self.assertNotIn(connection, self.spectators)
+
+        # removing twice is fine
+        self.spectators.remove(connection)
+
+    def test_broadcast_once_per_tick(self):
+        first, second = self.connect(), self.connect()
+
+        self.spectators.push(self.life(1))
+        self.spectators.push(self.life(2, amount=-2))
+        self.assertFalse(first.transport.write.called)
+
+        self.clock.advance(0)
+
+        frame, = self.written(first)
+        self.assertEqual(
+            frame, [
+                {
+                    "jsonrpc" : "2.0", "method" : "stateChanged",
+                    "params" : {
+                        "type" : "life", "player" : 0, "amount" : -3,
+                        "version" : 2, "merged" : [1],
+                    },
+                },
+            ],
+        )
+
+        # every spectator is written the very same (encoded once) data
+        self.assertIs(
+            first.transport.write.call_args[0][0],
+            second.transport.write.call_args[0][0],
+        )
+
+    def test_encoded_once_per_encoding(self):
+        dumps = mock.Mock(return_value="frame")
+        other = mock.Mock(dumps=dumps)
+        self.connect(), self.connect(other), self.connect(other)
+
+        self.spectators.push(self.life(1))
+        self.clock.advance(0)
+
+        self.assertEqual(dumps.call_count, 1)
+
+    def test_nobody_watching(self):
+        self.spectators.push(self.life(1))
+        self.assertEqual(self.spectators.pending, [])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_paused_spectators_are_skipped(self):
+        slow, fast = self.connect(), self.connect()
+        slow.paused = True
+
+        self.spectators.push(self.life(1))
+        self.clock.advance(0)
+
+        self.assertFalse(slow.transport.write.called)
+        self.assertEqual(len(self.written(fast)), 1)
+
+        slow.paused = False
+        self.spectators.push(self.life(2))
+        self.clock.advance(0)
+
+        frame, = self.written(slow)
+        self.assertEqual(frame[0]["params"]["version"], 2)
+
+    def test_skipped_spectators_are_resynced(self):
+        snapshot = {"type" : "snapshot", "version" : 2}
+        self.spectators.snapshot = mock.Mock(return_value=snapshot)
+
+        slow, other, fast = self.connect(), self.connect(), self.connect()
+        slow.paused = other.paused = True
+
+        self.spectators.push(self.life(1))
+        self.clock.advance(0)
+
+        slow.paused = other.paused = False
+        self.spectators.push(self.life(2))
+        self.clock.advance(0)
+
+        for connection in slow, other:
+            frame, = self.written(connection)
+            self.assertEqual(frame[0]["params"], snapshot)
+        self.spectators.snapshot.assert_called_once_with()
+
+        frames = self.written(fast)
+        self.assertEqual(frames[-1][0]["params"], self.life(2))
+
+        # and then they're back to deltas
+        self.spectators.push(self.life(3))
+        self.clock.advance(0)
+        self.assertEqual(self.written(slow)[-1][0]["params"], self.life(3))
+
+    def test_lagging_spectators_are_dropped(self):
+        slow = self.connect()
+        slow.paused = True
+
+        for version in range(1, 4):
+            self.spectators.push(self.life(version))
+            self.clock.advance(0)
+
+        self.assertNotIn(slow, self.spectators)
+        slow.transport.loseConnection.assert_called_once_with()
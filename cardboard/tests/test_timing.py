@@ -0,0 +1,116 @@
+import unittest
+
+import mock
+
+from cardboard import events, timing as t
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTimings(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.handler = events.EventHandler()
+        self.parent = t.Timings()
+        self.timings = t.Timings(
+            self.handler, parent=self.parent, clock=self.clock,
+        )
+
+    def test_step(self):
+        with self.timings.step(("beginning", "upkeep")):
+            self.clock.now += 2
+            self.handler.trigger(events.DRAW(None))
+            self.handler.trigger(events.DRAW(None))
+
+            with self.timings.waiting():
+                self.clock.now += 5
+
+        upkeep = self.timings[("beginning", "upkeep")]
+        self.assertEqual(upkeep.count, 1)
+        self.assertEqual(upkeep.engine, 2)
+        self.assertEqual(upkeep.waiting, 5)
+        self.assertEqual(upkeep.events, 2)
+
+    def test_aggregated(self):
+        for _ in range(3):
+            with self.timings.step(("ending", "end")):
+                self.clock.now += 1
+
+        end = self.timings[("ending", "end")]
+        self.assertEqual((end.count, end.engine), (3, 3))
+
+        parent = self.parent[("ending", "end")]
+        self.assertEqual((parent.count, parent.engine), (3, 3))
+
+    def test_waiting_outside_of_a_step(self):
+        with self.timings.waiting():
+            self.clock.now += 1
+        self.assertEqual(len(self.timings), 0)
+
+    def test_nested(self):
+        with self.timings.step("outer"):
+            with self.timings.step("inner"):
+                with self.timings.waiting():
+                    self.clock.now += 1
+
+        self.assertEqual(self.timings["inner"].waiting, 1)
+        self.assertEqual(self.timings["outer"].waiting, 1)
+        self.assertEqual(self.timings["outer"].engine, 0)
+
+    def test_as_dict(self):
+        with self.timings.step(("beginning", "draw")):
+            self.clock.now += 1
+
+        self.assertEqual(
+            self.timings.as_dict(), {
+                "beginning draw" : {
+                    "count" : 1, "engine" : 1, "waiting" : 0, "events" : 0,
+                },
+            },
+        )
+
+    def test_raising_step_is_recorded(self):
+        with self.assertRaises(ZeroDivisionError):
+            with self.timings.step("foo"):
+                1 / 0
+        self.assertEqual(self.timings["foo"].count, 1)
+
+
+class TestServerTimings(unittest.TestCase):
+    def test_games_aggregate_into_server(self):
+        from cardboard import core
+
+        game = core.Game(events.EventHandler())
+        self.assertIs(game.timings.parent, t.server)
+
+        with mock.patch.object(t.server, "record") as record:
+            game.timings.record("foo", 1, 2, 3)
+        record.assert_called_once_with("foo", 1, 2, 3)
+
+
+class TestMethodTimings(unittest.TestCase):
+    def setUp(self):
+        self.timings = t.MethodTimings()
+
+    def test_record(self):
+        self.timings.record("Game.info", 1, 2)
+        self.timings.record("Game.info", 3, 4)
+
+        info = self.timings["Game.info"]
+        self.assertEqual(info.count, 2)
+        self.assertEqual((info.validating, info.running), (4, 6))
+        self.assertEqual(list(self.timings), ["Game.info"])
+        self.assertEqual(len(self.timings), 1)
+
+    def test_as_dict(self):
+        self.timings.record("concede", 1, 2)
+        self.assertEqual(
+            self.timings.as_dict(),
+            {"concede" : {"count" : 1, "validating" : 1, "running" : 2}},
+        )
@@ -0,0 +1,200 @@
+import unittest
+
+import mock
+from twisted.internet import defer
+
+from cardboard import ability, core, events, exceptions, phases, triggers as t
+from cardboard.tests.user import TestingUser
+from cardboard.tests.util import GameTestCase
+
+
+class TestTriggeredAbility(unittest.TestCase):
+    def test_repr_str(self):
+        a = ability.Ability(action=None, description="Foo.", type="triggered")
+        triggered = t.TriggeredAbility(a, source="Bar", controller=None)
+
+        self.assertEqual(str(triggered), "Foo.")
+        self.assertEqual(repr(triggered), "<Triggered Ability: Foo. (Bar)>")
+
+    def test_resolve(self):
+        a = mock.Mock()
+        t.TriggeredAbility(a, source=None, controller=None).resolve()
+        a.assert_called_once_with()
+
+
+class TestTriggerQueue(GameTestCase):
+    def setUp(self):
+        super(TestTriggerQueue, self).setUp()
+        self.game.start()
+        self.active, self.other = self.game.turn.order
+        self.triggers = self.game.triggers
+
+    def source(self, controller):
+        return mock.Mock(controller=controller)
+
+    def test_add(self):
+        self.assertFalse(self.triggers)
+
+        source = self.source(self.other)
+        triggered = self.triggers.add(ability="foo", source=source)
+
+        self.assertEqual(len(self.triggers), 1)
+        self.assertEqual(list(self.triggers), [triggered])
+        self.assertIs(triggered.controller, self.other)
+        self.assertIs(triggered.source, source)
+
+    def test_delay(self):
+        source = self.source(self.other)
+        self.triggers.delay(ability="foo", source=source, step=phases.upkeep)
+        self.assertFalse(self.triggers)
+
+        self.game.grant_priority = mock.Mock()
+        self.game.turn.next()
+
+        triggered, = self.triggers
+        self.assertEqual(triggered.ability, "foo")
+        self.assertIs(triggered.controller, self.other)
+
+    def test_apnap(self):
+        """
+        The active player's triggers go on the stack first.
+
+        .. seealso::
+            :ref:`triggered-abilities`
+
+        """
+
+        theirs = self.triggers.add("theirs", self.source(self.other))
+        mine = self.triggers.add("mine", self.source(self.active))
+
+        self.triggers.put_on_stack()
+
+        self.assertEqual(list(self.game.stack), [mine, theirs])
+        self.assertFalse(self.triggers)
+
+    def test_controller_orders_once(self):
+        first = self.triggers.add("first", self.source(self.active))
+        second = self.triggers.add("second", self.source(self.active))
+        third = self.triggers.add("third", self.source(self.active))
+        theirs = self.triggers.add("theirs", self.source(self.other))
+
+        user = TestingUser()
+        user.select = mock.Mock(return_value=[third, first, second])
+
+        with mock.patch.object(self.active, "user", user):
+            self.triggers.put_on_stack()
+
+        user.select.assert_called_once_with(
+            [first, second, third], how_many=3,
+        )
+        self.assertEqual(
+            list(self.game.stack), [third, first, second, theirs],
+        )
+
+    def test_stacked_together(self):
+        first = self.triggers.add("first", self.source(self.active))
+        second = self.triggers.add("second", self.source(self.active))
+
+        self.resetEvents()
+        with self.active.user.select.will_return(first, second):
+            self.triggers.put_on_stack()
+
+        self.assertLastEventsWere([
+            dict(
+                event=events.CARDS_ENTERED_ZONE,
+                cards=[first, second], zone=self.game.stack,
+            ),
+        ])
+
+    def test_incomplete_order(self):
+        first = self.triggers.add("first", self.source(self.active))
+        second = self.triggers.add("second", self.source(self.active))
+
+        with self.active.user.select.will_return(first):
+            with self.assertRaises(exceptions.BadSelection):
+                self.triggers.put_on_stack()
+
+        self.assertEqual(list(self.triggers), [first, second])
+        self.assertFalse(self.game.stack)
+
+    def test_triggered_while_ordering(self):
+        """
+        Abilities that trigger while a player is ordering their triggers
+        wait to be put on the stack next time.
+
+        """
+
+        first = self.triggers.add("first", self.source(self.active))
+        second = self.triggers.add("second", self.source(self.active))
+
+        selecting = defer.Deferred()
+        user = TestingUser()
+        user.select = mock.Mock(return_value=selecting)
+
+        with mock.patch.object(self.active, "user", user):
+            done = self.triggers.put_on_stack()
+
+        third = self.triggers.add("third", self.source(self.active))
+        selecting.callback([second, first])
+
+        self.assertTrue(done.called)
+        self.assertEqual(list(self.game.stack), [second, first])
+        self.assertEqual(list(self.triggers), [third])
+
+    def test_put_on_stack_when_granting_priority(self):
+        triggered = self.triggers.add("foo", self.source(self.active))
+        self.game.grant_priority()
+        self.assertEqual(list(self.game.stack), [triggered])
+
+
+class TestWatch(unittest.TestCase):
+    def test_watch(self):
+        game = core.Game(events.EventHandler())
+        player = game.add_player(library=[], user=TestingUser())
+        source = mock.Mock(controller=player)
+
+        @ability.triggered(event=events.LIFE_GAINED, description="Foo")
+        def gained():
+            pass
+
+        game.triggers.watch(gained, source)
+        game.start()
+
+        player.life += 3
+
+        triggered, = game.triggers
+        self.assertIs(triggered.ability, gained)
+        self.assertIs(triggered.source, source)
+        self.assertEqual(
+            triggered.parameters, {"player" : player, "amount" : 3},
+        )
+
+    def test_watched_on_the_battlefield(self):
+        """
+        The triggered abilities of permanents trigger while they are on the
+        battlefield.
+
+        """
+
+        game = core.Game(events.EventHandler())
+        player = game.add_player(library=[], user=TestingUser())
+        game.start()
+
+        @ability.triggered(event=events.LIFE_GAINED, description="Foo")
+        def gained():
+            pass
+
+        source = mock.Mock(controller=player, abilities=[gained])
+
+        game.battlefield.add(source)
+        player.life += 3
+
+        triggered, = game.triggers
+        self.assertIs(triggered.ability, gained)
+        self.assertIs(triggered.source, source)
+
+        game.triggers.put_on_stack()
+        game.battlefield.remove(source)
+        player.life += 3
+
+        self.assertFalse(game.triggers)
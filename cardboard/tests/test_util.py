@@ -1,12 +1,40 @@
 import unittest
 
-from cardboard import util as u
+import mock
+from twisted.internet import defer
+
+from cardboard import events, util as u
 
 
 class TestUtil(unittest.TestCase):
     def test_ANY(self):
         self.assertTrue(u.ANY(object()))
 
+    def test_do_subscriptions(self):
+        class Subscriber(object):
+            _subscriptions = [("on_draw", {"event" : events.DRAW})]
+            on_draw = mock.Mock(return_value=None)
+
+        game, zone = mock.Mock(events=events.EventHandler()), object()
+        subscriber, other = Subscriber(), object()
+
+        u.do_subscriptions(subscriber, game=game, while_in=zone)
+
+        game.events.trigger(events.DRAW(1))
+        self.assertEqual(subscriber.on_draw.call_count, 1)
+
+        game.events.trigger(events.LEFT_ZONE(other, zone))
+        game.events.trigger(events.DRAW(1))
+        self.assertEqual(subscriber.on_draw.call_count, 2)
+
+        game.events.trigger(events.LEFT_ZONE(subscriber, zone))
+        game.events.trigger(events.DRAW(1))
+        self.assertEqual(subscriber.on_draw.call_count, 2)
+
+        # only the hook shared by everything waiting to leave a zone is left
+        hook, = game.events.hooks
+        self.assertEqual(hook.conditions["event"], events.LEFT_ZONE)
+
     def test_populate(self):
         d = {}
         p = u.populate(d)
@@ -32,3 +60,74 @@ class TestUtil(unittest.TestCase):
 
         self.assertEqual(u.sanitize("Foo", ignore_case=False), "Foo")
         self.assertEqual(u.sanitize("Fo's Bar", ignore_case=False), "Fos_Bar")
+
+
+class TestSuspendable(unittest.TestCase):
+    def test_synchronous(self):
+        seen = []
+
+        @u.suspendable
+        def fn(a):
+            seen.append((yield a))
+            seen.append((yield a + 1))
+
+        self.assertIsNone(fn(1))
+        self.assertEqual(seen, [1, 2])
+
+    def test_synchronous_error(self):
+        @u.suspendable
+        def fn():
+            yield 1
+            raise ValueError("Boom")
+
+        with self.assertRaises(ValueError):
+            fn()
+
+    def test_suspends(self):
+        seen, waiting = [], defer.Deferred()
+
+        @u.suspendable
+        def fn():
+            seen.append((yield waiting))
+            seen.append((yield 2))
+
+        done = fn()
+        self.assertEqual(seen, [])
+
+        fired = []
+        done.addCallback(fired.append)
+        self.assertEqual(fired, [])
+
+        waiting.callback(1)
+        self.assertEqual(seen, [1, 2])
+        self.assertEqual(fired, [None])
+
+    def test_suspended_errors(self):
+        waiting = defer.Deferred()
+
+        @u.suspendable
+        def fn():
+            try:
+                yield waiting
+            except ValueError:
+                raise LookupError("Caught")
+
+        done = fn()
+        waiting.errback(ValueError("Boom"))
+
+        errors = []
+        done.addErrback(errors.append)
+        errors[0].trap(LookupError)
+
+    def test_after(self):
+        called = []
+        self.assertEqual(u.after(1, lambda : called.append(True)), 1)
+        self.assertEqual(called, [True])
+
+        d, called = defer.Deferred(), []
+        u.after(d, lambda : called.append(True))
+        self.assertEqual(called, [])
+
+        d.callback(2)
+        self.assertEqual(called, [True])
+        self.assertEqual(d.result, 2)
@@ -183,8 +183,9 @@ class TestZones(ZoneTest):
 
         self.assertEqual(len(self.u), len(self.library) + 4)
 
-        evs = [dict(event=ENTER, card=i, zone=self.u) for i in range(4)]
-        self.assertLastEventsWere(evs)
+        self.assertLastEventsWere([
+            dict(event=events.CARDS_ENTERED_ZONE, cards=range(4), zone=self.u),
+        ])
 
         self.resetEvents()
 
@@ -193,8 +194,9 @@ class TestZones(ZoneTest):
 
         self.assertEqual(len(self.o), len(self.library) + 4)
 
-        evs = [dict(event=ENTER, card=i, zone=self.o) for i in range(4)]
-        self.assertLastEventsWere(evs)
+        self.assertLastEventsWere([
+            dict(event=events.CARDS_ENTERED_ZONE, cards=range(4), zone=self.o),
+        ])
 
     def test_silent(self):
         self.o.add(self.card)
@@ -34,6 +34,7 @@ class TestingUser(object):
     select_players = mock_selector("players")
     select_combined = mock_selector("combined")
     select_range = mock_selector("range")
+    select_blocks = mock_selector("blocks")
 
     def prompt(self, msg):
         log.msg(msg)
@@ -20,10 +20,10 @@ import contextlib
 import unittest
 
 import mock
-import panglery
 
 from cardboard.core import Game, Player
 from cardboard.card import Card
+from cardboard.events import EventHandler
 from cardboard.exceptions import RequirementNotMet
 from cardboard.tests.user import TestingUser
 
@@ -86,6 +86,17 @@ class _CheckRequirementsContext(object):
         self._prune_patches()
 
 
+def _parameters(args, kwargs):
+    """
+    Get the parameters of a triggered event from its call args.
+
+    """
+
+    if args and hasattr(args[0], "as_dict"):
+        return args[0].as_dict()
+    return kwargs
+
+
 class EventHandlerTestCase(unittest.TestCase):
 
     MSG = (
@@ -94,7 +105,7 @@ class EventHandlerTestCase(unittest.TestCase):
 
     def setUp(self):
         super(EventHandlerTestCase, self).setUp()
-        self.events = mock.Mock(spec=panglery.Pangler)
+        self.events = mock.Mock(spec=EventHandler, triggered=0)
 
     def failUnexpectedEvents(self, events):
         # TODO: Make this look nicer by giving it a nice diff
@@ -107,6 +118,8 @@ class EventHandlerTestCase(unittest.TestCase):
 
         Events should be an iterable of dicts containing each of the desired
         keyword-params that should have been triggered by the event trigger.
+        Triggered :class:`cardboard.events.Payload` objects are compared as
+        dicts of their parameters.
 
         The default place to check as a superset is the call args to the event
         trigger (i.e. self.events.trigger.call_args_list).
@@ -125,7 +138,7 @@ class EventHandlerTestCase(unittest.TestCase):
         if of is None:
             of = self.events.trigger.call_args_list
 
-        of = (kwargs for args, kwargs in of)
+        of = (_parameters(args, kwargs) for args, kwargs in of)
         found = []
 
         for index, event in enumerate(events):
@@ -0,0 +1,243 @@
+"""
+Measures where the time spent playing a game goes.
+
+Each :term:`step` that a game's turn manager runs is timed, with the time
+split between time spent waiting on players (to act with priority, or to make
+a selection) and time spent in the engine itself. The number of events that
+were triggered during each step is counted as well.
+
+Measurements are aggregated for each game (see :attr:`Game.timings`) as well
+as for the whole server (see :data:`server`).
+
+Calls to exposed API methods are timed too (see :class:`MethodTimings`), with
+the time spent validating each request split from the time spent handling it.
+
+"""
+
+from contextlib import contextmanager
+from timeit import default_timer
+
+
+__all__ = [
+    "MethodTiming", "MethodTimings", "StepTiming", "Timings", "server",
+]
+
+
+class StepTiming(object):
+    """
+    The aggregated measurements of a step.
+
+    """
+
+    __slots__ = ["count", "engine", "events", "waiting"]
+
+    def __init__(self):
+        self.count = 0
+        self.engine = self.waiting = 0.0
+        self.events = 0
+
+    def __repr__(self):
+        return "<Step Timing: {0.count} runs, {0.engine:.6f}s engine, " \
+               "{0.waiting:.6f}s waiting, {0.events} events>".format(self)
+
+    def add(self, engine, waiting, events):
+        self.count += 1
+        self.engine += engine
+        self.waiting += waiting
+        self.events += events
+
+    def as_dict(self):
+        return {
+            "count" : self.count, "engine" : self.engine,
+            "waiting" : self.waiting, "events" : self.events,
+        }
+
+
+class Timings(object):
+    """
+    Step timings, keyed by (phase name, step name).
+
+    Arguments
+    ---------
+
+    * handler: an event handler whose triggered events are counted
+    * parent: another :class:`Timings` that measurements are also added to
+    * clock: a function returning the current time in seconds
+
+    """
+
+    def __init__(self, handler=None, parent=None, clock=default_timer):
+        super(Timings, self).__init__()
+
+        self.handler = handler
+        self.parent = parent
+        self.clock = clock
+
+        self.steps = {}
+
+        # the time spent waiting during the step being measured, if any
+        self._waiting = None
+
+    def __getitem__(self, key):
+        return self.steps[key]
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def as_dict(self):
+        """
+        Get the timings in a serializable form.
+
+        """
+
+        return {
+            "{} {}".format(*key) : timing.as_dict()
+            for key, timing in self.steps.iteritems()
+        }
+
+    def record(self, key, engine, waiting, events):
+        """
+        Record a measurement of a step.
+
+        """
+
+        timing = self.steps.get(key)
+        if timing is None:
+            timing = self.steps[key] = StepTiming()
+        timing.add(engine, waiting, events)
+
+        if self.parent is not None:
+            self.parent.record(key, engine, waiting, events)
+
+    def begin(self, key):
+        """
+        Start measuring a step, returning a function that finishes measuring
+        it (for steps that don't finish right away, e.g. while waiting on a
+        player across the network).
+
+        """
+
+        outer, self._waiting = self._waiting, 0.0
+        triggered = self._triggered()
+        start = self.clock()
+
+        def finish():
+            elapsed = self.clock() - start
+            waiting, self._waiting = self._waiting, outer
+            if outer is not None:
+                self._waiting += waiting
+
+            self.record(
+                key, elapsed - waiting, waiting, self._triggered() - triggered,
+            )
+        return finish
+
+    @contextmanager
+    def step(self, key):
+        """
+        Measure a step.
+
+        """
+
+        finish = self.begin(key)
+        try:
+            yield
+        finally:
+            finish()
+
+    @contextmanager
+    def waiting(self):
+        """
+        Measure time spent waiting on a player.
+
+        """
+
+        start = self.clock()
+
+        try:
+            yield
+        finally:
+            if self._waiting is not None:
+                self._waiting += self.clock() - start
+
+    def _triggered(self):
+        if self.handler is None:
+            return 0
+        return self.handler.triggered
+
+
+class MethodTiming(object):
+    """
+    The aggregated measurements of an API method.
+
+    """
+
+    __slots__ = ["count", "running", "validating"]
+
+    def __init__(self):
+        self.count = 0
+        self.running = self.validating = 0.0
+
+    def __repr__(self):
+        return "<Method Timing: {0.count} calls, {0.validating:.6f}s " \
+               "validating, {0.running:.6f}s running>".format(self)
+
+    def add(self, validating, running):
+        self.count += 1
+        self.validating += validating
+        self.running += running
+
+    def as_dict(self):
+        return {
+            "count" : self.count, "running" : self.running,
+            "validating" : self.validating,
+        }
+
+
+class MethodTimings(object):
+    """
+    API method timings, keyed by method name.
+
+    """
+
+    def __init__(self, clock=default_timer):
+        super(MethodTimings, self).__init__()
+
+        self.clock = clock
+        self.methods = {}
+
+    def __getitem__(self, name):
+        return self.methods[name]
+
+    def __iter__(self):
+        return iter(self.methods)
+
+    def __len__(self):
+        return len(self.methods)
+
+    def as_dict(self):
+        """
+        Get the timings in a serializable form.
+
+        """
+
+        methods = self.methods.iteritems()
+        return {name : method.as_dict() for name, method in methods}
+
+    def record(self, name, validating, running):
+        """
+        Record a call to a method.
+
+        """
+
+        timing = self.methods.get(name)
+        if timing is None:
+            timing = self.methods[name] = MethodTiming()
+        timing.add(validating, running)
+
+
+#: The timings of all of the games played on this server (process).
+server = Timings()
@@ -0,0 +1,229 @@
+"""
+Collects :term:`triggered abilities <triggered ability>` and puts them on the
+:term:`stack`.
+
+Abilities that trigger during an action (or a check of state-based actions)
+wait in the game's :class:`TriggerQueue` until the next time a player would
+receive priority. They are then put on the stack in APNAP order, with each
+player ordering all of their own triggers at once.
+
+The triggered abilities of a permanent are watched for while it's on the
+battlefield.
+
+.. seealso::
+    :ref:`triggered-abilities`
+
+"""
+
+import weakref
+
+from cardboard import events, exceptions
+from cardboard.util import suspendable
+
+
+__all__ = ["TriggeredAbility", "TriggerQueue"]
+
+
+class TriggeredAbility(object):
+    """
+    A triggered ability that is waiting to be put on, or is on, the stack.
+
+    """
+
+    def __init__(self, ability, source, controller, parameters=None):
+        super(TriggeredAbility, self).__init__()
+
+        if parameters is None:
+            parameters = {}
+
+        self.ability = ability
+        self.source = source
+        self.controller = controller
+        self.parameters = parameters
+
+    def __repr__(self):
+        return "<Triggered Ability: {} ({})>".format(self, self.source)
+
+    def __str__(self):
+        return str(self.ability)
+
+    def resolve(self):
+        self.ability()
+
+
+class TriggerQueue(object):
+    """
+    The triggered abilities that have triggered but are not yet on the stack.
+
+    """
+
+    def __init__(self, game):
+        super(TriggerQueue, self).__init__()
+
+        self.game = game
+        self._pending = {}
+        self._watching = {}
+
+        game.events.subscribe(
+            self._entered_zone, owner=self,
+            event=events.ENTERED_ZONE, needs=["card", "zone"],
+        )
+        game.events.subscribe(
+            self._left_zone, owner=self,
+            event=events.LEFT_ZONE, needs=["card", "zone"],
+        )
+        game.events.subscribe(
+            self._cards_entered_zone, owner=self,
+            event=events.CARDS_ENTERED_ZONE, needs=["cards", "zone"],
+        )
+
+    def __iter__(self):
+        return (
+            triggered
+            for player in self._apnap()
+            for triggered in self._pending.get(player, ())
+        )
+
+    def __len__(self):
+        return sum(len(pending) for pending in self._pending.itervalues())
+
+    def add(self, ability, source, parameters=None):
+        """
+        Note that an ability of the given source triggered.
+
+        The source's controller (at the time the ability triggered) controls
+        the triggered ability.
+
+        """
+
+        controller = getattr(source, "controller", None) or source.owner
+        triggered = TriggeredAbility(ability, source, controller, parameters)
+        self._pending.setdefault(controller, []).append(triggered)
+        return triggered
+
+    def delay(self, ability, source, step, player=None, parameters=None):
+        """
+        Create a delayed triggered ability that triggers at the beginning of
+        the next occurrence of a step (in one of the given player's turns, if
+        a player is given).
+
+        .. seealso::
+            :ref:`triggered-abilities`
+
+        """
+
+        return self.game.turn.at(
+            lambda : self.add(ability, source, parameters), step, player,
+        )
+
+    def watch(self, ability, source):
+        """
+        Subscribe a triggered ability of a source to the event it triggers on.
+
+        The subscription is owned by the source.
+
+        """
+
+        conditions = dict(ability.trigger)
+
+        try:
+            fields = events.Event.lookup(conditions.get("event")).fields
+        except LookupError:
+            fields = ()
+
+        source_ref = weakref.ref(source)
+
+        def triggered(handler, **parameters):
+            source = source_ref()
+            if source is not None:
+                self.add(ability, source, parameters)
+
+        self.game.events.subscribe(
+            triggered, owner=source, needs=fields, **conditions
+        )
+        self._watching.setdefault(source, []).append(triggered)
+
+    def unwatch(self, source):
+        """
+        Unsubscribe all of the watched triggered abilities of a source.
+
+        """
+
+        for triggered in self._watching.pop(source, ()):
+            self.game.events.unsubscribe(triggered)
+
+    @suspendable
+    def put_on_stack(self):
+        """
+        Put all of the pending triggered abilities on the stack.
+
+        Players put their triggered abilities on the stack in APNAP order,
+        each choosing the order of all of their own abilities with a single
+        selection (the first selected goes on the stack first). Each player's
+        abilities are added to the stack together, with a single
+        :const:`~cardboard.events.CARDS_ENTERED_ZONE` event.
+
+        .. seealso::
+            :ref:`triggered-abilities`
+
+        """
+
+        if not self._pending:
+            return
+
+        for player in self._apnap():
+            # abilities that trigger while the player is choosing wait for
+            # the next time the queue is put on the stack
+            pending = self._pending.pop(player, None)
+            if not pending:
+                continue
+
+            if len(pending) > 1:
+                try:
+                    with self.game.timings.waiting():
+                        selection = yield player.user.select(
+                            list(pending), how_many=len(pending),
+                        )
+                    ordered = self._order(player, pending, selection)
+                except Exception:
+                    later = self._pending.get(player, [])
+                    self._pending[player] = pending + later
+                    raise
+                pending = ordered
+
+            self.game.stack.update(pending)
+
+    def _apnap(self):
+        """
+        The players with pending triggers, in APNAP order.
+
+        """
+
+        order = self.game.turn.order or ()
+        players = [player for player in order if player in self._pending]
+        players.extend(p for p in self._pending if p not in players)
+        return players
+
+    def _order(self, player, pending, selection):
+        if not selection:
+            return pending
+
+        selection = list(selection)
+        if sorted(selection, key=id) != sorted(pending, key=id):
+            err = "{} must order all of their triggered abilities."
+            raise exceptions.BadSelection(err.format(player))
+        return selection
+
+    def _entered_zone(self, handler, card, zone):
+        if zone is self.game.battlefield:
+            for ability in getattr(card, "abilities", ()):
+                if getattr(ability, "type", None) == "triggered":
+                    self.watch(ability, card)
+
+    def _cards_entered_zone(self, handler, cards, zone):
+        for card in cards:
+            self._entered_zone(handler, card, zone)
+
+    def _left_zone(self, handler, card, zone):
+        if zone is self.game.battlefield:
+            self.unwatch(card)
@@ -5,25 +5,70 @@ Utilities of use for the creation of game objects.
 
 from csv import DictReader, reader
 from string import punctuation
+import functools
 
-from twisted.python import log
+from twisted.internet import defer
+from twisted.python import failure, log
 
 from cardboard import exceptions
 
 
 __all__ = [
     "ANY",
-    "do_subscriptions", "log_events", "populate", "requirements", "sanitize"
+    "after", "do_subscriptions", "log_events", "populate", "requirements",
+    "sanitize", "suspendable", "then",
 ]
 
 
 ANY = lambda _ : True
 
 
-def do_subscriptions(self, game=None):
+def after(result, fn):
+    """
+    Call a function once a result that may be a Deferred is ready.
+
+    The function is called whether or not the result is a failure, and the
+    result is passed along (so this acts like a ``finally`` clause).
+
+    """
+
+    if isinstance(result, defer.Deferred):
+        def _after(outcome):
+            fn()
+            return outcome
+        return result.addBoth(_after)
+
+    fn()
+    return result
+
+
+def then(result, fn):
+    """
+    Call a function with a result that may be a Deferred once it's ready.
+
+    Returns what the function does, or a Deferred that fires with it.
+
+    """
+
+    if isinstance(result, defer.Deferred):
+        return result.addCallback(fn)
+    return fn(result)
+
+
+def do_subscriptions(self, game=None, while_in=None):
     """
     Subscribe any of the class' instance methods to events.
 
+    The subscriptions are owned by the instance, so they are held weakly and
+    go away along with it (or with the game's subscriptions when it ends).
+
+    Arguments
+    ---------
+
+    * game: the game whose events to subscribe to (default: self)
+    * while_in: if provided, a zone that the subscriptions are removed upon
+                leaving
+
     """
 
     if game is None:
@@ -32,7 +77,10 @@ def do_subscriptions(self, game=None):
     subscriptions = {getattr(self, k) : v for k, v in self._subscriptions}
 
     for method, subscription_options in subscriptions.iteritems():
-        game.events.subscribe(method, **subscription_options)
+        game.events.subscribe(method, owner=self, **subscription_options)
+
+    if while_in is not None:
+        game.events.release_on_leaving(self, while_in)
 
 
 def log_events(game):
@@ -146,6 +194,63 @@ def sanitize(s, ignore_case=True):
     return "".join(c for c in s if c not in punctuation).replace(" ", "_")
 
 
+def suspendable(fn):
+    """
+    Make a generator function into one that can wait on players.
+
+    The generator yields whatever it's waiting on (e.g. a selection), and is
+    sent back its result. Most of the time (e.g. for a local user) the result
+    is already there, and the function runs to completion immediately, just
+    like a plain function, returning None and raising any exceptions as
+    usual.
+
+    If a :class:`~twisted.internet.defer.Deferred` is yielded instead (e.g.
+    for a selection made across the network), the generator is suspended
+    until it fires, and the function returns a Deferred that fires once the
+    generator has finished.
+
+    """
+
+    @functools.wraps(fn)
+    def suspending(*args, **kwargs):
+        return _resume(fn(*args, **kwargs))
+    return suspending
+
+
+def _resume(generator, result=None, done=None):
+    """
+    Run a suspendable generator until it finishes or has to wait.
+
+    """
+
+    while True:
+        try:
+            if isinstance(result, failure.Failure):
+                waiting_on = result.throwExceptionIntoGenerator(generator)
+            else:
+                waiting_on = generator.send(result)
+        except StopIteration:
+            if done is not None:
+                done.callback(None)
+            return done
+        except Exception:
+            if done is None:
+                raise
+            done.errback(failure.Failure())
+            return done
+
+        if isinstance(waiting_on, defer.Deferred):
+            if done is None:
+                done = defer.Deferred()
+
+            def resume(result):
+                _resume(generator, result, done)
+            waiting_on.addBoth(resume)
+            return done
+
+        result = waiting_on
+
+
 def unicode_csv_reader(f, reader=reader, **kwargs):
     """
     Take a `codecs.open` wrapped file-like object and make csv not suck.
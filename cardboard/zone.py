@@ -2,6 +2,7 @@ from collections import Set
 import random
 
 from cardboard import events
+from cardboard.util import then
 
 
 __all__ = ["UnorderedZone", "OrderedZone", "zone"]
@@ -44,16 +45,29 @@ class ZoneMixin(object):
         """
         Add multiple elements at the same time.
 
-        Analogous to list.extend and set.update.
+        Analogous to list.extend and set.update. Unless silent, a single
+        :const:`CARDS_ENTERED_ZONE` event is triggered for all of them.
         """
 
+        added = []
         for e in i:
-            self.add(e, silent=silent)
+            if not silent and self.owner is not None and self.owner != e.owner:
+                getattr(e.owner, self.name).add(e)
+            else:
+                self.add(e, silent=True)
+                added.append(e)
+
+        if added and not silent:
+            self.game.events.trigger(events.CARDS_ENTERED_ZONE(added, self))
 
     def move(self, e, silent=False):
         """
         Remove a card from its current zone and place it in this zone.
 
+        Unless silent, replacement effects may change where the card goes (or
+        whether it moves at all). If a player has to choose between them, the
+        card moves once they have, and a Deferred that fires then is returned.
+
         Raises a ValueError for cards that are already present.
 
         """
@@ -61,8 +75,26 @@ class ZoneMixin(object):
         if e in self:
             raise ValueError("'{}' is already in the {} zone.".format(e, self))
 
-        e.zone.remove(e, silent=silent)
-        self.add(e, silent=silent)
+        if silent:
+            e.zone.remove(e, silent=True)
+            self.add(e, silent=True)
+            return
+
+        return then(self.game.replacements.replace(ENTER(e, self)), _enter)
+
+
+def _enter(payload):
+    """
+    Move a card into a zone as (possibly) modified by replacement effects.
+
+    """
+
+    if payload is None:
+        return
+
+    e = payload.card
+    e.zone.remove(e)
+    payload.zone.add(e)
 
 
 class UnorderedZone(ZoneMixin):
@@ -95,7 +127,7 @@ class UnorderedZone(ZoneMixin):
         self._contents.add(e)
 
         if not silent:
-            self.game.events.trigger(event=ENTER, card=e, zone=self)
+            self.game.events.trigger(ENTER(e, self))
 
     def pop(self, silent=False):
         try:
@@ -103,7 +135,7 @@ class UnorderedZone(ZoneMixin):
             return e
         finally:
             if not silent:
-                self.game.events.trigger(event=LEAVE, card=e, zone=self)
+                self.game.events.trigger(LEAVE(e, self))
 
     def remove(self, e, silent=False):
         try:
@@ -112,7 +144,7 @@ class UnorderedZone(ZoneMixin):
             raise ValueError("'{}' is not in the {} zone.".format(e, self))
         else:
             if not silent:
-                self.game.events.trigger(event=LEAVE, card=e, zone=self)
+                self.game.events.trigger(LEAVE(e, self))
 
 
 class OrderedZone(ZoneMixin):
@@ -162,7 +194,7 @@ class OrderedZone(ZoneMixin):
         self._order.append(e)
 
         if not silent:
-            self.game.events.trigger(event=ENTER, card=e, zone=self)
+            self.game.events.trigger(ENTER(e, self))
 
     def count(self, e):
         return self._order.count(e)
@@ -179,7 +211,7 @@ class OrderedZone(ZoneMixin):
         self._contents.remove(e)
 
         if not silent:
-            self.game.events.trigger(event=LEAVE, card=e, zone=self)
+            self.game.events.trigger(LEAVE(e, self))
 
         return e
 
@@ -191,7 +223,7 @@ class OrderedZone(ZoneMixin):
         self._order.remove(e)
 
         if not silent:
-            self.game.events.trigger(event=LEAVE, card=e, zone=self)
+            self.game.events.trigger(LEAVE(e, self))
 
     def reverse(self):
         self._order.reverse()
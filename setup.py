@@ -32,4 +32,5 @@ setup(
         "twisted",
         "txjsonrpc-tcp",
     ],
+    extras_require={"compact" : ["msgpack-python"]},
 )